@@ -7,6 +7,7 @@ from routes.content_routes import content_bp
 from routes.auth_routes import auth_bp
 from routes.webscraping_routes import lead_generator_bp
 from routes.EmailGenerateAndValidator_routes import file_processor_bp
+from services.service import resume_campaigns
 
 def create_app():
     app = Flask(__name__)
@@ -48,6 +49,9 @@ def create_app():
     def health():
         return {"status": "healthy", "service": "emailagent-backend"}, 200
 
+    # Pick up campaigns that were still sending when the container stopped
+    resume_campaigns()
+
     return app
 
 
@@ -0,0 +1,132 @@
+"""Compare the threaded and asyncio send backends against a local SMTP sink.
+
+Usage (from the backend directory):
+    python benchmark_send_backends.py --messages 2000 --accounts 2 --latency-ms 20
+
+The sink accepts everything without TLS or auth and waits ``--latency-ms`` before
+answering each DATA, which stands in for the round trip to a real provider.
+Account and per-domain rate limits are lifted so only the send path is measured.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import threading
+import time
+
+from services.dispatcher import CampaignDispatcher
+from services.async_dispatcher import AsyncCampaignDispatcher
+from services.message_factory import message_factory
+from services.progress import CampaignProgress
+from services.rate_limiter import AccountRateLimiter
+from services.recipients import Recipient
+from services.smtp_pool import SMTPConnectionPool
+
+
+class SMTPSink:
+    """Minimal SMTP server on localhost that discards every message"""
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.received = 0
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._serve, name="smtp-sink", daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._session, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _session(self, reader, writer):
+        writer.write(b"220 sink ready\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                writer.write(b"250-sink\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                writer.write(b"354 go ahead\r\n")
+                await writer.drain()
+                while (await reader.readline()) not in (b".\r\n", b""):
+                    pass
+                if self.latency_seconds:
+                    await asyncio.sleep(self.latency_seconds)
+                self.received += 1
+                writer.write(b"250 queued\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+
+class UnlimitedLimiters:
+    def __init__(self):
+        self._limiter = AccountRateLimiter(per_second=1e9, per_minute=1e12, per_day=1e15)
+
+    def get(self, sender_account):
+        return self._limiter
+
+
+def run_backend(name, sink, args):
+    accounts = [{"email": f"sender{i}@bench.local", "password": ""} for i in range(args.accounts)]
+    recipients = [Recipient(f"user{i}@domain{i % args.domains}.test", f"User {i}") for i in range(args.messages)]
+    factory = message_factory("Hello {name}", "Hi {name},\nThis is a benchmark message.\n")
+
+    def compose(recipient, account):
+        msg, _, _ = factory.build("Bench", account["email"], recipient.email, {"name": recipient.name})
+        return msg, None
+
+    progress = CampaignProgress()
+    progress.start(len(recipients))
+    if name == "threaded":
+        pool = SMTPConnectionPool(host="127.0.0.1", port=sink.port, starttls=False, login=False)
+        dispatcher = CampaignDispatcher(accounts, compose, progress, args.batch_size,
+                                        pool=pool, limiters=UnlimitedLimiters(), domain_rate_per_minute=0)
+    else:
+        dispatcher = AsyncCampaignDispatcher(accounts, compose, progress, args.batch_size,
+                                             connections_per_account=args.connections,
+                                             host="127.0.0.1", port=sink.port, starttls=False, login=False,
+                                             limiters=UnlimitedLimiters(), domain_rate_per_minute=0)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # Per-message log lines
+        error = dispatcher.run(recipients)
+    elapsed = time.perf_counter() - start
+    if name == "threaded":
+        pool.close_all()
+    return progress.sent, elapsed, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--connections", type=int, default=8, help="async connections per account")
+    parser.add_argument("--domains", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=250)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.latency_ms / 1000).start()
+    for name in ("threaded", "async"):
+        sent, elapsed, error = run_backend(name, sink, args)
+        print(f"{name:>8}: {sent} messages in {elapsed:.2f}s = {sent / elapsed:.0f} msg/s"
+              + (f" (error: {error})" if error else ""))
+
+
+if __name__ == "__main__":
+    main()
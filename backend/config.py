@@ -25,10 +25,99 @@ def get_redirect_uri():
         return "http://13.232.64.40:3000/zoho-callback"
 
 
+# Outbound SMTP settings shared by the bulk senders
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_TIMEOUT_SECONDS = int(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+SMTP_KEEPALIVE_SECONDS = int(os.getenv("SMTP_KEEPALIVE_SECONDS", 60))  # NOOP idle sessions this often
+SMTP_MAX_IDLE_SECONDS = int(os.getenv("SMTP_MAX_IDLE_SECONDS", 300))   # Close sessions idle longer than this
+SMTP_MAX_IDLE_PER_ACCOUNT = int(os.getenv("SMTP_MAX_IDLE_PER_ACCOUNT", 2))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+
+# Send backend per campaign: "threaded" (one message in flight per account) or "async"
+SMTP_SEND_BACKEND = os.getenv("SMTP_SEND_BACKEND", "threaded")
+SMTP_ASYNC_CONNECTIONS_PER_ACCOUNT = int(os.getenv("SMTP_ASYNC_CONNECTIONS_PER_ACCOUNT", 4))  # Messages in flight per account
+
+# Per recipient-domain budgets, so one slow or greylisting provider can't stall a campaign
+SMTP_DOMAIN_MAX_IN_FLIGHT = int(os.getenv("SMTP_DOMAIN_MAX_IN_FLIGHT", 0))           # Sends to one domain at once; 0 = one per connection
+SMTP_DOMAIN_RATE_PER_MINUTE = float(os.getenv("SMTP_DOMAIN_RATE_PER_MINUTE", 0))    # 0 = no per-domain rate limit
+
+# Adaptive per-account batch sizing (threaded backend); the /upload batch_size is the starting value
+SMTP_BATCH_MIN_SIZE = int(os.getenv("SMTP_BATCH_MIN_SIZE", 10))
+SMTP_BATCH_MAX_SIZE = int(os.getenv("SMTP_BATCH_MAX_SIZE", 1000))
+SMTP_BATCH_TARGET_SECONDS = float(os.getenv("SMTP_BATCH_TARGET_SECONDS", 60))   # Aim for batches that take about this long
+SMTP_BATCH_MAX_ERROR_RATE = float(os.getenv("SMTP_BATCH_MAX_ERROR_RATE", 0.05))  # Halve the batch above this failure rate
+
+# Default per-account send quotas (token buckets) and deferral backoff
+SMTP_RATE_PER_SECOND = float(os.getenv("SMTP_RATE_PER_SECOND", 5))
+SMTP_RATE_PER_MINUTE = float(os.getenv("SMTP_RATE_PER_MINUTE", 120))
+SMTP_RATE_PER_DAY = float(os.getenv("SMTP_RATE_PER_DAY", 2000))   # Google Workspace daily cap
+SMTP_BACKOFF_INITIAL_SECONDS = float(os.getenv("SMTP_BACKOFF_INITIAL_SECONDS", 5))
+SMTP_BACKOFF_MAX_SECONDS = float(os.getenv("SMTP_BACKOFF_MAX_SECONDS", 300))
+SMTP_QUOTA_MAX_WAIT_SECONDS = float(os.getenv("SMTP_QUOTA_MAX_WAIT_SECONDS", 600))  # Give up on an account past this wait
+SMTP_RECONNECT_ATTEMPTS = int(os.getenv("SMTP_RECONNECT_ATTEMPTS", 3))                 # Reconnects before an account is quarantined
+SMTP_RECONNECT_BACKOFF_SECONDS = float(os.getenv("SMTP_RECONNECT_BACKOFF_SECONDS", 5))  # Grows with each attempt
+
+# Retry lane for temporary (4xx) per-recipient failures, drained after the main queue
+SMTP_RETRY_MAX_ATTEMPTS = int(os.getenv("SMTP_RETRY_MAX_ATTEMPTS", 5))          # Retries before a recipient is marked failed
+SMTP_RETRY_INITIAL_SECONDS = float(os.getenv("SMTP_RETRY_INITIAL_SECONDS", 30))  # Doubles with every attempt
+SMTP_RETRY_MAX_SECONDS = float(os.getenv("SMTP_RETRY_MAX_SECONDS", 900))
+
+# Scheduled sending: campaign start times and per-recipient send windows
+SEND_DEFAULT_TIMEZONE = os.getenv("SEND_DEFAULT_TIMEZONE", "UTC")           # For recipients without a time zone column
+SEND_WINDOW_LOAD_CHUNK = int(os.getenv("SEND_WINDOW_LOAD_CHUNK", 500))      # Due recipients loaded from the store per query
+
+# Durable campaign job store (SQLite) used to resume campaigns after a restart
+CAMPAIGN_DB_PATH = os.getenv("CAMPAIGN_DB_PATH", "campaigns.db")
+CAMPAIGN_CHECKPOINT_EVERY = int(os.getenv("CAMPAIGN_CHECKPOINT_EVERY", 25))      # Results per checkpoint
+CAMPAIGN_CHECKPOINT_SECONDS = float(os.getenv("CAMPAIGN_CHECKPOINT_SECONDS", 2))  # ...or at least this often
+CAMPAIGN_SECRET_KEY = os.getenv("CAMPAIGN_SECRET_KEY")  # Fernet key encrypting stored SMTP passwords...
+CAMPAIGN_KEY_PATH = os.getenv("CAMPAIGN_KEY_PATH", "campaigns.key")  # ...or one generated here (mode 0600) if unset
+
+# Suppression list (SQLite): hard bounces, unsubscribes and validator rejects, skipped at upload
+SUPPRESSION_DB_PATH = os.getenv("SUPPRESSION_DB_PATH", "suppressions.db")
+
+# Incremental IMAP reply sync: per-mailbox UID checkpoints (SQLite)
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.gmail.com")
+IMAP_SYNC_DB_PATH = os.getenv("IMAP_SYNC_DB_PATH", "imap_sync.db")
+IMAP_FETCH_BATCH = int(os.getenv("IMAP_FETCH_BATCH", 100))  # Messages per UID FETCH command
+IMAP_REPLY_BODY_MAX_BYTES = int(os.getenv("IMAP_REPLY_BODY_MAX_BYTES", 65536))  # Text fetched from each reply body
+
+# Pooled IMAP sessions per account, used by reply checks and flag updates
+IMAP_TIMEOUT_SECONDS = int(os.getenv("IMAP_TIMEOUT_SECONDS", 30))
+IMAP_KEEPALIVE_SECONDS = int(os.getenv("IMAP_KEEPALIVE_SECONDS", 60))   # NOOP pooled sessions idle longer than this before reuse
+IMAP_MAX_IDLE_SECONDS = int(os.getenv("IMAP_MAX_IDLE_SECONDS", 600))    # Close pooled sessions idle longer than this
+IMAP_MAX_IDLE_PER_ACCOUNT = int(os.getenv("IMAP_MAX_IDLE_PER_ACCOUNT", 2))
+IMAP_FLAG_FLUSH_SECONDS = float(os.getenv("IMAP_FLAG_FLUSH_SECONDS", 1))  # Flag changes collected before one UID STORE
+IMAP_SCAN_WORKERS = int(os.getenv("IMAP_SCAN_WORKERS", 8))  # Inboxes scanned at once by a multi-account reply check
+
+# Background reply listeners: one IMAP IDLE connection per registered sender account
+IMAP_IDLE_SECONDS = float(os.getenv("IMAP_IDLE_SECONDS", 540))                      # Re-issue IDLE before servers drop it
+IMAP_RECONNECT_INITIAL_SECONDS = float(os.getenv("IMAP_RECONNECT_INITIAL_SECONDS", 5))  # Doubles after every failed connect
+IMAP_RECONNECT_MAX_SECONDS = float(os.getenv("IMAP_RECONNECT_MAX_SECONDS", 300))
+REPLY_LISTENER_KEEP = int(os.getenv("REPLY_LISTENER_KEEP", 1000))                   # Processed replies kept for /replies
+
+# Streaming recipient ingestion for /upload
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")                       # Uploaded lists kept until the campaign ends
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 2000))          # Rows parsed per chunk
+DISPATCH_QUEUE_LIMIT = int(os.getenv("DISPATCH_QUEUE_LIMIT", 10000))   # Parsed recipients buffered ahead of the senders
+PREVIEW_MAX_ROWS = int(os.getenv("PREVIEW_MAX_ROWS", 100))              # Most rows /preview returns
+PREVIEW_SAMPLE_BYTES = int(os.getenv("PREVIEW_SAMPLE_BYTES", 65536))   # CSV bytes read for a preview and its row estimate
+
+# Append-only sent-email audit log (SQLite), exported to XLSX on demand
+SENT_LOG_DB_PATH = os.getenv("SENT_LOG_DB_PATH", "sent_emails.db")
+SENT_LOG_BATCH_SIZE = int(os.getenv("SENT_LOG_BATCH_SIZE", 200))        # Rows per insert transaction
+SENT_LOG_FLUSH_SECONDS = float(os.getenv("SENT_LOG_FLUSH_SECONDS", 1))   # Max delay before a partial batch commits
+
+# Campaign progress tracking and the /progress/stream Server-Sent Events endpoint
+PROGRESS_KEEP_FINISHED = int(os.getenv("PROGRESS_KEEP_FINISHED", 50))  # Finished campaigns kept in memory
+PROGRESS_STREAM_INTERVAL_SECONDS = float(os.getenv("PROGRESS_STREAM_INTERVAL_SECONDS", 0.5))  # Min gap between pushes
+PROGRESS_STREAM_KEEPALIVE_SECONDS = float(os.getenv("PROGRESS_STREAM_KEEPALIVE_SECONDS", 15))
+
+
 # Global runtime state
 class AppState:
     def __init__(self):
-        self.progress = {"sent": 0, "total": 0, "status": "idle"}
         self.email_content = {"subject": "", "body": "", "sender_name": ""}
         self.zoho_status = {"connected": False, "message": "Not connected to Zoho CRM"}
         # Store user-specific Zoho credentials
@@ -100,6 +100,22 @@ class Database:
                     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
                 )
             """)
+
+            # Versioned email templates: each upload adds a new version of the user's set
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS email_templates (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    user_id VARCHAR(100) NOT NULL,
+                    version INT NOT NULL,
+                    position VARCHAR(255) NOT NULL,
+                    subject TEXT NOT NULL,
+                    body MEDIUMTEXT NOT NULL,
+                    sender_name VARCHAR(255),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY uq_user_version_position (user_id, version, position),
+                    INDEX idx_user_version (user_id, version)
+                )
+            """)
             
             connection.commit()
             print("Database and tables created successfully!")
@@ -337,5 +353,63 @@ class Database:
                     connection.close()
         return False
 
+    def save_template_version(self, user_id, templates):
+        """Store ``{position: {subject, body, sender_name}}`` as the user's next version; returns it"""
+        connection = self.get_connection()
+        if connection:
+            cursor = None
+            try:
+                cursor = connection.cursor()
+                # Lock the user's rows so two uploads can't claim the same version
+                cursor.execute(
+                    "SELECT COALESCE(MAX(version), 0) FROM email_templates WHERE user_id = %s FOR UPDATE",
+                    (user_id,)
+                )
+                version = cursor.fetchone()[0] + 1
+                cursor.executemany(
+                    "INSERT INTO email_templates (user_id, version, position, subject, body, sender_name) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    [(user_id, version, position, t['subject'], t['body'], t.get('sender_name', ''))
+                     for position, t in templates.items()]
+                )
+                connection.commit()
+                return version
+            except Error as e:
+                print(f"Error saving templates: {e}")
+                connection.rollback()
+                return None
+            finally:
+                if cursor:
+                    cursor.close()
+                if connection.is_connected():
+                    connection.close()
+        return None
+
+    def get_latest_templates(self, user_id):
+        """The user's newest template version as (version, rows), or (None, []) if there is none"""
+        connection = self.get_connection()
+        if connection:
+            cursor = None
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT version, position, subject, body, sender_name FROM email_templates
+                    WHERE user_id = %s AND version = (
+                        SELECT MAX(version) FROM email_templates WHERE user_id = %s
+                    )
+                    ORDER BY id
+                """, (user_id, user_id))
+                rows = cursor.fetchall()
+                return (rows[0]['version'] if rows else None), rows
+            except Error as e:
+                print(f"Error loading templates: {e}")
+                return None, []
+            finally:
+                if cursor:
+                    cursor.close()
+                if connection.is_connected():
+                    connection.close()
+        return None, []
+
 # Global database instance
 db = Database()
@@ -8,6 +8,7 @@ import tldextract
 from ddgs import DDGS
 import time
 import requests
+from services.suppression import suppression_list, INVALID
 
 # Create blueprint
 file_processor_bp = Blueprint('file_processor', __name__)
@@ -500,6 +501,7 @@ class CompanyEmailProcessor:
         batch_results = self._verify_emails_batch(emails)
         
         validation_results = []
+        rejected = []
         for email in emails:
             result = {
                 'email': email,
@@ -532,6 +534,8 @@ class CompanyEmailProcessor:
                     print(f"   ✅ Valid: {email} (score: {score})")
                 else:
                     print(f"   ❌ Invalid: {email} (status: {status}, score: {score})")
+                    if status == 'INVALID':
+                        rejected.append(email)
             else:
                 print(f"   ⚠️ No API result for: {email}")
                 # If no API result, do basic validation
@@ -543,6 +547,10 @@ class CompanyEmailProcessor:
             
             validation_results.append(result)
         
+        # Definitely undeliverable addresses are never worth sending to
+        if rejected:
+            suppression_list.add(rejected, INVALID, 'email verifier')
+        
         return validation_results
 
 class FileProcessor:
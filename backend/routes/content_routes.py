@@ -1,10 +1,8 @@
-from flask import Flask, request, jsonify, send_file, Blueprint
+from flask import Flask, request, jsonify, send_file, Blueprint, Response, stream_with_context
 import pandas as pd
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from itertools import cycle
-import threading
+from itertools import chain
 from flask_cors import CORS
 import google.generativeai as genai
 import os
@@ -17,6 +15,8 @@ import email
 from email.header import decode_header
 import requests
 from config import app_state  # Import the shared state object
+from config import PROGRESS_STREAM_INTERVAL_SECONDS, PROGRESS_STREAM_KEEPALIVE_SECONDS, SMTP_SEND_BACKEND
+from config import SEND_DEFAULT_TIMEZONE, PREVIEW_MAX_ROWS
 from services.service import (
     generate_email_content,
     create_zoho_lead,
@@ -24,19 +24,33 @@ from services.service import (
     get_zoho_tokens,
     refresh_zoho_tokens,
     get_zoho_custom_fields,
-    send_bulk_emails,
     check_email_replies,
+    scan_reply_inboxes,
+    process_reply,
     save_to_excel,
     mark_email_as_read,
+    mark_emails_as_read,
     extract_name_from_email,
     extract_company_from_email,
     extract_phone_number,
-    replace_name_placeholders,
     is_valid_phone_number,
-    send_bulk_emails_with_templates, 
+    start_campaign,
+    resume_paused_campaign,
     is_auto_response,  # Add this import
     ZOHO_ACCESS_TOKEN,
 )
+from services.smtp_pool import smtp_pool
+from utils.helpers import compile_template, placeholder_key, BUILTIN_PLACEHOLDERS
+from services.campaign_store import campaign_store, PAUSED
+from services.progress import CampaignProgress, progress_registry
+from services.sent_log import sent_email_log
+from services.suppression import suppression_list, UNSUBSCRIBED
+from services.template_registry import template_registry
+from services.reply_listener import reply_listeners
+from services.send_scheduler import SendWindow, get_zone, parse_start_at
+from services.recipient_ingest import (
+    save_upload, discard_upload, iter_frames, detect_columns, preview_frame, RecipientNormalizer
+)
 
 content_bp = Blueprint("content", __name__)
 
@@ -189,12 +203,21 @@ def update_content():
     if "sender_name" in data:
         app_state.email_content["sender_name"] = data["sender_name"]
 
-    return jsonify({"message": "Content updated successfully", "content": app_state.email_content})
+    # Compile now so sends reuse the parsed template, and tell the user what it expects
+    placeholders = (compile_template(app_state.email_content.get("subject", "")).placeholders |
+                    compile_template(app_state.email_content.get("body", "")).placeholders)
+
+    return jsonify({
+        "message": "Content updated successfully",
+        "content": app_state.email_content,
+        "placeholders": sorted(placeholders)
+    })
 
 @content_bp.route("/upload-templates", methods=["POST"])
 def upload_templates():
     """Upload Excel file with email templates for different positions"""
     file = request.files["file"]
+    user_id = request.headers.get("X-User-ID", "default_user")
     
     if not file:
         return jsonify({"error": "No file provided"}), 400
@@ -212,33 +235,26 @@ def upload_templates():
         if missing_columns:
             return jsonify({"error": f"Missing required columns: {', '.join(missing_columns)}"}), 400
 
-        # Store templates in app_state
+        # One row per position; a later row for the same position wins
         templates = {}
-        template_details = []
-        
-        for _, row in df.iterrows():
-            position = str(row['position']).strip().lower()
-            template_data = {
-                'subject': str(row['subject']),
-                'body': str(row['body']),
-                'sender_name': str(row.get('sender_name', ''))  # Keep empty if not provided
-            }
-            templates[position] = template_data
-            
-            # Store template details for frontend display
-            template_details.append({
-                'position': position,
-                'subject': template_data['subject'],
-                'body': template_data['body'],
-                'sender_name': template_data['sender_name']
-            })
+        for position, subject, body, sender_name in zip(
+            df['position'].astype(str).str.strip().str.lower(),
+            df['subject'].astype(str),
+            df['body'].astype(str),
+            df['sender_name'].fillna('').astype(str) if 'sender_name' in df.columns else [''] * len(df),
+        ):
+            templates[position] = {'subject': subject, 'body': body, 'sender_name': sender_name}
 
-        app_state.email_templates = templates
-        app_state.default_template = templates.get('general', templates.get('default', next(iter(templates.values())) if templates else None))
-        app_state.template_details = template_details  # Store for frontend access
+        if not templates:
+            return jsonify({"error": "The template file has no rows"}), 400
+
+        # Saved as the user's next version; sends compile each template once and reuse it
+        template_set = template_registry.save(user_id, templates)
+        template_details = template_set.details()
 
         return jsonify({
             "message": f"Successfully loaded {len(templates)} templates",
+            "version": template_set.version,
             "positions": list(templates.keys()),
             "templates": template_details,  # Send template details to frontend
             "templates_with_sender_names": [pos for pos, template in templates.items() if template.get('sender_name')]
@@ -251,6 +267,12 @@ def upload_templates():
 def upload_file():
     file = request.files["file"]
     batch_size = int(request.form.get("batch_size", 250))
+    send_backend = request.form.get("send_backend", SMTP_SEND_BACKEND)  # "threaded" or "async"
+    start_at = request.form.get("start_at", "").strip()           # Optional ISO 8601 start time
+    send_window = request.form.get("send_window", "").strip()     # Optional daily hours, e.g. "09:00-17:00"
+    send_days = request.form.get("send_days", "mon-fri")
+    campaign_timezone = request.form.get("timezone", "").strip() or SEND_DEFAULT_TIMEZONE  # For rows without a time zone
+    user_id = request.headers.get("X-User-ID", "default_user")
 
     # Get template-related data
     use_templates = request.form.get("use_templates", "false").lower() == "true"
@@ -259,6 +281,7 @@ def upload_file():
     sender_emails = request.form.getlist("sender_emails[]")
     sender_passwords = request.form.getlist("sender_passwords[]")
     sender_names = request.form.getlist("sender_names[]")  # Get sender names
+    sender_daily_limits = request.form.getlist("sender_daily_limits[]")  # Optional per-account daily quota
 
     print(f"Received {len(sender_emails)} sender accounts")
     print(f"Sender emails: {sender_emails}")
@@ -270,201 +293,235 @@ def upload_file():
     if len(sender_emails) != len(sender_passwords):
         return jsonify({"error": "Mismatch between number of emails and passwords!"}), 400
 
+    if send_backend not in ("threaded", "async"):
+        return jsonify({"error": "send_backend must be 'threaded' or 'async'"}), 400
+
+    schedule_params = {}
+    if get_zone(campaign_timezone) is None:
+        return jsonify({"error": f"Unknown time zone '{campaign_timezone}'"}), 400
+    try:
+        if start_at:
+            schedule_params["start_at"] = parse_start_at(start_at, campaign_timezone).isoformat()
+        if send_window:
+            schedule_params["send_window"] = SendWindow.parse(send_window, send_days).to_params()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid schedule: {e}"}), 400
+    if schedule_params:
+        schedule_params["timezone"] = campaign_timezone
+
     # Create sender accounts with names
     sender_accounts = []
     for i in range(len(sender_emails)):
         sender_name = sender_names[i] if i < len(sender_names) else ""
-        sender_accounts.append({
+        sender_account = {
             'email': sender_emails[i],
             'password': sender_passwords[i],
             'sender_name': sender_name
-        })
+        }
+        if i < len(sender_daily_limits) and str(sender_daily_limits[i]).strip().isdigit():
+            sender_account['per_day'] = int(sender_daily_limits[i])
+        sender_accounts.append(sender_account)
 
     print(f"Created sender accounts: {sender_accounts}")
 
-    # Read file
-    try:
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-    except Exception as e:
-        return jsonify({"error": f"Error reading file: {str(e)}"}), 400
-
-    # Enhanced email column detection
-    possible_email_cols = ['email', 'Email', 'EMAIL', 'email_id', 'Email ID', 'EMAIL_ID', 
-                          'email_address', 'Email Address', 'EMAIL_ADDRESS', 'recipient_email',
-                          'Recipient Email', 'RECIPIENT_EMAIL', 'mail', 'Mail', 'MAIL', 'Validated Emails',
-                          'e-mail', 'E-mail', 'E-MAIL', 'contact_email', 'Contact Email']
-    
-    # Enhanced name column detection
-    possible_name_cols = ['name', 'Name', 'NAME', 'full_name', 'Full Name', 'FULL_NAME',
-                         'first_name', 'First Name', 'FIRST_NAME', 'last_name', 'Last Name',
-                         'LAST_NAME', 'contact_name', 'Contact Name', 'CONTACT_NAME',
-                         'candidate_name', 'Candidate Name', 'CANDIDATE_NAME']
-    
-    # Position column detection
-    possible_position_cols = ['position', 'Position', 'POSITION', 'job_title', 'Job Title', 
-                             'JOB_TITLE', 'role', 'Role', 'ROLE', 'title', 'Title', 'TITLE']
-
-    email_col = None
-    name_col = None
-    position_col = None
-
-    # Find email column
-    for col in df.columns:
-        col_lower = col.lower().strip()
-        for possible in possible_email_cols:
-            if col_lower == possible.lower():
-                email_col = col
-                break
-        if email_col:
-            break
-
-    if not email_col:
-        for col in df.columns:
-            sample_values = df[col].dropna().head(5)
-            if len(sample_values) > 0 and any('@' in str(val) for val in sample_values):
-                email_col = col
-                break
-
-    if not email_col:
-        return jsonify({"error": "No email column found in the uploaded file!"}), 400
-
-    # Find name column
-    for col in df.columns:
-        col_lower = col.lower().strip()
-        for possible in possible_name_cols:
-            if col_lower == possible.lower():
-                name_col = col
-                break
-        if name_col:
-            break
-
-    # Find position column if using templates
-    if use_templates:
-        for col in df.columns:
-            col_lower = col.lower().strip()
-            for possible in possible_position_cols:
-                if col_lower == possible.lower():
-                    position_col = col
-                    break
-            if position_col:
-                break
-        
-        if not position_col:
-            return jsonify({"error": "No position column found for template matching! Please check your file or change the position column name."}), 400
-
-    recipients = []
-    for _, row in df.iterrows():
-        email_value = row[email_col]
-        if pd.isna(email_value) or not isinstance(email_value, str):
-            continue
-            
-        # Split multiple emails using comma, semicolon, or space
-        email_list = []
-        if email_value:
-            # First split by semicolon, then by comma, then by space
-            for separator in [';', ',', ' ']:
-                if separator in email_value:
-                    # Split and clean each email
-                    split_emails = [email.strip() for email in email_value.split(separator) if email.strip()]
-                    email_list.extend(split_emails)
-                    break
-            else:
-                # No separators found, treat as single email
-                email_list = [email_value.strip()]
-        
-        # Filter valid emails and remove duplicates
-        valid_emails = []
-        seen_emails = set()
-        for email_str in email_list:
-            if email_str and '@' in email_str and email_str not in seen_emails:
-                valid_emails.append(email_str)
-                seen_emails.add(email_str)
-        
-        if not valid_emails:
-            continue
-            
-        name_value = ""
-        if name_col and name_col in df.columns and not pd.isna(row[name_col]):
-            name_value = str(row[name_col])
-        
-        position_value = ""
-        if use_templates and position_col and position_col in df.columns and not pd.isna(row[position_col]):
-            position_value = str(row[position_col]).strip().lower()
-        
-        # Create a recipient entry for each valid email
-        for email_str in valid_emails:
-            # Extract name from email if name column is empty
-            final_name = name_value
-            if not final_name:
-                final_name = extract_name_from_email(email_str)[0] or ""
-            
-            recipients.append({
-                "email": email_str,
-                "name": final_name,
-                "position": position_value
-            })
-
-    if len(recipients) == 0:
-        return jsonify({"error": "No valid email addresses found in the uploaded file!"}), 400
-
-    print(f"Found {len(recipients)} valid recipients after splitting multiple emails")
-
-    # Determine email content source
+    # Validate the email content before touching the recipient file
     if use_templates:
         # Check if templates are loaded
-        if not hasattr(app_state, 'email_templates') or not app_state.email_templates:
+        template_set = template_registry.get(user_id)
+        if template_set is None:
             return jsonify({"error": "No email templates loaded! Please upload template file first."}), 400
-        
-        # Use template-based content
-        template_data = {
-            'templates': app_state.email_templates,
-            'default_template': app_state.default_template
-        }
-        print("Starting template-based email sending...")
-        threading.Thread(
-            target=send_bulk_emails_with_templates,
-            args=(recipients, batch_size, sender_accounts, template_data)
-        ).start()
+        content_templates = [t[key] for t in template_set.templates.values() for key in ('subject', 'body')]
     else:
-        # Use regular email content
-        template_data = None
         subject = request.form.get("subject", "")
         body = request.form.get("body", "")
         sender_name = request.form.get("sender_name", "")
-        
+
         # Validate regular email content
         if not subject or not body or not sender_name:
             return jsonify({"error": "Email content is incomplete! Please generate or enter subject, body, and sender name."}), 400
+        content_templates = [subject, body]
+
+    # Save the file and read only its first chunk; the rest is streamed while sending
+    upload_path = save_upload(file)
+    try:
+        frames = iter_frames(upload_path)
+        first_frame = next(frames, None)
+    except Exception as e:
+        discard_upload(upload_path)
+        return jsonify({"error": f"Error reading file: {str(e)}"}), 400
+    if first_frame is None:
+        first_frame = pd.DataFrame()
 
+    try:
+        columns = detect_columns(first_frame, use_templates)
+    except ValueError as e:
+        discard_upload(upload_path)
+        return jsonify({"error": str(e)}), 400
+
+    # Work out which uploaded columns the templates refer to, and which placeholders have no column
+    placeholders = set()
+    for text in content_templates:
+        placeholders |= compile_template(text).placeholders
+    column_keys = {placeholder_key(col): col for col in first_frame.columns}
+    field_cols = {key: column_keys[key] for key in placeholders - BUILTIN_PLACEHOLDERS if key in column_keys}
+    missing_placeholders = sorted(placeholders - BUILTIN_PLACEHOLDERS - set(column_keys))
+
+    normalizer = RecipientNormalizer(columns, field_cols, suppression_list)
+    first_batch = normalizer.normalize(first_frame)
+    next_frame = next(frames, None)
+    if not first_batch and next_frame is None:
+        discard_upload(upload_path)
+        if normalizer.suppressed:
+            return jsonify({"error": f"All {normalizer.suppressed} valid addresses in the file are suppressed "
+                                     "(bounced, unsubscribed or invalid)."}), 400
+        return jsonify({"error": "No valid email addresses found in the uploaded file!"}), 400
+
+    remaining_frames = chain([next_frame], frames) if next_frame is not None else frames
+    recipient_batches = chain([first_batch], normalizer.iter_batches(remaining_frames))
+    shared_params = {"upload_path": upload_path, "columns": columns, "field_cols": field_cols, "ingested": False,
+                     "send_backend": send_backend, **schedule_params}
+
+    if use_templates:
+        # Use template-based content
+        template_data = template_set.to_params()
+        print(f"Starting template-based email sending with template version {template_set.version}...")
+        campaign_id = start_campaign(
+            "templates",
+            {"batch_size": batch_size, "template_data": template_data, **shared_params},
+            sender_accounts, recipient_batches, user_id, normalizer
+        )
+    else:
         print("Starting regular email sending...")
-        threading.Thread(
-            target=send_bulk_emails,
-            args=(recipients, batch_size, sender_accounts, subject, body, sender_name)
-        ).start()
+        campaign_id = start_campaign(
+            "standard",
+            {"batch_size": batch_size, "subject": subject, "body": body, "sender_name": sender_name, **shared_params},
+            sender_accounts, recipient_batches, user_id, normalizer
+        )
 
-    return jsonify({"message": f"Started sending {len(recipients)} personalized emails."})
+    if "start_at" in schedule_params:
+        message = f"Campaign scheduled to start at {schedule_params['start_at']}."
+    elif "send_window" in schedule_params:
+        message = "Started the campaign; emails go out during the send window in each recipient's time zone."
+    else:
+        message = "Started sending personalized emails; recipients are read from the file as sending progresses."
+    return jsonify({
+        "message": message,
+        "campaign_id": campaign_id,
+        "missing_placeholders": missing_placeholders  # Left as written in the sent emails
+    })
+
+@content_bp.route("/campaigns", methods=["GET"])
+def list_campaigns():
+    """List the user's campaigns with sent/failed/pending counts from the job store"""
+    user_id = request.headers.get("X-User-ID", "default_user")
+    return jsonify({"campaigns": campaign_store.list_campaigns(user_id)})
+
+@content_bp.route("/campaigns/<campaign_id>/resume", methods=["POST"])
+def resume_campaign(campaign_id):
+    """Resume a campaign paused by its sender accounts, optionally with new ones"""
+    user_id = request.headers.get("X-User-ID", "default_user")
+    campaign = campaign_store.get_campaign(campaign_id)
+    if not campaign or campaign["user_id"] != user_id:
+        return jsonify({"error": "Campaign not found"}), 404
+    if not campaign["status"].startswith(PAUSED):
+        return jsonify({"error": f"Only paused campaigns can be resumed (status: {campaign['status']})"}), 400
+
+    sender_accounts = (request.json or {}).get("sender_accounts") if request.is_json else None
+    if sender_accounts is not None and (
+        not isinstance(sender_accounts, list)
+        or not all(isinstance(a, dict) and a.get("email") and a.get("password") for a in sender_accounts)
+    ):
+        return jsonify({"error": "sender_accounts must be a list of {email, password, sender_name}"}), 400
+
+    if not resume_paused_campaign(campaign_id, sender_accounts):
+        return jsonify({"error": "Campaign is no longer paused"}), 409
+    return jsonify({"message": "Campaign resumed", "campaign_id": campaign_id})
+
+@content_bp.route("/suppressions", methods=["GET"])
+def get_suppressions():
+    """Suppression list size per reason, or the entry for ?email=..."""
+    email_address = request.args.get("email")
+    if email_address:
+        return jsonify({"email": email_address, "suppression": suppression_list.lookup(email_address)})
+    return jsonify({"total": len(suppression_list), "by_reason": suppression_list.counts()})
+
+@content_bp.route("/suppressions", methods=["POST"])
+def add_suppressions():
+    """Suppress addresses, e.g. unsubscribes: {"emails": [...], "reason": "unsubscribed"}"""
+    data = request.get_json(silent=True) or {}
+    emails = data.get("emails") or []
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "emails must be a non-empty list"}), 400
+    added = suppression_list.add(emails, data.get("reason") or UNSUBSCRIBED, data.get("detail"))
+    return jsonify({"added": added, "total": len(suppression_list)})
+
+@content_bp.route("/suppressions", methods=["DELETE"])
+def remove_suppressions():
+    data = request.get_json(silent=True) or {}
+    emails = data.get("emails") or []
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "emails must be a non-empty list"}), 400
+    removed = suppression_list.remove(emails)
+    return jsonify({"removed": removed, "total": len(suppression_list)})
 
 @content_bp.route("/preview", methods=["POST"])
 def preview_file():
     file = request.files["file"]
+    rows = min(max(request.form.get("rows", 5, type=int), 1), PREVIEW_MAX_ROWS)
 
-    if file.filename.endswith(".csv"):
-        df = pd.read_csv(file)
-    else:
-        df = pd.read_excel(file)
+    # Reads only the header and the first rows, however large the file is
+    try:
+        df, row_count, exact = preview_frame(file, rows)
+    except Exception as e:
+        return jsonify({"error": f"Error reading file: {str(e)}"}), 400
 
-    preview_data = df.head(5).to_dict(orient="records")
+    preview_data = df.to_dict(orient="records")
     columns = df.columns.tolist()
 
-    return jsonify({"columns": columns, "data": preview_data})
+    return jsonify({"columns": columns, "data": preview_data, "row_count": row_count, "row_count_exact": exact})
+
+def _campaign_progress():
+    """Progress for ?campaign_id=..., or the requesting user's latest campaign"""
+    campaign_id = request.args.get("campaign_id")
+    if campaign_id:
+        return progress_registry.get(campaign_id)
+    user_id = request.headers.get("X-User-ID", "default_user")
+    return progress_registry.latest_for_user(user_id)
 
 @content_bp.route("/progress", methods=["GET"])
 def get_progress():
-    # Use app_state instead of global progress
-    return jsonify(app_state.progress)
+    progress = _campaign_progress()
+    if not progress:
+        return jsonify(CampaignProgress().snapshot())
+    return jsonify(progress.snapshot())
+
+@content_bp.route("/progress/stream", methods=["GET"])
+def stream_progress():
+    """Push campaign progress as Server-Sent Events until the campaign finishes"""
+    progress = _campaign_progress()
+    if not progress:
+        return jsonify({"error": "No campaign found"}), 404
+
+    def events():
+        version = None
+        while True:
+            snapshot = progress.snapshot()
+            if snapshot["version"] != version:
+                version = snapshot["version"]
+                yield f"data: {json.dumps(snapshot)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+            if progress.is_finished():
+                return
+            progress.wait_for_update(version, PROGRESS_STREAM_KEEPALIVE_SECONDS)
+            # Coalesce bursts of per-message updates into one push
+            time.sleep(PROGRESS_STREAM_INTERVAL_SECONDS)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @content_bp.route("/zoho-auth", methods=["GET"])
 def zoho_auth():
@@ -589,47 +646,11 @@ def zoho_check_replies():
         # 1. Fetch replies from Gmail IMAP (excluding auto-responses)
         replies = check_email_replies(sender_email, sender_password)
 
+        # 2. Create leads in Zoho CRM and log each reply to Excel
         created_leads = []
         for reply in replies:
-            # Only process if this is a genuine reply (not an auto-response)
-            if not is_auto_response(reply):
-                # Extract phone number and validate it
-                phone = extract_phone_number(reply.get("body", ""))
-                if not is_valid_phone_number(phone):
-                    phone = ""  # Don't include invalid phone numbers
-                
-                lead_data = {
-                    "email": reply.get("from"),
-                    "first_name": reply.get("first_name", ""),
-                    "last_name": reply.get("last_name", ""),
-                    "company": reply.get("company", "From Email Reply"),
-                    "phone": phone,  # This will be empty if invalid
-                    "body": reply.get("body", "")
-                }
-
-                # 2. Create lead in Zoho CRM - pass user_id
-                lead_id = create_zoho_lead(lead_data, user_id)
-                if lead_id:
-                    reply["zoho_lead_id"] = lead_id
-                    reply["converted_to_lead"] = True
-                    created_leads.append(lead_id)
-                else:
-                    reply["converted_to_lead"] = False
-
-                # 3. Save reply details to Excel
-                save_to_excel({
-                    "timestamp": datetime.now().isoformat(),
-                    "sender_email": reply.get("from"),
-                    "recipient_email": sender_email,
-                    "subject": reply.get("subject"),
-                    "body": reply.get("body"),
-                    "first_name": reply.get("first_name", ""),
-                    "last_name": reply.get("last_name", ""),
-                    "company": reply.get("company", ""),
-                    "phone": phone,  # Save the validated phone (or empty)
-                    "converted_to_lead": reply.get("converted_to_lead", False),
-                    "zoho_lead_id": reply.get("zoho_lead_id", "")
-                })
+            if process_reply(reply, sender_email, user_id) and reply.get("zoho_lead_id"):
+                created_leads.append(reply["zoho_lead_id"])
 
         return jsonify({
             "message": f"Found {len(replies)} replies. "
@@ -640,6 +661,102 @@ def zoho_check_replies():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@content_bp.route("/zoho-check-replies-all", methods=["POST"])
+def zoho_check_replies_all():
+    """Check every given sender account for replies at once and create leads for the merged replies"""
+    data = request.json or {}
+    accounts = {}
+    for account in data.get("accounts", []):
+        if account.get("sender_email") and account.get("sender_password"):
+            accounts.setdefault(account["sender_email"].lower(), account)
+
+    if not accounts:
+        return jsonify({"error": "No sender accounts provided!"}), 400
+
+    try:
+        user_id = request.headers.get("X-User-ID", "default_user")
+        started = time.monotonic()
+
+        # 1. Scan the inboxes concurrently; a reply found in several of them is kept once
+        replies, account_results = scan_reply_inboxes(list(accounts.values()), data.get("mailbox", "INBOX"))
+        scan_seconds = round(time.monotonic() - started, 3)
+
+        # 2. Create leads in Zoho CRM and log each reply to Excel
+        created_leads = []
+        if data.get("create_leads", True):
+            for reply in replies:
+                if process_reply(reply, reply["sender_email"], user_id) and reply.get("zoho_lead_id"):
+                    created_leads.append(reply["zoho_lead_id"])
+
+        failed = [r["sender_email"] for r in account_results if r["status"] == "error"]
+        return jsonify({
+            "message": f"Checked {len(account_results)} accounts ({len(failed)} failed). "
+                       f"Found {len(replies)} replies. Created {len(created_leads)} leads in Zoho CRM.",
+            "replies": replies,
+            "accounts": account_results,
+            "duplicates": sum(r.get("duplicates", 0) for r in account_results),
+            "scan_seconds": scan_seconds
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@content_bp.route("/mark-replies-read", methods=["POST"])
+def mark_replies_read():
+    """Mark many replies (their ``id`` UIDs) as read with one IMAP command"""
+    data = request.json or {}
+    sender_email = data.get("sender_email")
+    sender_password = data.get("sender_password")
+    email_ids = [str(i) for i in data.get("email_ids", []) if str(i).isdigit()]
+
+    if not sender_email or not sender_password:
+        return jsonify({"error": "Missing sender email or password"}), 400
+    if not email_ids:
+        return jsonify({"error": "No email ids provided"}), 400
+
+    if not mark_emails_as_read(sender_email, sender_password, email_ids):
+        return jsonify({"error": "Could not update the mailbox"}), 502
+    return jsonify({"message": f"Marked {len(email_ids)} replies as read"})
+
+@content_bp.route("/reply-listeners", methods=["GET", "POST", "DELETE"])
+def manage_reply_listeners():
+    """List, register or remove background IMAP IDLE listeners for sender accounts"""
+    user_id = request.headers.get("X-User-ID", "default_user")
+    if request.method == "GET":
+        return jsonify({"listeners": reply_listeners.listeners(user_id)})
+
+    data = request.json or {}
+    sender_email = data.get("sender_email")
+    if not sender_email:
+        return jsonify({"error": "Missing sender email"}), 400
+
+    if request.method == "DELETE":
+        if not reply_listeners.unregister(sender_email, user_id):
+            return jsonify({"error": f"No reply listener for {sender_email}"}), 404
+        return jsonify({"message": f"Stopped listening for replies to {sender_email}"})
+
+    sender_password = data.get("sender_password")
+    if not sender_password:
+        return jsonify({"error": "Missing sender email or password"}), 400
+    listener = reply_listeners.register(sender_email, sender_password, user_id, data.get("mailbox", "INBOX"))
+    if listener is None:
+        return jsonify({"error": f"{sender_email} already has a reply listener of another user"}), 403
+    return jsonify({
+        "message": f"Listening for replies to {sender_email}; new replies are turned into leads as they arrive",
+        "listener": listener.snapshot()
+    })
+
+@content_bp.route("/replies", methods=["GET"])
+def get_listener_replies():
+    """Replies processed by the background listeners; pass ?since=<last reply_id> to get only new ones"""
+    user_id = request.headers.get("X-User-ID", "default_user")
+    replies = reply_listeners.replies(user_id, request.args.get("since", 0, type=int))
+    return jsonify({
+        "replies": replies,
+        "last_reply_id": replies[-1]["reply_id"] if replies else request.args.get("since", 0, type=int),
+        "listeners": reply_listeners.listeners(user_id)
+    })
+
 @content_bp.route("/zoho-generate-reply", methods=["POST"])
 def zoho_generate_reply():
     """Generate an AI reply for a received email"""
@@ -686,10 +803,7 @@ def zoho_send_reply():
     
     try:
         # Send the email
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            
+        with smtp_pool.connection(sender_email, sender_password) as server:
             msg = MIMEMultipart()
             msg['From'] = sender_email
             msg['To'] = recipient_email
@@ -767,6 +881,19 @@ def download_replies():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@content_bp.route("/download-sent-emails", methods=["GET"])
+def download_sent_emails():
+    """Export the sent-email log as an Excel file"""
+    try:
+        return send_file(
+            sent_email_log.export_excel(),
+            as_attachment=True,
+            download_name=f"sent_emails_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @content_bp.route("/zoho-fields", methods=["GET"])
 def zoho_fields():
     """Get Zoho CRM field information"""
@@ -0,0 +1,198 @@
+import asyncio
+import aiosmtplib
+
+from config import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_TIMEOUT_SECONDS,
+    SMTP_STARTTLS,
+    SMTP_QUOTA_MAX_WAIT_SECONDS,
+    SMTP_RECONNECT_ATTEMPTS,
+    SMTP_RECONNECT_BACKOFF_SECONDS,
+    SMTP_ASYNC_CONNECTIONS_PER_ACCOUNT,
+)
+from services.dispatcher import CampaignDispatcher
+from services.rate_limiter import is_deferral
+
+# Recipients pulled from the (blocking) recipient iterable per thread hop
+PRODUCER_CHUNK = 500
+
+
+def _take_chunk(recipients):
+    """Up to ``PRODUCER_CHUNK`` recipients, cut short by a ``None`` (nothing due yet) marker.
+
+    Returns ``(chunk, exhausted)``.
+    """
+    chunk = []
+    for recipient in recipients:
+        if recipient is None:
+            return chunk, False
+        chunk.append(recipient)
+        if len(chunk) >= PRODUCER_CHUNK:
+            return chunk, False
+    return chunk, True
+
+
+class AsyncCampaignDispatcher(CampaignDispatcher):
+    """asyncio variant of ``CampaignDispatcher`` for high-concurrency campaigns.
+
+    Each sender account gets ``connections_per_account`` aiosmtplib connections,
+    each with one message in flight, all fed by the same per-domain scheduler
+    as the threaded dispatcher. Rate limiting, deferrals, results and
+    progress work exactly as in the threaded dispatcher, and so does failover: an
+    account whose connections keep failing is quarantined and its recipients go
+    to the other accounts. ``run()`` blocks the calling (campaign) thread until
+    the event loop has drained the queue.
+    """
+
+    def __init__(self, sender_accounts, compose, progress, batch_size=250, on_sent=None, on_result=None,
+                 connections_per_account=SMTP_ASYNC_CONNECTIONS_PER_ACCOUNT,
+                 host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS, login=True, **kwargs):
+        # Set first: the default per-domain concurrency cap counts every connection
+        self.connections_per_account = max(1, int(connections_per_account))
+        super().__init__(sender_accounts, compose, progress, batch_size, on_sent, on_result, **kwargs)
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.login = login
+        self._producing = True
+
+    def run(self, recipients):
+        """Send to every recipient and block until the event loop is done"""
+        asyncio.run(self._run(recipients))
+        self._finish()
+        return self.error
+
+    async def _run(self, recipients):
+        producer = asyncio.create_task(self._produce_async(iter(recipients)))
+        connections = [
+            asyncio.create_task(self._connection(account))
+            for account in self.sender_accounts
+            for _ in range(self.connections_per_account)
+        ]
+        await asyncio.gather(*connections)
+        self._workers_done.set()
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+    async def _produce_async(self, recipients):
+        """Pull recipients in chunks off-loop, staying at most ``queue_limit`` ahead"""
+        try:
+            while not self._stop.is_set():
+                while self._queue.qsize() >= self.queue_limit and not self._stop.is_set():
+                    await asyncio.sleep(0.05)
+                chunk, exhausted = await asyncio.to_thread(_take_chunk, recipients)
+                self._pending += len(chunk)
+                for recipient in chunk:
+                    self._queue.put(recipient)
+                if exhausted:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._abort(f"Error reading recipients: {e}")
+        finally:
+            self._producing = False
+
+    async def _next_recipient(self):
+        """Next queued recipient, or None once every recipient has a result"""
+        while not self._stop.is_set():
+            recipient = self._queue.get_nowait()
+            if recipient is not None:
+                return recipient
+            if self._queue.empty() and self._release_retries():
+                continue
+            if not self._producing and self._pending == 0:
+                return None
+            await asyncio.sleep(0.02)
+        return None
+
+    async def _connect(self, account):
+        smtp = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=SMTP_TIMEOUT_SECONDS,
+                               start_tls=self.starttls)
+        await smtp.connect()
+        if self.login:
+            await smtp.login(account['email'], account['password'])
+        return smtp
+
+    async def _acquire(self, limiter):
+        """Wait for the account's limiter without blocking the loop; False if over quota"""
+        while not self._stop.is_set():
+            wait = limiter.try_acquire()
+            if wait <= 0:
+                return True
+            if wait > SMTP_QUOTA_MAX_WAIT_SECONDS:
+                return False
+            await asyncio.sleep(min(wait, 1.0))
+        return False
+
+    async def _connection(self, account):
+        sender_email = account['email']
+        limiter = self.limiters.get(account)
+        smtp = None
+        reconnects = 0
+
+        try:
+            while not self._stop.is_set() and not self.is_quarantined(sender_email):
+                recipient = await self._next_recipient()
+                if recipient is None:
+                    return
+                try:
+                    if not await self._acquire(limiter):
+                        self._requeue([recipient])
+                        if not self._stop.is_set():
+                            print(f"Quota reached for {sender_email}, closing one of its connections")
+                        return
+                    if smtp is None:
+                        smtp = await self._connect(account)
+                    smtp = await self._send_one_async(smtp, account, recipient, limiter)
+                    reconnects = 0
+                except aiosmtplib.SMTPAuthenticationError as e:
+                    self._quarantine(sender_email, f"SMTP Authentication failed: {e}", [recipient])
+                    return
+                except (aiosmtplib.SMTPException, OSError) as e:
+                    reconnects += 1
+                    if reconnects > SMTP_RECONNECT_ATTEMPTS:
+                        self._quarantine(sender_email, f"SMTP error: {e}", [recipient])
+                        return
+                    print(f"SMTP connection for {sender_email} failed ({e}), reconnecting (attempt {reconnects})")
+                    self._requeue([recipient])
+                    if smtp is not None:
+                        smtp.close()
+                        smtp = None
+                    await asyncio.sleep(SMTP_RECONNECT_BACKOFF_SECONDS * reconnects)
+                    continue
+                if self.is_quarantined(sender_email):
+                    return
+        except Exception as e:
+            self._abort(str(e))
+        finally:
+            if smtp is not None:
+                try:
+                    await smtp.quit()
+                except Exception:
+                    smtp.close()
+
+    async def _send_one_async(self, smtp, account, recipient, limiter):
+        """Send one message; returns the connection to keep using"""
+        msg, sent_row = self.compose(recipient, account)
+
+        try:
+            try:
+                await smtp.sendmail(msg.from_addr, msg.to_addrs, msg.data)
+            except aiosmtplib.SMTPServerDisconnected:
+                print(f"SMTP session for {account['email']} dropped, reconnecting...")
+                smtp = await self._connect(account)
+                await smtp.sendmail(msg.from_addr, msg.to_addrs, msg.data)
+        except aiosmtplib.SMTPAuthenticationError:
+            raise
+        except aiosmtplib.SMTPSenderRefused as e:
+            if not is_deferral(e):
+                raise  # The account itself is blocked; handled like a connection failure
+            self._record_failure(account, recipient, limiter, e)
+            return smtp
+        except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException) as e:
+            self._record_failure(account, recipient, limiter, e)
+            return smtp
+        self._record_sent(account, recipient, limiter, sent_row)
+        return smtp
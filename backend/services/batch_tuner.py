@@ -0,0 +1,120 @@
+import threading
+
+from config import (
+    SMTP_BATCH_MIN_SIZE,
+    SMTP_BATCH_MAX_SIZE,
+    SMTP_BATCH_TARGET_SECONDS,
+    SMTP_BATCH_MAX_ERROR_RATE,
+)
+
+# Weight of the newest batch in the latency / error-rate moving averages
+SMOOTHING = 0.3
+
+
+class AccountBatchStats:
+    """Moving send latency and temporary-failure rate of one sender account, and its batch size"""
+
+    __slots__ = ("size", "reason", "latency", "error_rate", "batches")
+
+    def __init__(self, size):
+        self.size = size
+        self.reason = "initial"
+        self.latency = None  # Seconds per attempted message
+        self.error_rate = 0.0
+        self.batches = 0
+
+    def observe(self, attempted, failed, elapsed):
+        latency = elapsed / attempted
+        error_rate = failed / attempted
+        if self.latency is None:
+            self.latency = latency
+            self.error_rate = error_rate
+        else:
+            self.latency += SMOOTHING * (latency - self.latency)
+            self.error_rate += SMOOTHING * (error_rate - self.error_rate)
+        self.batches += 1
+
+
+class BatchTuner:
+    """Chooses how many recipients each sender account takes per batch.
+
+    After every batch the account's size is re-derived from what was measured:
+
+    - rate of temporary (4xx) failures above ``max_error_rate``: halve it; these
+      are the server pushing back, unlike 5xx bounces of bad addresses
+    - otherwise size it so a batch takes about ``target_seconds`` at the observed
+      per-message latency, growing at most 2x per batch
+    - never more than the account's quota allows within ``target_seconds``, so a
+      throttled account doesn't sit on recipients the others could send
+
+    Connection failures also halve the size. Sizes stay within ``min_size`` and
+    ``max_size``, and every change is published to the campaign progress together
+    with the reason for it.
+    """
+
+    def __init__(self, initial_size, progress=None, min_size=SMTP_BATCH_MIN_SIZE, max_size=SMTP_BATCH_MAX_SIZE,
+                 target_seconds=SMTP_BATCH_TARGET_SECONDS, max_error_rate=SMTP_BATCH_MAX_ERROR_RATE):
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.initial_size = self._clamp(initial_size)
+        self.progress = progress
+        self.target_seconds = target_seconds
+        self.max_error_rate = max_error_rate
+        self._accounts = {}  # Format: {sender_email: AccountBatchStats}
+        self._lock = threading.Lock()
+
+    def _clamp(self, size):
+        return max(self.min_size, min(self.max_size, int(size)))
+
+    def _stats(self, sender_email):
+        stats = self._accounts.get(sender_email)
+        if stats is None:
+            stats = self._accounts[sender_email] = AccountBatchStats(self.initial_size)
+        return stats
+
+    def size_for(self, sender_email, limiter=None):
+        """Batch size to use for the account's next batch"""
+        with self._lock:
+            stats = self._stats(sender_email)
+            size = stats.size
+        if limiter is not None:
+            headroom = int(limiter.capacity_within(self.target_seconds))
+            if headroom < size:
+                size = max(1, headroom)
+                self._publish(sender_email, stats, size, "quota")
+        return size
+
+    def record_batch(self, sender_email, attempted, failed, elapsed):
+        """Feed back one finished (or handed-off) batch and re-derive the size"""
+        if attempted <= 0:
+            return
+        with self._lock:
+            stats = self._stats(sender_email)
+            stats.observe(attempted, failed, elapsed)
+            if stats.error_rate > self.max_error_rate:
+                size, reason = stats.size // 2, "errors"
+            elif stats.latency > 0:
+                size, reason = min(stats.size * 2, self.target_seconds / stats.latency), "latency"
+            else:
+                size, reason = stats.size * 2, "latency"
+            stats.size = self._clamp(size)
+            stats.reason = reason
+        self._publish(sender_email, stats, stats.size, reason)
+
+    def record_connection_error(self, sender_email):
+        with self._lock:
+            stats = self._stats(sender_email)
+            stats.size = self._clamp(stats.size // 2)
+            stats.reason = "connection errors"
+        self._publish(sender_email, stats, stats.size, stats.reason)
+
+    def _publish(self, sender_email, stats, size, reason):
+        if self.progress is None:
+            return
+        self.progress.set_account(
+            sender_email,
+            batch_size=size,
+            batch_reason=reason,
+            latency_ms=round(stats.latency * 1000, 1) if stats.latency is not None else None,
+            error_rate=round(stats.error_rate, 3),
+        )
@@ -0,0 +1,348 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from config import (
+    CAMPAIGN_DB_PATH,
+    CAMPAIGN_CHECKPOINT_EVERY,
+    CAMPAIGN_CHECKPOINT_SECONDS,
+    CAMPAIGN_SECRET_KEY,
+    CAMPAIGN_KEY_PATH,
+)
+from services.recipients import Recipient
+
+SCHEDULED = "scheduled"  # Campaign waiting for its start_at time
+PAUSED = "paused"  # Stopped by its sender accounts (quota, failures); resumable
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+HARD_FAILED = "hard_failed"  # Permanent 5xx reply; never retried
+
+
+def load_secret_key(secret_key=CAMPAIGN_SECRET_KEY, key_path=CAMPAIGN_KEY_PATH):
+    """The configured Fernet key or, without one, the key in ``key_path``, generated (mode 0600) on first use"""
+    if secret_key:
+        return secret_key
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(key_path, "rb") as f:
+            return f.read().strip()
+    key = Fernet.generate_key()
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"Generated a key for stored campaign credentials in {key_path}")
+    return key
+
+
+class CampaignStore:
+    """SQLite-backed record of every campaign and the state of each recipient.
+
+    A campaign row keeps what is needed to restart the send (content, template
+    data, batch size and sender accounts); recipient rows move from ``pending``
+    to ``sent``, ``failed`` or ``hard_failed`` as the dispatcher checkpoints its
+    results, together with the SMTP reply code of the last attempt.
+
+    The sender accounts include SMTP passwords, kept until the campaign
+    finishes (scheduled or interrupted campaigns keep them so they can start
+    or resume). They are always encrypted, with ``CAMPAIGN_SECRET_KEY`` or else
+    a key generated into ``CAMPAIGN_KEY_PATH``, and the database file is only
+    readable by its owner.
+    """
+
+    def __init__(self, path=CAMPAIGN_DB_PATH, secret_key=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fernet = Fernet(secret_key or load_secret_key())
+        if path != ":memory:":
+            # Create (or tighten) the file as owner-only before SQLite opens it; its WAL files inherit the mode
+            os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+            os.chmod(path, 0o600)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaigns (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    mode TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    sender_accounts TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_recipients (
+                    campaign_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    email TEXT NOT NULL,
+                    name TEXT,
+                    position TEXT,
+                    fields TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    smtp_code INTEGER,
+                    tz TEXT,
+                    PRIMARY KEY (campaign_id, seq)
+                )
+            """)
+            # Stores created before per-column template placeholders lack this column
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(campaign_recipients)")}
+            if "fields" not in columns:
+                self._conn.execute("ALTER TABLE campaign_recipients ADD COLUMN fields TEXT")
+            if "smtp_code" not in columns:
+                self._conn.execute("ALTER TABLE campaign_recipients ADD COLUMN smtp_code INTEGER")
+            if "tz" not in columns:
+                self._conn.execute("ALTER TABLE campaign_recipients ADD COLUMN tz TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_campaign_recipients_status ON campaign_recipients (campaign_id, status)"
+            )
+            self._conn.commit()
+
+    def create_campaign(self, mode, params, sender_accounts, recipients=(), user_id=None, status="running"):
+        """Persist a new campaign, with any recipients already known marked pending"""
+        campaign_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO campaigns (id, user_id, mode, params, sender_accounts, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (campaign_id, user_id, mode, json.dumps(params), self._seal(sender_accounts), status, now, now)
+            )
+            self._conn.commit()
+        self.add_recipients(campaign_id, list(recipients), 0)
+        return campaign_id
+
+    def add_recipients(self, campaign_id, recipients, start_seq):
+        """Store a batch of pending recipients, numbering them from ``start_seq``.
+
+        Each ``Recipient`` gets its ``seq`` so results can be checkpointed.
+        """
+        if not recipients:
+            return
+        rows = []
+        for seq, r in enumerate(recipients, start_seq):
+            r.seq = seq
+            rows.append((campaign_id, seq, r.email, r.name, r.position,
+                         json.dumps(r.fields) if r.field_keys else None, r.tz))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO campaign_recipients (campaign_id, seq, email, name, position, fields, tz) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def recipient_count(self, campaign_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM campaign_recipients WHERE campaign_id = ?", (campaign_id,)
+            ).fetchone()[0]
+
+    def recipient_emails(self, campaign_id):
+        """Every address stored for the campaign so far"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT email FROM campaign_recipients WHERE campaign_id = ?", (campaign_id,)
+            ).fetchall()
+        return [row["email"] for row in rows]
+
+    def update_params(self, campaign_id, params):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campaigns SET params = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(params), datetime.now().isoformat(), campaign_id)
+            )
+            self._conn.commit()
+
+    def get_campaign(self, campaign_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        if row is None:
+            return None
+        campaign = dict(row)
+        campaign["params"] = json.loads(campaign["params"])
+        campaign["sender_accounts"] = self._open(campaign["sender_accounts"])
+        return campaign
+
+    def _seal(self, sender_accounts):
+        return self._fernet.encrypt(json.dumps(sender_accounts).encode()).decode()
+
+    def _open(self, stored):
+        """Sender accounts from the column, which holds a Fernet token (or plain JSON in older stores)"""
+        if stored.startswith("["):
+            return json.loads(stored)  # Written before credentials were encrypted, or cleared ('[]')
+        try:
+            return json.loads(self._fernet.decrypt(stored.encode()))
+        except InvalidToken:
+            raise ValueError("Campaign credentials were encrypted with a different key; "
+                             "check CAMPAIGN_SECRET_KEY or CAMPAIGN_KEY_PATH")
+
+    def pending_count(self, campaign_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM campaign_recipients WHERE campaign_id = ? AND status = ?",
+                (campaign_id, PENDING)
+            ).fetchone()[0]
+
+    def iter_pending_recipients(self, campaign_id, page_size=1000):
+        """Recipients that have not been sent or failed yet, in upload order, read a page at a time"""
+        after = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, email, name, position, fields, tz FROM campaign_recipients "
+                    "WHERE campaign_id = ? AND status = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (campaign_id, PENDING, after, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            after = rows[-1]["seq"]
+            yield from (self._recipient(row) for row in rows)
+
+    def pending_recipients_by_seq(self, campaign_id, seqs):
+        """The still-pending recipients among ``seqs`` (at most a few hundred per call)"""
+        if not len(seqs):
+            return []
+        placeholders = ",".join("?" * len(seqs))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, email, name, position, fields, tz FROM campaign_recipients "
+                f"WHERE campaign_id = ? AND status = ? AND seq IN ({placeholders}) ORDER BY seq",
+                (campaign_id, PENDING, *seqs)
+            ).fetchall()
+        return [self._recipient(row) for row in rows]
+
+    @staticmethod
+    def _recipient(row):
+        return Recipient.with_fields(row["email"], row["name"] or "", row["position"] or "",
+                                     json.loads(row["fields"]) if row["fields"] else None, row["tz"], row["seq"])
+
+    def record_results(self, campaign_id, results):
+        """Store a batch of (seq, status, error, smtp_code) results in one transaction"""
+        if not results:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE campaign_recipients SET status = ?, error = ?, smtp_code = ? WHERE campaign_id = ? AND seq = ?",
+                [(status, error, smtp_code, campaign_id, seq) for seq, status, error, smtp_code in results]
+            )
+            self._conn.execute(
+                "UPDATE campaigns SET updated_at = ? WHERE id = ?", (datetime.now().isoformat(), campaign_id)
+            )
+            self._conn.commit()
+
+    def claim_paused(self, campaign_id):
+        """Set a paused campaign running again; False if it was not paused (or already claimed)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE campaigns SET status = 'running', updated_at = ? WHERE id = ? AND status LIKE ?",
+                (datetime.now().isoformat(), campaign_id, f"{PAUSED}%")
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def update_sender_accounts(self, campaign_id, sender_accounts):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campaigns SET sender_accounts = ?, updated_at = ? WHERE id = ?",
+                (self._seal(sender_accounts), datetime.now().isoformat(), campaign_id)
+            )
+            self._conn.commit()
+
+    def set_status(self, campaign_id, status, clear_credentials=False):
+        """Update the campaign status, dropping stored passwords once it is finished"""
+        with self._lock:
+            if clear_credentials:
+                self._conn.execute(
+                    "UPDATE campaigns SET status = ?, sender_accounts = '[]', updated_at = ? WHERE id = ?",
+                    (status, datetime.now().isoformat(), campaign_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE campaigns SET status = ?, updated_at = ? WHERE id = ?",
+                    (status, datetime.now().isoformat(), campaign_id)
+                )
+            self._conn.commit()
+
+    def scheduled_campaigns(self):
+        """(id, start_at) of campaigns waiting for their start time"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, params FROM campaigns WHERE status = ? ORDER BY created_at", (SCHEDULED,)
+            ).fetchall()
+        return [(row["id"], json.loads(row["params"]).get("start_at")) for row in rows]
+
+    def incomplete_campaigns(self):
+        """IDs of campaigns that were still running when the process stopped"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM campaigns WHERE status = 'running' ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def list_campaigns(self, user_id=None):
+        """Campaign summaries with per-status recipient counts"""
+        query = """
+            SELECT c.id, c.user_id, c.mode, c.status, c.created_at, c.updated_at,
+                   COUNT(r.seq) AS total,
+                   SUM(r.status = 'sent') AS sent,
+                   SUM(r.status = 'failed') AS failed,
+                   SUM(r.status = 'hard_failed') AS hard_failed,
+                   SUM(r.status = 'pending') AS pending
+            FROM campaigns c LEFT JOIN campaign_recipients r ON r.campaign_id = c.id
+        """
+        params = ()
+        if user_id is not None:
+            query += " WHERE c.user_id = ?"
+            params = (user_id,)
+        query += " GROUP BY c.id ORDER BY c.created_at DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+
+class CampaignCheckpointer:
+    """Buffers per-recipient results and writes them to the store in batches"""
+
+    def __init__(self, store, campaign_id, every=CAMPAIGN_CHECKPOINT_EVERY,
+                 max_seconds=CAMPAIGN_CHECKPOINT_SECONDS):
+        self.store = store
+        self.campaign_id = campaign_id
+        self.every = every
+        self.max_seconds = max_seconds
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, recipient, status, error=None, smtp_code=None):
+        """Dispatcher ``on_result`` callback"""
+        with self._lock:
+            self._buffer.append((recipient.seq, status, error, smtp_code))
+            due = (len(self._buffer) >= self.every or
+                   time.monotonic() - self._last_flush >= self.max_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            results, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        self.store.record_results(self.campaign_id, results)
+
+
+# Shared store used by the /upload route and startup resume
+campaign_store = CampaignStore()
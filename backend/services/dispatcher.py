@@ -0,0 +1,358 @@
+import heapq
+import itertools
+import smtplib
+import threading
+import time
+
+from config import (
+    SMTP_QUOTA_MAX_WAIT_SECONDS,
+    SMTP_RECONNECT_ATTEMPTS,
+    SMTP_RECONNECT_BACKOFF_SECONDS,
+    SMTP_RETRY_MAX_ATTEMPTS,
+    SMTP_RETRY_INITIAL_SECONDS,
+    SMTP_RETRY_MAX_SECONDS,
+    SMTP_DOMAIN_MAX_IN_FLIGHT,
+    SMTP_DOMAIN_RATE_PER_MINUTE,
+    DISPATCH_QUEUE_LIMIT,
+)
+from services.batch_tuner import BatchTuner
+from services.domain_scheduler import DomainScheduler, recipient_domain
+from services.rate_limiter import rate_limiters, is_deferral, smtp_error_code
+from services.smtp_pool import smtp_pool
+
+HEALTHY = "healthy"
+QUARANTINED = "quarantined"
+
+# SMTP errors that say something about the account's connection rather than the recipient
+CONNECTION_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError,
+    smtplib.SMTPNotSupportedError,
+)
+
+
+class ResumableStop(str):
+    """Error message of a campaign stopped by its accounts (quota, failures) with recipients still pending"""
+
+
+def is_account_error(error):
+    """Check if a send failed because of the sender account or its connection"""
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    # Socket errors; every SMTPException is an OSError too, so exclude those
+    if isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException):
+        return True
+    # MAIL FROM refused for good: the account itself is blocked
+    return isinstance(error, smtplib.SMTPSenderRefused) and not is_deferral(error)
+
+
+class CampaignDispatcher:
+    """Send a campaign with one worker thread per sender account.
+
+    All workers pull recipients from a shared ``DomainScheduler`` and send them
+    over their own pooled SMTP session, so throughput grows with the number of
+    configured accounts. A batch is the number of sends an account makes per
+    session checkout; it starts at ``batch_size`` and is then tuned by a
+    ``BatchTuner`` from the account's measured latency, temporary-failure rate
+    and quota headroom. Each recipient is taken from the scheduler just before
+    it is sent, so the scheduler's per-domain concurrency, rate and backoff
+    budgets gate every send; ``max_per_domain`` defaults to one send per
+    connection, i.e. no cap beyond the campaign's own concurrency. ``compose(recipient, account)``
+    returns the ``RawMessage`` to send and the row to hand to ``on_sent``;
+    ``on_result(recipient, status, error, smtp_code)`` sees every outcome.
+
+    Every send waits on the account's token-bucket limiter. Deferral replies to
+    RCPT back off the recipient's domain; any other deferral backs off the
+    account. An account whose quota would take too long to refill
+    hands its batch to the others.
+
+    Temporary (4xx) per-recipient failures go to a separate retry lane with
+    exponential backoff, which workers only drain when the main queue is empty.
+    Permanent (5xx) failures are final (``hard_failed``).
+
+    ``recipients`` may be a lazy iterable: a producer thread feeds the queue
+    (up to ``queue_limit`` ahead of the workers) while sending is under way.
+    It may yield ``None`` while it has nothing due yet (scheduled sends); the
+    campaign then simply waits for more recipients.
+
+    A failing account does not stop the campaign. Dropped connections are retried
+    ``SMTP_RECONNECT_ATTEMPTS`` times; after that, or straight away on an
+    authentication failure, the account is quarantined and its unsent recipients
+    go back on the queue for the healthy accounts. The campaign only stops once
+    every account is quarantined (or out of quota); ``run()`` then returns a
+    ``ResumableStop`` message, as the unsent recipients can be sent later.
+    """
+
+    connections_per_account = 1  # Messages each account has in flight at once
+
+    def __init__(self, sender_accounts, compose, progress, batch_size=250, on_sent=None, on_result=None,
+                 pool=smtp_pool, limiters=rate_limiters, queue_limit=DISPATCH_QUEUE_LIMIT,
+                 max_per_domain=SMTP_DOMAIN_MAX_IN_FLIGHT, domain_rate_per_minute=SMTP_DOMAIN_RATE_PER_MINUTE):
+        self.sender_accounts = sender_accounts
+        self.compose = compose
+        self.progress = progress
+        self.batch_size = max(1, int(batch_size))
+        self.batch_tuner = BatchTuner(self.batch_size, progress)
+        self.on_sent = on_sent
+        self.on_result = on_result
+        self.pool = pool
+        self.limiters = limiters
+        self.queue_limit = queue_limit
+        self.error = None
+        self._retries = {}  # Format: {recipient_email: retries so far}
+        self._retry_lane = []  # Heap of (due monotonic time, tiebreak, recipient)
+        self._retry_order = itertools.count()
+        self._pending = 0  # Recipients queued or in a batch without a final result yet
+        self.account_health = {
+            account['email']: {"status": HEALTHY, "error": None} for account in sender_accounts
+        }  # Format: {sender_email: {status, error}}
+        self._queue = DomainScheduler(
+            max_per_domain or len(sender_accounts) * self.connections_per_account, domain_rate_per_minute
+        )
+        self._stop = threading.Event()
+        self._produced = threading.Event()
+        self._workers_done = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self, recipients):
+        """Send to every recipient and block until all workers are done"""
+        producer = threading.Thread(target=self._produce, args=(recipients,), name="recipient-producer", daemon=True)
+        producer.start()
+
+        workers = [
+            threading.Thread(target=self._worker, args=(account,), name=f"sender-{account['email']}", daemon=True)
+            for account in self.sender_accounts
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self._workers_done.set()
+        producer.join()
+
+        self._finish()
+        return self.error
+
+    def _finish(self):
+        """Explain why recipients were left unsent, if any were"""
+        unsent = self._queue.qsize() + len(self._retry_lane)
+        if self.error is not None or not unsent:
+            return
+        failed = {email: h["error"] for email, h in self.account_health.items() if h["status"] == QUARANTINED}
+        if len(failed) == len(self.account_health):
+            details = "; ".join(f"{email}: {error}" for email, error in failed.items())
+            self.error = ResumableStop(f"All sender accounts failed ({details}); {unsent} recipients were not sent")
+        else:
+            self.error = ResumableStop(
+                f"Sending quota reached on all sender accounts; {unsent} recipients were not sent"
+            )
+
+    def _produce(self, recipients):
+        """Feed the shared queue, staying at most ``queue_limit`` recipients ahead"""
+        try:
+            for recipient in recipients:
+                while self._queue.qsize() >= self.queue_limit:
+                    if self._stop.is_set() or self._workers_done.is_set():
+                        return
+                    time.sleep(0.05)
+                if self._stop.is_set() or self._workers_done.is_set():
+                    return
+                if recipient is None:
+                    continue
+                with self._lock:
+                    self._pending += 1
+                self._queue.put(recipient)
+        except Exception as e:
+            self._abort(f"Error reading recipients: {e}")
+        finally:
+            self._produced.set()
+
+    def _take_batch(self, size):
+        """Up to ``size`` recipients; waits for the producer while it is still reading"""
+        batch = []
+        while len(batch) < size and not self._stop.is_set():
+            recipient = self._queue.get_nowait()
+            if recipient is not None:
+                batch.append(recipient)
+                continue
+            if batch:
+                break
+            if self._queue.empty() and self._release_retries():
+                continue
+            if self._produced.is_set() and self._pending == 0:
+                # Every recipient has a result; none can be requeued any more
+                break
+            recipient = self._queue.get(timeout=0.2)
+            if recipient is not None:
+                batch.append(recipient)
+        return batch
+
+    def _worker(self, account):
+        sender_email = account['email']
+        password = account['password']
+        limiter = self.limiters.get(account)
+        reconnects = 0
+
+        while not self._stop.is_set():
+            size = self.batch_tuner.size_for(sender_email, limiter)
+            # Only the first recipient waits for the producer; the rest are taken one send
+            # at a time while the scheduler has one ready, and the batch ends when it doesn't
+            batch = self._take_batch(1)
+            if not batch:
+                return
+
+            done = 0
+            temporary = 0
+            started = time.monotonic()
+            try:
+                with self.pool.connection(sender_email, password) as session:
+                    while True:
+                        if not limiter.acquire(max_wait=SMTP_QUOTA_MAX_WAIT_SECONDS, stop_event=self._stop):
+                            if not self._stop.is_set():
+                                print(f"Quota reached for {sender_email}, handing {len(batch) - done} recipients to other accounts")
+                                self._requeue(batch[done:])
+                            return
+                        code = self._send_one(session, account, batch[done], limiter)
+                        if code is not None and 400 <= code < 500:
+                            temporary += 1
+                        done += 1
+                        if done >= size or self._stop.is_set():
+                            break
+                        recipient = self._queue.get_nowait()
+                        if recipient is None:
+                            break
+                        batch.append(recipient)
+                reconnects = 0
+                self.batch_tuner.record_batch(sender_email, done, temporary, time.monotonic() - started)
+            except smtplib.SMTPAuthenticationError as e:
+                self._quarantine(sender_email, f"SMTP Authentication failed: {e}", batch[done:])
+                return
+            except Exception as e:
+                if not is_account_error(e):
+                    self._abort(str(e))
+                    return
+                reconnects += 1
+                if reconnects > SMTP_RECONNECT_ATTEMPTS:
+                    self._quarantine(sender_email, f"SMTP error: {e}", batch[done:])
+                    return
+                self.batch_tuner.record_connection_error(sender_email)
+                # Let the healthy accounts carry on with the batch while this one reconnects
+                print(f"SMTP connection for {sender_email} failed ({e}), reconnecting (attempt {reconnects})")
+                self._requeue(batch[done:])
+                if self._stop.wait(SMTP_RECONNECT_BACKOFF_SECONDS * reconnects):
+                    return
+
+    def _quarantine(self, sender_email, error, unsent):
+        """Take an account out of the campaign and hand its unsent recipients to the others"""
+        print(f"Quarantining sender {sender_email}: {error}; reassigning {len(unsent)} recipients")
+        with self._lock:
+            self.account_health[sender_email] = {"status": QUARANTINED, "error": error}
+        self.progress.set_account(sender_email, status=QUARANTINED, error=error)
+        self._requeue(unsent)
+
+    def is_quarantined(self, sender_email):
+        return self.account_health.get(sender_email, {}).get("status") == QUARANTINED
+
+    def _send_one(self, session, account, recipient, limiter):
+        """Send one message; returns the SMTP code if it failed, else None"""
+        msg, sent_row = self.compose(recipient, account)
+
+        try:
+            session.sendmail(msg.from_addr, msg.to_addrs, msg.data)
+        except Exception as e:
+            if is_account_error(e):
+                raise
+            return self._record_failure(account, recipient, limiter, e)
+        self._record_sent(account, recipient, limiter, sent_row)
+        return None
+
+    def _record_sent(self, account, recipient, limiter, sent_row):
+        print(f"Sent email from {account['email']} to {recipient.email}")
+        limiter.record_success()
+        self._queue.release(recipient)
+        self._queue.record_success(recipient)
+        self._resolved()
+        if self.on_sent:
+            self.on_sent(sent_row)
+        if self.on_result:
+            self.on_result(recipient, "sent", None, None)
+        self.progress.record_sent()
+
+    def _record_failure(self, account, recipient, limiter, error):
+        """Park a temporary failure in the retry lane, or record the final failure; returns the SMTP code"""
+        self._queue.release(recipient)
+        code, _ = smtp_error_code(error)
+        if is_deferral(error):
+            if getattr(error, "recipients", None):
+                # Refused at RCPT: the destination is greylisting or throttling us
+                pause = self._queue.record_deferral(recipient)
+                print(f"Deferred by {recipient_domain(recipient)}, backing the domain off for {pause:.0f}s")
+            else:
+                pause = limiter.record_deferral()
+                print(f"Deferred by server for {recipient.email}, backing off {account['email']} for {pause:.0f}s")
+        if code is not None and 400 <= code < 500:
+            delay = self._schedule_retry(recipient)
+            if delay is not None:
+                print(f"Temporary failure ({code}) for {recipient.email}, retrying in {delay:.0f}s: {error}")
+                if self.on_result:
+                    self.on_result(recipient, "pending", str(error), code)
+                return code
+
+        status = "hard_failed" if code is not None and code >= 500 else "failed"
+        print(f"Failed to send email to {recipient.email} ({status}): {error}")
+        self._resolved()
+        if self.on_result:
+            self.on_result(recipient, status, str(error), code)
+        self.progress.record_failed(hard=status == "hard_failed")
+        return code
+
+    def _resolved(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _requeue(self, recipients):
+        """Give recipients taken from the scheduler back to it"""
+        for recipient in recipients:
+            self._queue.release(recipient)
+            self._queue.put(recipient)
+
+    def _schedule_retry(self, recipient):
+        """Put a recipient in the retry lane; returns the delay, or None once out of attempts"""
+        with self._lock:
+            attempts = self._retries.get(recipient.email, 0) + 1
+            if attempts > SMTP_RETRY_MAX_ATTEMPTS:
+                return None
+            self._retries[recipient.email] = attempts
+            delay = min(SMTP_RETRY_MAX_SECONDS, SMTP_RETRY_INITIAL_SECONDS * 2 ** (attempts - 1))
+            heapq.heappush(self._retry_lane, (time.monotonic() + delay, next(self._retry_order), recipient))
+            waiting = len(self._retry_lane)
+        self.progress.set_retrying(waiting)
+        return delay
+
+    def _release_retries(self):
+        """Move due retries into the (drained) main queue; returns how many were moved"""
+        due = self._take_retries(self.batch_size)
+        for recipient in due:
+            self._queue.put(recipient)
+        return len(due)
+
+    def _take_retries(self, limit):
+        """Up to ``limit`` recipients whose retry is due"""
+        now = time.monotonic()
+        with self._lock:
+            if not self._retry_lane or self._retry_lane[0][0] > now:
+                return []
+            due = []
+            while self._retry_lane and self._retry_lane[0][0] <= now and len(due) < limit:
+                due.append(heapq.heappop(self._retry_lane)[2])
+            waiting = len(self._retry_lane)
+        self.progress.set_retrying(waiting)
+        return due
+
+    def _abort(self, message):
+        with self._lock:
+            if self.error is None:
+                self.error = message
+        self._stop.set()
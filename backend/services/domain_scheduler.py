@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+
+from config import (
+    SMTP_DOMAIN_MAX_IN_FLIGHT,
+    SMTP_DOMAIN_RATE_PER_MINUTE,
+    SMTP_BACKOFF_INITIAL_SECONDS,
+    SMTP_BACKOFF_MAX_SECONDS,
+)
+from services.rate_limiter import TokenBucket
+
+
+def recipient_domain(recipient):
+    return recipient.email.rpartition('@')[2].lower()
+
+
+class DomainBudget:
+    """Queued recipients plus the concurrency, rate and backoff state of one destination domain"""
+
+    __slots__ = ("queue", "in_flight", "bucket", "backoff_seconds", "backoff_until")
+
+    def __init__(self, rate_per_minute):
+        self.queue = deque()
+        self.in_flight = 0
+        self.bucket = TokenBucket(rate_per_minute / 60.0, max(1.0, rate_per_minute / 60.0)) if rate_per_minute else None
+        self.backoff_seconds = 0.0
+        self.backoff_until = 0.0
+
+    def wait_time(self, now, max_in_flight):
+        """Seconds until this domain may take another send (inf while it is at its concurrency cap)"""
+        if self.in_flight >= max_in_flight:
+            return float("inf")
+        wait = self.backoff_until - now
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.wait_time(now))
+        return max(wait, 0.0)
+
+
+class DomainScheduler:
+    """Campaign queue that interleaves recipients across destination domains.
+
+    Recipients are kept in one FIFO per domain and handed out round-robin, so a
+    list dominated by one provider still spreads its sends over everyone else.
+    Each domain has at most ``max_in_flight`` recipients being sent at once (0
+    for no cap), a ``rate_per_minute`` token bucket (0 disables it) and its own
+    exponential backoff after greylisting/deferral replies; a throttled domain
+    is simply skipped while the others keep going.
+
+    Every recipient handed out by ``get`` must be given back with ``release``
+    once its send attempt is over.
+    """
+
+    def __init__(self, max_in_flight=SMTP_DOMAIN_MAX_IN_FLIGHT, rate_per_minute=SMTP_DOMAIN_RATE_PER_MINUTE):
+        self.max_in_flight = int(max_in_flight) or float("inf")
+        self.rate_per_minute = rate_per_minute
+        self._domains = {}  # Format: {domain: DomainBudget}
+        self._rotation = deque()  # Domains with queued recipients, in round-robin order
+        self._size = 0
+        self._changed = threading.Condition()
+
+    def _budget(self, domain):
+        budget = self._domains.get(domain)
+        if budget is None:
+            budget = self._domains[domain] = DomainBudget(self.rate_per_minute)
+        return budget
+
+    def put(self, recipient):
+        domain = recipient_domain(recipient)
+        with self._changed:
+            budget = self._budget(domain)
+            if not budget.queue:
+                self._rotation.append(domain)
+            budget.queue.append(recipient)
+            self._size += 1
+            self._changed.notify()
+
+    def _take(self, now):
+        """Pop from the next domain that may send; returns (recipient, seconds until one is ready)"""
+        soonest = float("inf")
+        for _ in range(len(self._rotation)):
+            domain = self._rotation[0]
+            self._rotation.rotate(-1)
+            budget = self._domains[domain]
+            wait = budget.wait_time(now, self.max_in_flight)
+            if wait > 0:
+                soonest = min(soonest, wait)
+                continue
+            recipient = budget.queue.popleft()
+            if not budget.queue:
+                self._rotation.remove(domain)
+            if budget.bucket is not None:
+                budget.bucket.consume()
+            budget.in_flight += 1
+            self._size -= 1
+            return recipient, 0.0
+        return None, soonest
+
+    def get_nowait(self):
+        """Next sendable recipient, or None if every queued domain is throttled (or none is queued)"""
+        with self._changed:
+            return self._take(time.monotonic())[0]
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds for a sendable recipient"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                now = time.monotonic()
+                recipient, wait = self._take(now)
+                if recipient is not None:
+                    return recipient
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                self._changed.wait(min(wait, remaining))
+
+    def release(self, recipient):
+        """A recipient handed out by ``get`` is no longer being sent"""
+        with self._changed:
+            budget = self._domains.get(recipient_domain(recipient))
+            if budget is not None and budget.in_flight > 0:
+                budget.in_flight -= 1
+                self._changed.notify()
+
+    def record_deferral(self, recipient):
+        """Back the recipient's domain off after a greylisting/deferral reply; returns the pause"""
+        with self._changed:
+            budget = self._budget(recipient_domain(recipient))
+            budget.backoff_seconds = min(
+                SMTP_BACKOFF_MAX_SECONDS,
+                max(SMTP_BACKOFF_INITIAL_SECONDS, budget.backoff_seconds * 2)
+            )
+            budget.backoff_until = time.monotonic() + budget.backoff_seconds
+            return budget.backoff_seconds
+
+    def record_success(self, recipient):
+        with self._changed:
+            budget = self._domains.get(recipient_domain(recipient))
+            if budget is not None and budget.backoff_seconds:
+                budget.backoff_seconds = budget.backoff_seconds / 2 if budget.backoff_seconds > SMTP_BACKOFF_INITIAL_SECONDS else 0.0
+
+    def throttled_domains(self):
+        """Domains with queued recipients that are currently backing off"""
+        now = time.monotonic()
+        with self._changed:
+            return sorted(d for d in self._rotation if self._domains[d].backoff_until > now)
+
+    def qsize(self):
+        return self._size
+
+    def empty(self):
+        return self._size == 0
@@ -0,0 +1,181 @@
+import base64
+import binascii
+import quopri
+import re
+from itertools import takewhile
+
+from config import IMAP_FETCH_BATCH, IMAP_REPLY_BODY_MAX_BYTES
+
+FETCH_UID = re.compile(rb"UID (\d+)")
+MESSAGE_START = re.compile(rb"^\d+ \(")
+LITERAL_SIZE = re.compile(rb"\{\d+\}$")
+TOKEN = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\x00(\d+)\x00|([^\s()"\[]+(?:\[[^\]]*\][^\s()"]*)?))'
+)
+
+# Header fields a reply is classified on; everything else stays on the server
+REPLY_HEADER_FIELDS = ("FROM", "SUBJECT", "DATE", "MESSAGE-ID", "AUTO-SUBMITTED", "X-AUTO-RESPONSE-SUPPRESS")
+
+
+def _parse_tokens(text, literals):
+    """Nested lists of an IMAP response: quoted strings and atoms as bytes, NIL as None"""
+    stack = [[]]
+    pos = 0
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        opening, closing, quoted, literal, atom = match.groups()
+        if opening:
+            stack.append([])
+        elif closing:
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted))
+        elif literal is not None:
+            stack[-1].append(literals[int(literal)])
+        elif atom is not None:
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    while len(stack) > 1:  # Unbalanced (truncated) response
+        done = stack.pop()
+        stack[-1].append(done)
+    return stack[0]
+
+
+def _messages(data):
+    """Group an imaplib FETCH response into one (text, literals) pair per message.
+
+    imaplib returns literals as (text up to and including "{size}", literal)
+    tuples followed by the rest of the line; literals are swapped for numbered
+    markers in ``text``.
+    """
+    text, literals = None, []
+    for item in data:
+        head, literal = item if isinstance(item, tuple) else (item, None)
+        if head is None:
+            continue
+        if MESSAGE_START.match(head) and text is not None:
+            yield text, literals
+            text, literals = None, []
+        if literal is not None:
+            head = LITERAL_SIZE.sub(b"", head) + b"\x00%d\x00" % len(literals)
+            literals.append(literal)
+        text = head if text is None else text + head
+    if text is not None:
+        yield text, literals
+
+
+def fetch_items(mail, uids, items, batch=IMAP_FETCH_BATCH):
+    """``{uid: {ITEM NAME: value}}`` for a batched UID FETCH, the bytes received and the UIDs of failed batches"""
+    results, received, failed = {}, 0, []
+    for start in range(0, len(uids), batch):
+        chunk = uids[start:start + batch]
+        status, data = mail.uid("FETCH", ",".join(map(str, chunk)), items)
+        if status != "OK":
+            print(f"Fetching UIDs {chunk[0]}..{chunk[-1]} failed: {status}")
+            failed.extend(chunk)
+            continue
+        for text, literals in _messages(data):
+            received += len(text) + sum(len(literal) for literal in literals)
+            tokens = _parse_tokens(text, literals)
+            values = next((t for t in tokens if isinstance(t, list)), [])
+            fields = {}
+            for key, value in zip(values[::2], values[1::2]):
+                if isinstance(key, bytes):
+                    fields[key.decode("ascii", "replace").upper()] = value
+            if fields.get("UID") is not None:
+                results[int(fields["UID"])] = fields
+    return results, received, failed
+
+
+def _section(fields, prefix):
+    return next((value for key, value in fields.items() if key.startswith(prefix)), None)
+
+
+def fetch_headers(mail, uids, header_fields=REPLY_HEADER_FIELDS):
+    """Phase one: ``{uid: (header bytes, BODYSTRUCTURE)}`` without downloading any body.
+
+    Also returns the bytes received and the UIDs whose FETCH failed.
+    """
+    items = f"(BODY.PEEK[HEADER.FIELDS ({' '.join(header_fields)})] BODYSTRUCTURE)"
+    fetched, received, failed = fetch_items(mail, uids, items)
+    headers = {
+        uid: (_section(fields, "BODY[HEADER") or b"", fields.get("BODYSTRUCTURE"))
+        for uid, fields in fetched.items()
+    }
+    return headers, received, failed
+
+
+def _params(values):
+    if not isinstance(values, list):
+        return {}
+    return {k.lower(): v for k, v in zip(values[::2], values[1::2]) if isinstance(k, bytes) and isinstance(v, bytes)}
+
+
+def text_plain_part(structure, prefix=""):
+    """(section, encoding, charset) of the first inline text/plain part in a BODYSTRUCTURE, or None.
+
+    Parts of attached messages are not searched, as they are not the reply itself.
+    """
+    if not isinstance(structure, list) or not structure:
+        return None
+    if isinstance(structure[0], list):
+        # Multipart: child parts first, then the subtype and extension data
+        for number, child in enumerate(takewhile(lambda c: isinstance(c, list), structure)):
+            part = text_plain_part(child, f"{prefix}{number + 1}.")
+            if part:
+                return part
+        return None
+
+    kind = (structure[0] or b"").lower()
+    subtype = (structure[1] or b"").lower() if len(structure) > 1 else b""
+    if kind != b"text" or subtype != b"plain":
+        return None
+    # text parts: type, subtype, params, id, description, encoding, size, lines, md5, disposition
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and (disposition[0] or b"").lower() == b"attachment":
+        return None
+    encoding = (structure[5] or b"7BIT").upper() if len(structure) > 5 else b"7BIT"
+    charset = _params(structure[2]).get(b"charset", b"utf-8").decode("ascii", "replace")
+    return (prefix or "1.").rstrip("."), encoding, charset
+
+
+def decode_part(data, encoding, charset):
+    """Text of a (possibly truncated) body part in its transfer encoding"""
+    if encoding == b"BASE64":
+        compact = b"".join(data.split())
+        try:
+            data = base64.b64decode(compact[:len(compact) // 4 * 4])
+        except (binascii.Error, ValueError):
+            data = b""
+    elif encoding == b"QUOTED-PRINTABLE":
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, errors="ignore")
+    except LookupError:
+        return data.decode("utf-8", errors="ignore")
+
+
+def fetch_text_bodies(mail, parts, max_bytes=IMAP_REPLY_BODY_MAX_BYTES):
+    """Phase two: ``{uid: text}`` of just the text/plain part of each message.
+
+    ``parts`` maps UIDs to ``text_plain_part`` results; messages sharing a
+    section number are fetched together, and at most ``max_bytes`` of each part.
+    Also returns the bytes received and the UIDs whose FETCH failed.
+    """
+    by_section = {}
+    for uid, part in parts.items():
+        by_section.setdefault(part[0], []).append(uid)
+
+    bodies, received, failed = {}, 0, []
+    for section, uids in by_section.items():
+        fetched, size, section_failed = fetch_items(mail, uids, f"(BODY.PEEK[{section}]<0.{max_bytes}>)")
+        received += size
+        failed.extend(section_failed)
+        for uid, fields in fetched.items():
+            _, encoding, charset = parts[uid]
+            bodies[uid] = decode_part(_section(fields, "BODY[") or b"", encoding, charset)
+    return bodies, received, failed
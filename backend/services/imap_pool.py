@@ -0,0 +1,229 @@
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+
+from config import (
+    IMAP_HOST,
+    IMAP_TIMEOUT_SECONDS,
+    IMAP_KEEPALIVE_SECONDS,
+    IMAP_MAX_IDLE_SECONDS,
+    IMAP_MAX_IDLE_PER_ACCOUNT,
+    IMAP_FLAG_FLUSH_SECONDS,
+)
+
+SEEN = "\\Seen"
+MAX_UID_SET_CHARS = 4000  # Keep each UID STORE command line well under server limits
+
+
+def uid_sets(uids, max_chars=MAX_UID_SET_CHARS):
+    """Compact IMAP UID sets ("3:7,9,12:15") covering ``uids``, split to stay under ``max_chars``"""
+    ranges = []
+    for uid in sorted({int(u) for u in uids}):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+
+    sets, current = [], ""
+    for first, last in ranges:
+        piece = str(first) if first == last else f"{first}:{last}"
+        if current and len(current) + len(piece) + 1 > max_chars:
+            sets.append(current)
+            current = ""
+        current = f"{current},{piece}" if current else piece
+    if current:
+        sets.append(current)
+    return sets
+
+
+class IMAPSession:
+    """An authenticated IMAP connection for one account"""
+
+    def __init__(self, host, email, password, timeout=IMAP_TIMEOUT_SECONDS):
+        self.host = host
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.mail = None
+        self.selected = None  # (mailbox, readonly) currently selected
+        self.last_used = 0.0
+
+    def connect(self):
+        self.close()
+        mail = imaplib.IMAP4_SSL(self.host, timeout=self.timeout)
+        try:
+            mail.login(self.email, self.password)
+        except Exception:
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
+            raise
+        self.mail = mail
+        self.selected = None
+        self.last_used = time.monotonic()
+        return self
+
+    def is_alive(self):
+        """Send a NOOP to check that the server still accepts commands"""
+        if self.mail is None:
+            return False
+        try:
+            status = self.mail.noop()[0]
+        except (imaplib.IMAP4.error, OSError):
+            return False
+        self.last_used = time.monotonic()
+        return status == "OK"
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def select(self, mailbox="INBOX", readonly=False):
+        """Select ``mailbox`` unless it already is (in the same mode)"""
+        if self.selected != (mailbox, readonly):
+            self.selected = None  # A failed SELECT leaves no mailbox selected
+            status, data = self.mail.select(mailbox, readonly=readonly)
+            if status != "OK":
+                raise self.mail.error(f"Could not select {mailbox}: {data}")
+            self.selected = (mailbox, readonly)
+        self.last_used = time.monotonic()
+
+    def store(self, uids, flags=SEEN, mailbox="INBOX", add=True):
+        """Add (or remove) ``flags`` on every UID with one UID STORE per compacted UID set"""
+        if not uids:
+            return
+        self.select(mailbox)
+        command = "+FLAGS.SILENT" if add else "-FLAGS.SILENT"
+        for uid_set in uid_sets(uids):
+            status, data = self.mail.uid("STORE", uid_set, command, f"({flags})")
+            if status != "OK":
+                raise self.mail.error(f"UID STORE failed: {data}")
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+        self.selected = None
+
+
+class IMAPConnectionPool:
+    """Reusable IMAP sessions keyed by account, like the SMTP pool.
+
+    Sessions are checked out with ``connection()``; one idle for more than
+    ``keepalive_interval`` gets a NOOP before reuse and one idle longer than
+    ``max_idle`` is logged out, so reply checks and flag updates skip the TLS
+    handshake and login most of the time.
+    """
+
+    def __init__(self, host=IMAP_HOST, keepalive_interval=IMAP_KEEPALIVE_SECONDS, max_idle=IMAP_MAX_IDLE_SECONDS,
+                 max_idle_per_account=IMAP_MAX_IDLE_PER_ACCOUNT):
+        self.host = host
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self.max_idle_per_account = max_idle_per_account
+        self._idle = {}  # Format: {email: [IMAPSession, ...]}
+        self._lock = threading.Lock()
+
+    def acquire(self, email, password):
+        """Check out a live session for the account, logging in only if needed"""
+        while True:
+            with self._lock:
+                sessions = self._idle.get(email.lower())
+                session = sessions.pop() if sessions else None
+            if session is None:
+                break
+            if session.password != password or session.idle_seconds() > self.max_idle:
+                session.close()
+                continue
+            if session.idle_seconds() < self.keepalive_interval or session.is_alive():
+                return session
+            session.close()
+        return IMAPSession(self.host, email, password).connect()
+
+    def release(self, session, discard=False):
+        """Return a session to the pool, or log it out if it is no longer usable"""
+        if discard or session.mail is None:
+            session.close()
+            return
+        with self._lock:
+            sessions = self._idle.setdefault(session.email.lower(), [])
+            if len(sessions) < self.max_idle_per_account:
+                sessions.append(session)
+                return
+        session.close()
+
+    @contextmanager
+    def connection(self, email, password):
+        """Context manager yielding a pooled session for ``email``"""
+        session = self.acquire(email, password)
+        try:
+            yield session
+        except (imaplib.IMAP4.abort, OSError):
+            self.release(session, discard=True)
+            raise
+        except BaseException:
+            self.release(session)
+            raise
+        else:
+            self.release(session)
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for group in self._idle.values() for s in group]
+            self._idle = {}
+        for session in sessions:
+            session.close()
+
+
+class IMAPFlagQueue:
+    """Flag changes collected per account and applied in bulk.
+
+    ``add`` only records the UIDs; ``flush_seconds`` after the first pending
+    change, every account's changes go out as one UID STORE over a pooled
+    session, so marking many replies costs one round trip instead of a login
+    per message.
+    """
+
+    def __init__(self, pool, flush_seconds=IMAP_FLAG_FLUSH_SECONDS):
+        self.pool = pool
+        self.flush_seconds = flush_seconds
+        self._pending = {}  # Format: {(email, password, mailbox, flags): set of UIDs}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, email, password, uids, flags=SEEN, mailbox="INBOX"):
+        with self._lock:
+            self._pending.setdefault((email, password, mailbox, flags), set()).update(str(u) for u in uids)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Apply every pending change now; returns the number of UIDs flagged"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        flagged = 0
+        for (email, password, mailbox, flags), uids in pending.items():
+            try:
+                with self.pool.connection(email, password) as session:
+                    session.store(uids, flags, mailbox)
+                flagged += len(uids)
+            except Exception as e:
+                print(f"Error setting {flags} on {len(uids)} messages for {email}: {e}")
+        return flagged
+
+
+# Shared sessions for reply checks and flag updates
+imap_pool = IMAPConnectionPool()
+imap_flags = IMAPFlagQueue(imap_pool)
@@ -0,0 +1,139 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import IMAP_SYNC_DB_PATH
+from services.imap_fetch import FETCH_UID
+
+
+class ImapSyncStore:
+    """Highest processed UID per mailbox, with the UIDVALIDITY it belongs to.
+
+    UIDs only grow within one UIDVALIDITY, so a checkpoint lets a sync ask the
+    server for newer messages only. If the server reports a different
+    UIDVALIDITY (the mailbox was recreated or renumbered) the checkpoint no
+    longer applies and the mailbox is synced from scratch.
+    """
+
+    def __init__(self, path=IMAP_SYNC_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS imap_sync_state (
+                account TEXT NOT NULL,
+                mailbox TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                last_uid INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (account, mailbox)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, account, mailbox):
+        """(uidvalidity, last_uid) of the mailbox's checkpoint, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM imap_sync_state WHERE account = ? AND mailbox = ?",
+                (account.lower(), mailbox)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, account, mailbox, uidvalidity, last_uid):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO imap_sync_state (account, mailbox, uidvalidity, last_uid, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (account.lower(), mailbox, uidvalidity, last_uid, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def reset(self, account, mailbox=None):
+        """Forget checkpoints so the next sync starts over"""
+        with self._lock:
+            if mailbox is None:
+                self._conn.execute("DELETE FROM imap_sync_state WHERE account = ?", (account.lower(),))
+            else:
+                self._conn.execute("DELETE FROM imap_sync_state WHERE account = ? AND mailbox = ?",
+                                   (account.lower(), mailbox))
+            self._conn.commit()
+
+
+_account_locks = {}
+_account_locks_guard = threading.Lock()
+
+
+def account_lock(account):
+    """Lock held while one account's mailboxes are synced"""
+    with _account_locks_guard:
+        return _account_locks.setdefault(account.lower(), threading.Lock())
+
+
+def select_mailbox(mail, mailbox="INBOX"):
+    """Select a mailbox read-only and return its (UIDVALIDITY, UIDNEXT); UIDNEXT may be None"""
+    status, _ = mail.select(mailbox, readonly=True)
+    if status != "OK":
+        raise mail.error(f"Could not select {mailbox}")
+    _, validity = mail.response("UIDVALIDITY")
+    if not validity or validity[0] is None:
+        raise mail.error(f"{mailbox} did not report UIDVALIDITY")
+    _, uidnext = mail.response("UIDNEXT")
+    return int(validity[0]), (int(uidnext[0]) if uidnext and uidnext[0] is not None else None)
+
+
+def _highest_uid(mail, uidnext):
+    if uidnext is not None:
+        return uidnext - 1
+    status, data = mail.uid("FETCH", "*", "(UID)")
+    match = FETCH_UID.search(data[0]) if status == "OK" and data and data[0] else None
+    return int(match.group(1)) if match else 0
+
+
+def new_uids(mail, account, mailbox="INBOX", store=None):
+    """UIDs to process since the mailbox's checkpoint, its UIDVALIDITY and the UID to checkpoint at.
+
+    Without a usable checkpoint only unread messages are returned, as the
+    full-scan sync did, and the high water is the newest message; every later
+    call returns what arrived since, read or not. Pass the returned UIDs, the
+    ones actually processed and the high-water UID to ``checkpoint`` afterwards.
+    """
+    store = store or imap_sync_store
+    uidvalidity, uidnext = select_mailbox(mail, mailbox)
+    saved = store.get(account, mailbox)
+
+    if saved is None or saved[0] != uidvalidity:
+        if saved is not None:
+            print(f"UIDVALIDITY of {account}/{mailbox} changed; syncing it from scratch")
+        high_water = _highest_uid(mail, uidnext)
+        _, data = mail.uid("SEARCH", None, "UNSEEN")
+        return uidvalidity, sorted(int(uid) for uid in data[0].split()), high_water
+
+    last_uid = saved[1]
+    if uidnext is not None and uidnext <= last_uid + 1:
+        return uidvalidity, [], last_uid  # Nothing new; skip the search
+    _, data = mail.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+    # "n:*" always matches the newest message, even when its UID is below n
+    return uidvalidity, sorted(uid for uid in map(int, data[0].split()) if uid > last_uid), last_uid
+
+
+def checkpoint(account, mailbox, uidvalidity, high_water, uids=(), processed=None, store=None):
+    """Save the mailbox's checkpoint, never past a UID that was not processed.
+
+    Once every one of ``uids`` is in ``processed`` it moves to ``high_water``
+    (or the highest UID, if that is above). Otherwise it stops just before the
+    first unprocessed UID (say, one from a failed FETCH batch), so that message
+    is fetched again next time, along with the processed ones after it.
+    """
+    done = set(uids if processed is None else processed)
+    unprocessed = [uid for uid in uids if uid not in done]
+    if unprocessed:
+        last_uid = min(unprocessed) - 1
+    else:
+        last_uid = max([high_water, *uids])
+    (store or imap_sync_store).save(account, mailbox, uidvalidity, last_uid)
+
+
+# Shared checkpoints for every sender account's reply sync
+imap_sync_store = ImapSyncStore()
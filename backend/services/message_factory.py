@@ -0,0 +1,111 @@
+import random
+import re
+from base64 import encodebytes
+from email.header import Header
+from email.utils import formataddr
+from functools import lru_cache
+
+from utils.helpers import compile_template
+
+CRLF = "\r\n"
+MAX_7BIT_LINE = 998  # RFC 5322 line limit for unencoded text
+LINE_BREAKS = re.compile(r"\r\n|\r|\n")
+
+ASCII_PART_HEADERS = (
+    'Content-Type: text/plain; charset="us-ascii"\r\n'
+    "MIME-Version: 1.0\r\n"
+    "Content-Transfer-Encoding: 7bit\r\n\r\n"
+).encode("ascii")
+UTF8_PART_HEADERS = (
+    'Content-Type: text/plain; charset="utf-8"\r\n'
+    "MIME-Version: 1.0\r\n"
+    "Content-Transfer-Encoding: base64\r\n\r\n"
+).encode("ascii")
+
+
+class RawMessage:
+    """A serialized message ready for ``SMTP.sendmail``"""
+
+    __slots__ = ("from_addr", "to_addrs", "data")
+
+    def __init__(self, from_addr, to_addrs, data):
+        self.from_addr = from_addr
+        self.to_addrs = to_addrs
+        self.data = data
+
+
+def encode_header(value):
+    """Encode (and fold) one header value, using UTF-8 only when needed"""
+    value = LINE_BREAKS.sub(" ", value)
+    charset = "us-ascii" if value.isascii() else "utf-8"
+    return Header(value, charset, header_name="Subject").encode(linesep=CRLF)
+
+
+class MessageFactory:
+    """Plain-text bulk messages built straight to bytes for one subject/body template.
+
+    Produces the same multipart/mixed layout as a ``MIMEMultipart`` holding one
+    ``MIMEText``, but without a MIME object tree and generator pass per recipient.
+    The multipart framing, the From header of each sender and any subject or body
+    without placeholders are encoded once; only personalized parts are encoded
+    per message.
+    """
+
+    def __init__(self, subject, body):
+        self.subject_template = compile_template(subject)
+        self.body_template = compile_template(body)
+        self.boundary = f"{'=' * 15}{random.randrange(10 ** 19):019d}=="
+        self._head = (
+            f'Content-Type: multipart/mixed; boundary="{self.boundary}"\r\n'
+            "MIME-Version: 1.0\r\n"
+        ).encode("ascii")
+        self._part_open = f"\r\n--{self.boundary}\r\n".encode("ascii")
+        self._close = f"\r\n--{self.boundary}--\r\n".encode("ascii")
+        self._from_headers = {}  # Format: {(sender_name, sender_email): b"From: ...\r\n"}
+        self._static_subject = None
+        self._static_body = None
+        if not self.subject_template.keys:
+            self._static_subject = self._subject_header(subject or "")
+        if not self.body_template.keys:
+            self._static_body = self._body_part(body or "")
+
+    def _from_header(self, sender_name, sender_email):
+        key = (sender_name, sender_email)
+        header = self._from_headers.get(key)
+        if header is None:
+            value = formataddr((LINE_BREAKS.sub(" ", sender_name or ""), sender_email), charset="utf-8")
+            header = f"From: {value}\r\n".encode("ascii")
+            self._from_headers[key] = header
+        return header
+
+    def _subject_header(self, subject):
+        return f"Subject: {encode_header(subject)}\r\n".encode("ascii")
+
+    def _body_part(self, body):
+        text = LINE_BREAKS.sub(CRLF, body)
+        if (text.isascii() and self.boundary not in text
+                and max(map(len, text.split(CRLF)), default=0) <= MAX_7BIT_LINE):
+            return ASCII_PART_HEADERS + text.encode("ascii")
+        payload = encodebytes(text.encode("utf-8")).replace(b"\n", b"\r\n").rstrip(b"\r\n")
+        return UTF8_PART_HEADERS + payload
+
+    def build(self, sender_name, sender_email, recipient_email, values):
+        """Render one recipient's message; returns ``(RawMessage, subject, body)``"""
+        subject = self.subject_template.render(values)
+        body = self.body_template.render(values)
+        data = b"".join((
+            self._head,
+            self._from_header(sender_name, sender_email),
+            f"To: {recipient_email}\r\n".encode("utf-8"),
+            self._static_subject or self._subject_header(subject),
+            self._part_open,
+            self._static_body or self._body_part(body),
+            self._close,
+        ))
+        return RawMessage(sender_email, [recipient_email], data), subject, body
+
+
+@lru_cache(maxsize=128)
+def message_factory(subject, body):
+    """Factory for a subject/body pair; reused across recipients, senders and campaigns"""
+    return MessageFactory(subject or "", body or "")
@@ -0,0 +1,195 @@
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from config import PROGRESS_KEEP_FINISHED
+
+FINISHED_PREFIXES = ("completed", "error")
+
+
+def peak_memory_mb():
+    """Peak resident memory of the whole process in MB, or None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class CampaignProgress:
+    """Thread-safe sent/failed counters, rate and ETA for one campaign.
+
+    Sender workers call ``record_sent`` / ``record_failed``; readers either take
+    a ``snapshot()`` or block in ``wait_for_update()`` until something changes,
+    which is what the Server-Sent Events endpoint uses instead of polling.
+    """
+
+    def __init__(self, campaign_id=None, user_id=None, total=0):
+        self.campaign_id = campaign_id
+        self.user_id = user_id
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.hard_failed = 0
+        self.retrying = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.suppressed = 0
+        self.accounts = {}  # Format: {sender_email: {status, error, ...}}
+        self.next_send_at = None  # ISO time the next send window opens, while waiting for one
+        self.status = "idle"
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def _bump(self):
+        self.version += 1
+        self._changed.notify_all()
+
+    def start(self, total):
+        with self._changed:
+            self.total = total
+            self.sent = 0
+            self.failed = 0
+            self.hard_failed = 0
+            self.retrying = 0
+            self.accounts = {}
+            self.next_send_at = None
+            self.status = "running"
+            self.started_at = time.monotonic()
+            self.finished_at = None
+            self._bump()
+
+    def add_total(self, count):
+        """Grow the total as a streamed recipient list is parsed"""
+        with self._changed:
+            self.total += count
+            self._bump()
+
+    def set_ingest_stats(self, stats):
+        """Duplicate, invalid and suppressed addresses dropped from the upload so far"""
+        with self._changed:
+            self.duplicates = stats["duplicates"]
+            self.invalid = stats["invalid"]
+            self.suppressed = stats["suppressed"]
+            self._bump()
+
+    def set_account(self, sender_email, **info):
+        """Update what the progress feed shows about one sender account"""
+        with self._changed:
+            self.accounts.setdefault(sender_email, {}).update(info)
+            self._bump()
+
+    def record_sent(self):
+        with self._changed:
+            self.sent += 1
+            self._bump()
+
+    def record_failed(self, hard=False):
+        with self._changed:
+            self.failed += 1
+            if hard:
+                self.hard_failed += 1
+            self._bump()
+
+    def set_retrying(self, count):
+        """Recipients currently waiting in the retry lane"""
+        with self._changed:
+            self.retrying = count
+            self._bump()
+
+    def set_next_send(self, when):
+        """When sending resumes (ISO string), or None while sends are due"""
+        with self._changed:
+            self.next_send_at = when
+            self._bump()
+
+    def set_status(self, status):
+        with self._changed:
+            self.status = status
+            if self.is_finished():
+                self.finished_at = time.monotonic()
+            self._bump()
+
+    def is_finished(self):
+        return self.status.startswith(FINISHED_PREFIXES)
+
+    def snapshot(self):
+        """Current counters plus messages/second and estimated seconds remaining"""
+        with self._changed:
+            done = self.sent + self.failed
+            rate = 0.0
+            eta = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or time.monotonic()) - self.started_at
+                if elapsed > 0:
+                    rate = done / elapsed
+                if rate > 0 and not self.is_finished():
+                    eta = round(max(self.total - done, 0) / rate, 1)
+            return {
+                "campaign_id": self.campaign_id,
+                "sent": self.sent,
+                "failed": self.failed,
+                "hard_failed": self.hard_failed,
+                "retrying": self.retrying,
+                "total": self.total,
+                "duplicates": self.duplicates,
+                "invalid": self.invalid,
+                "suppressed": self.suppressed,
+                "accounts": {email: dict(info) for email, info in self.accounts.items()},
+                "next_send_at": self.next_send_at,
+                "status": self.status,
+                "rate": round(rate, 2),
+                "eta_seconds": eta,
+                "peak_memory_mb": peak_memory_mb(),
+                "version": self.version,
+            }
+
+    def wait_for_update(self, version, timeout):
+        """Block until the version moves past ``version`` or ``timeout`` expires"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class ProgressRegistry:
+    """Campaign progress objects, looked up by campaign or by user"""
+
+    def __init__(self, keep_finished=PROGRESS_KEEP_FINISHED):
+        self.keep_finished = keep_finished
+        self._campaigns = {}  # Format: {campaign_id: CampaignProgress}, in creation order
+        self._lock = threading.Lock()
+
+    def create(self, campaign_id, user_id=None, total=0):
+        progress = CampaignProgress(campaign_id, user_id, total)
+        with self._lock:
+            self._campaigns[campaign_id] = progress
+            self._prune()
+        return progress
+
+    def get(self, campaign_id):
+        with self._lock:
+            return self._campaigns.get(campaign_id)
+
+    def latest_for_user(self, user_id):
+        """The user's most recently started campaign, if any"""
+        with self._lock:
+            for progress in reversed(list(self._campaigns.values())):
+                if progress.user_id == user_id:
+                    return progress
+        return None
+
+    def _prune(self):
+        finished = [cid for cid, p in self._campaigns.items() if p.is_finished()]
+        for campaign_id in finished[:-self.keep_finished or None]:
+            del self._campaigns[campaign_id]
+
+
+# Shared registry read by the progress endpoints
+progress_registry = ProgressRegistry()
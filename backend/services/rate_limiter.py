@@ -0,0 +1,175 @@
+import smtplib
+import threading
+import time
+
+from config import (
+    SMTP_RATE_PER_SECOND,
+    SMTP_RATE_PER_MINUTE,
+    SMTP_RATE_PER_DAY,
+    SMTP_BACKOFF_INITIAL_SECONDS,
+    SMTP_BACKOFF_MAX_SECONDS,
+)
+
+# Reply codes that mean "slow down and try later" rather than "never"
+DEFERRAL_CODES = (421, 450, 451, 452)
+
+
+def smtp_error_code(error):
+    """Return (code, message) for an SMTP exception, or (None, str(error))"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code, message = next(iter(error.recipients.values()))
+    elif isinstance(error, smtplib.SMTPResponseException):
+        code, message = error.smtp_code, error.smtp_error
+    elif isinstance(getattr(error, "recipients", None), list) and error.recipients:
+        # aiosmtplib: a list of SMTPRecipientRefused, each with its own reply
+        code, message = error.recipients[0].code, error.recipients[0].message
+    elif isinstance(getattr(error, "code", None), int):
+        # aiosmtplib.SMTPResponseException
+        code, message = error.code, error.message
+    else:
+        return None, str(error)
+
+    if isinstance(message, bytes):
+        message = message.decode(errors='ignore')
+    return code, message
+
+
+def is_deferral(error):
+    """Check if an SMTP error is a temporary 421/45x or 4.7.x throttling reply"""
+    code, message = smtp_error_code(error)
+    if code is None:
+        return False
+    return code in DEFERRAL_CODES or (400 <= code < 500 and "4.7." in message)
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, bursts up to ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class AccountRateLimiter:
+    """Per-second, per-minute and daily send quotas for one sender account.
+
+    Each quota is a token bucket, so an account can burst up to its limits and
+    then sends at the sustained rate of the tightest one. Deferral replies from
+    the server pause the account with exponential backoff.
+    """
+
+    def __init__(self, per_second=SMTP_RATE_PER_SECOND, per_minute=SMTP_RATE_PER_MINUTE,
+                 per_day=SMTP_RATE_PER_DAY):
+        self.buckets = [
+            TokenBucket(per_second, per_second),
+            TokenBucket(per_minute / 60.0, per_minute),
+            TokenBucket(per_day / 86400.0, per_day),
+        ]
+        self.backoff_seconds = 0.0
+        self.backoff_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait_time(self):
+        """Seconds until the account may send its next message"""
+        with self._lock:
+            now = time.monotonic()
+            return max([self.backoff_until - now] + [b.wait_time(now) for b in self.buckets])
+
+    def acquire(self, max_wait=None, stop_event=None):
+        """Block until a send is allowed.
+
+        Returns False without consuming a token if the wait would exceed
+        ``max_wait`` (e.g. the daily quota is used up) or ``stop_event`` is set.
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+
+            if max_wait is not None and wait > max_wait:
+                return False
+            if stop_event is not None:
+                if stop_event.wait(min(wait, 1.0)):
+                    return False
+            else:
+                time.sleep(min(wait, 1.0))
+
+    def try_acquire(self):
+        """Take a send token if one is available now; otherwise return the seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max([self.backoff_until - now] + [b.wait_time(now) for b in self.buckets])
+            if wait <= 0:
+                for bucket in self.buckets:
+                    bucket.consume()
+                return 0.0
+            return wait
+
+    def capacity_within(self, seconds):
+        """How many messages the account's quotas allow over the next ``seconds``"""
+        with self._lock:
+            now = time.monotonic()
+            if self.backoff_until > now:
+                seconds = max(0.0, seconds - (self.backoff_until - now))
+            capacity = float("inf")
+            for bucket in self.buckets:
+                bucket.wait_time(now)  # Refill to now
+                capacity = min(capacity, max(bucket.tokens, 0.0) + bucket.rate * seconds)
+            return capacity
+
+    def record_deferral(self):
+        """Back off after a 421/450/4.7.x reply, doubling the pause each time"""
+        with self._lock:
+            self.backoff_seconds = min(
+                SMTP_BACKOFF_MAX_SECONDS,
+                max(SMTP_BACKOFF_INITIAL_SECONDS, self.backoff_seconds * 2)
+            )
+            self.backoff_until = time.monotonic() + self.backoff_seconds
+            return self.backoff_seconds
+
+    def record_success(self):
+        """Relax the backoff again once the server accepts messages"""
+        with self._lock:
+            if self.backoff_seconds:
+                self.backoff_seconds = self.backoff_seconds / 2 if self.backoff_seconds > SMTP_BACKOFF_INITIAL_SECONDS else 0.0
+
+
+class RateLimiterRegistry:
+    """Keeps one limiter per sender account so quotas carry across campaigns"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, sender_account):
+        email = sender_account['email']
+        with self._lock:
+            limiter = self._limiters.get(email)
+            if limiter is None:
+                limiter = AccountRateLimiter(
+                    per_second=sender_account.get('per_second') or SMTP_RATE_PER_SECOND,
+                    per_minute=sender_account.get('per_minute') or SMTP_RATE_PER_MINUTE,
+                    per_day=sender_account.get('per_day') or SMTP_RATE_PER_DAY,
+                )
+                self._limiters[email] = limiter
+            return limiter
+
+
+# Shared registry used by every bulk sender in the process
+rate_limiters = RateLimiterRegistry()
@@ -0,0 +1,284 @@
+import io
+import os
+import uuid
+from itertools import islice
+
+import pandas as pd
+
+from config import UPLOAD_DIR, INGEST_CHUNK_ROWS, PREVIEW_SAMPLE_BYTES
+from services.recipients import Recipient
+from utils.helpers import extract_name_from_email
+
+# Enhanced email column detection
+POSSIBLE_EMAIL_COLS = ['email', 'Email', 'EMAIL', 'email_id', 'Email ID', 'EMAIL_ID',
+                       'email_address', 'Email Address', 'EMAIL_ADDRESS', 'recipient_email',
+                       'Recipient Email', 'RECIPIENT_EMAIL', 'mail', 'Mail', 'MAIL', 'Validated Emails',
+                       'e-mail', 'E-mail', 'E-MAIL', 'contact_email', 'Contact Email']
+
+# Enhanced name column detection
+POSSIBLE_NAME_COLS = ['name', 'Name', 'NAME', 'full_name', 'Full Name', 'FULL_NAME',
+                      'first_name', 'First Name', 'FIRST_NAME', 'last_name', 'Last Name',
+                      'LAST_NAME', 'contact_name', 'Contact Name', 'CONTACT_NAME',
+                      'candidate_name', 'Candidate Name', 'CANDIDATE_NAME']
+
+# Position column detection
+POSSIBLE_POSITION_COLS = ['position', 'Position', 'POSITION', 'job_title', 'Job Title',
+                          'JOB_TITLE', 'role', 'Role', 'ROLE', 'title', 'Title', 'TITLE']
+
+# Recipient time zone (IANA name, e.g. America/New_York) for send windows
+POSSIBLE_TIMEZONE_COLS = ['timezone', 'Timezone', 'TimeZone', 'TIMEZONE', 'time_zone', 'Time Zone',
+                          'TIME_ZONE', 'tz', 'TZ']
+
+
+def save_upload(file):
+    """Save an uploaded recipient file so it can be streamed (and re-read on resume)"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
+    file.save(path)
+    return path
+
+
+def discard_upload(path):
+    """Remove a saved upload once its campaign no longer needs it"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Could not remove upload {path}: {e}")
+
+
+def iter_frames(path, chunk_rows=INGEST_CHUNK_ROWS):
+    """Yield the file as DataFrames of ``chunk_rows`` rows without loading it whole"""
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    elif path.lower().endswith((".xlsx", ".xlsm")):
+        yield from _iter_xlsx_frames(path, chunk_rows)
+    else:
+        # Older formats (.xls, .ods) have no streaming reader; chunk after loading
+        df = pd.read_excel(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _iter_xlsx_frames(path, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                return
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def preview_frame(file, rows):
+    """The header and first ``rows`` rows of an uploaded file, plus its approximate row count.
+
+    Only the start of the file is parsed, so previews cost the same whatever the
+    file size. Returns ``(df, row_count, exact)``; ``row_count`` is None when it
+    can't be estimated cheaply.
+    """
+    name = file.filename.lower()
+    if name.endswith(".csv"):
+        return _preview_csv(file.stream, rows)
+    if name.endswith((".xlsx", ".xlsm")):
+        return _preview_xlsx(file.stream, rows)
+    # Older formats (.xls, .ods) are parsed whole by their readers; only the rows are bounded
+    df = pd.read_excel(file, nrows=rows)
+    return df, None, False
+
+
+def _preview_csv(stream, rows):
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    sample = stream.read(PREVIEW_SAMPLE_BYTES)
+    exact = len(sample) >= size
+    if not exact:
+        # Drop the partial last line
+        sample = sample[:sample.rfind(b"\n") + 1] or sample
+
+    df = pd.read_csv(io.BytesIO(sample), nrows=rows)
+    lines = sample.count(b"\n")
+    if exact:
+        if sample and not sample.endswith(b"\n"):
+            lines += 1
+        # Physical lines, so only off when quoted values span lines
+        return df, max(lines - 1, 0), True
+    if lines < 2:
+        return df, None, False
+    # Scale the sample's average row length up to the whole file
+    header_bytes = sample.find(b"\n") + 1
+    row_bytes = (len(sample) - header_bytes) / (lines - 1)
+    return df, round((size - header_bytes) / row_bytes), False
+
+
+def _preview_xlsx(stream, rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        values = sheet.iter_rows(values_only=True)
+        header = next(values, None)
+        if header is None:
+            return pd.DataFrame(), 0, True
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        df = pd.DataFrame(list(islice(values, rows + 1)), columns=columns)
+        if len(df) <= rows:
+            return df, len(df), True
+        # The sheet's stored dimension, so nothing past the preview is read; some writers omit it
+        max_row = sheet.max_row
+        return df.head(rows), (max_row - 1 if max_row and max_row > rows + 1 else None), False
+    finally:
+        workbook.close()
+
+
+def _match_column(columns, candidates):
+    wanted = {c.lower() for c in candidates}
+    for col in columns:
+        if str(col).lower().strip() in wanted:
+            return col
+    return None
+
+
+def detect_columns(df, use_templates):
+    """Find the email, name, position and time zone columns from the first chunk of the file"""
+    email_col = _match_column(df.columns, POSSIBLE_EMAIL_COLS)
+
+    if not email_col:
+        for col in df.columns:
+            sample_values = df[col].dropna().head(5)
+            if len(sample_values) > 0 and any('@' in str(val) for val in sample_values):
+                email_col = col
+                break
+
+    if not email_col:
+        raise ValueError("No email column found in the uploaded file!")
+
+    name_col = _match_column(df.columns, POSSIBLE_NAME_COLS)
+
+    position_col = None
+    if use_templates:
+        position_col = _match_column(df.columns, POSSIBLE_POSITION_COLS)
+        if not position_col:
+            raise ValueError("No position column found for template matching! Please check your file or change the position column name.")
+
+    timezone_col = _match_column(df.columns, POSSIBLE_TIMEZONE_COLS)
+
+    return {"email": email_col, "name": name_col, "position": position_col, "timezone": timezone_col}
+
+
+# Cells may hold several addresses separated by semicolons, commas or whitespace
+EMAIL_SEPARATOR_PATTERN = r"[;,\s]+"
+EMAIL_PATTERN = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+
+
+class RecipientNormalizer:
+    """Split, validate and de-duplicate recipients across every chunk of one upload.
+
+    Each chunk is processed with vectorized pandas string operations. Addresses
+    are compared case-insensitively against everything seen earlier in the file
+    and, when a ``suppression`` list is given, checked against it one set lookup
+    each. Dropped duplicates, invalid and suppressed addresses are counted.
+    """
+
+    def __init__(self, columns, field_cols, suppression=None):
+        self.columns = columns
+        self.field_cols = field_cols
+        self.field_keys = tuple(field_cols)  # Shared by every Recipient of the upload
+        self.suppression = suppression
+        self.seen = set()
+        self.duplicates = 0
+        self.invalid = 0
+        self.suppressed = 0
+
+    def exclude_stored(self, emails):
+        """Skip addresses an interrupted run already stored when the file is read again"""
+        keys = {e.lower() for e in emails}
+        self.seen |= keys
+        # Their first occurrence in the file is not a duplicate
+        self.duplicates -= len(keys)
+
+    def normalize(self, df):
+        """Turn one chunk of rows into ``Recipient`` records"""
+        email_col = self.columns["email"]
+        name_col = self.columns["name"]
+        position_col = self.columns["position"]
+        timezone_col = self.columns.get("timezone")
+        if df.empty:
+            return []
+        df = df.reset_index(drop=True)
+
+        # One row per address: split multi-address cells, then explode
+        emails = (
+            df[email_col].dropna().astype(str)
+            .str.split(EMAIL_SEPARATOR_PATTERN, regex=True)
+            .explode()
+            .str.strip()
+        )
+        emails = emails[emails.notna() & (emails != "")]
+
+        valid = emails.str.fullmatch(EMAIL_PATTERN)
+        self.invalid += int((~valid).sum())
+        emails = emails[valid]
+
+        # Keep the first occurrence of each address in the whole file
+        keys = emails.str.lower()
+        first = ~keys.duplicated() & ~keys.isin(self.seen)
+        self.duplicates += int((~first).sum())
+        emails = emails[first]
+        keys = keys[first]
+        self.seen.update(keys.tolist())
+
+        if self.suppression is not None:
+            allowed = ~keys.map(self.suppression.__contains__).astype(bool)
+            self.suppressed += int((~allowed).sum())
+            emails = emails[allowed]
+        if emails.empty:
+            return []
+
+        rows = emails.index
+        email_values = emails.tolist()
+        if name_col:
+            names = df.loc[rows, name_col].fillna("").astype(str).tolist()
+        else:
+            names = [""] * len(email_values)
+        if position_col:
+            positions = df.loc[rows, position_col].fillna("").astype(str).str.strip().str.lower().tolist()
+        else:
+            positions = [""] * len(email_values)
+        if self.field_cols:
+            field_values = df.loc[rows, list(self.field_cols.values())].fillna("").astype(str)
+            fields = list(field_values.itertuples(index=False, name=None))
+        else:
+            fields = [()] * len(email_values)
+        if timezone_col:
+            zones = df.loc[rows, timezone_col].fillna("").astype(str).str.strip().tolist()
+        else:
+            zones = [None] * len(email_values)
+
+        # Extract name from email if name column is empty
+        keys = self.field_keys
+        return [
+            Recipient(e, n or extract_name_from_email(e)[0] or "", p, keys, f, tz)
+            for e, n, p, f, tz in zip(email_values, names, positions, fields, zones)
+        ]
+
+    def stats(self):
+        return {"duplicates": self.duplicates, "invalid": self.invalid, "suppressed": self.suppressed}
+
+    def iter_batches(self, frames):
+        """Normalize frames into recipient batches, skipping chunks left empty"""
+        for df in frames:
+            batch = self.normalize(df)
+            if batch:
+                yield batch
@@ -0,0 +1,35 @@
+from sys import intern
+
+
+class Recipient:
+    """One campaign recipient, as a slotted record rather than a dict per row.
+
+    Positions and time zones repeat across a list, so they are interned and
+    every recipient shares the same string. Template field values are kept as a
+    tuple next to a ``field_keys`` tuple that all recipients of an upload share;
+    ``fields`` builds the dict only when a message is rendered.
+    """
+
+    __slots__ = ("email", "name", "position", "field_keys", "field_values", "tz", "seq")
+
+    def __init__(self, email, name="", position="", field_keys=(), field_values=(), tz=None, seq=None):
+        self.email = email
+        self.name = name
+        self.position = intern(position) if position else ""
+        self.field_keys = field_keys
+        self.field_values = field_values
+        self.tz = intern(tz) if tz else None
+        self.seq = seq
+
+    @classmethod
+    def with_fields(cls, email, name="", position="", fields=None, tz=None, seq=None):
+        """Build from a ``{placeholder: value}`` dict (e.g. one stored as JSON)"""
+        fields = fields or {}
+        return cls(email, name, position, tuple(fields), tuple(fields.values()), tz, seq)
+
+    @property
+    def fields(self):
+        return dict(zip(self.field_keys, self.field_values))
+
+    def __repr__(self):
+        return f"Recipient({self.email!r}, seq={self.seq})"
@@ -0,0 +1,250 @@
+import imaplib
+import itertools
+import queue
+import re
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import (
+    IMAP_HOST,
+    IMAP_IDLE_SECONDS,
+    IMAP_RECONNECT_INITIAL_SECONDS,
+    IMAP_RECONNECT_MAX_SECONDS,
+    REPLY_LISTENER_KEEP,
+)
+from services.service import sync_replies, process_reply
+
+# Untagged responses during IDLE that mean new mail may have arrived
+IDLE_WAKE = re.compile(rb"^\* \d+ (EXISTS|RECENT)", re.IGNORECASE)
+
+
+class ReplyListener:
+    """Keeps one IMAP IDLE connection to a sender account's inbox and reports new replies.
+
+    Every wake-up (new mail, or the IDLE being re-issued every ``idle_seconds``)
+    runs the same checkpointed sync as a manual check and passes any replies to
+    ``on_replies(listener, replies)``. Dropped connections are re-opened with
+    exponential backoff; a rejected login stops the listener.
+    """
+
+    def __init__(self, sender_email, sender_password, user_id, on_replies, mailbox="INBOX", host=IMAP_HOST,
+                 idle_seconds=IMAP_IDLE_SECONDS):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.user_id = user_id
+        self.on_replies = on_replies
+        self.mailbox = mailbox
+        self.host = host
+        self.idle_seconds = idle_seconds
+        self.status = "starting"
+        self.error = None
+        self.last_sync = None
+        self.replies_found = 0
+        self._stop = threading.Event()
+        self._mail = None
+        self._idle_tag = None  # Set while an IDLE is waiting for its DONE
+        self._idle_lock = threading.Lock()
+        self._tags = itertools.count(1)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"reply-listener-{self.sender_email}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._end_idle()
+
+    def snapshot(self):
+        return {
+            "sender_email": self.sender_email,
+            "mailbox": self.mailbox,
+            "status": self.status,
+            "error": self.error,
+            "last_sync": self.last_sync,
+            "replies_found": self.replies_found,
+        }
+
+    def _run(self):
+        delay = IMAP_RECONNECT_INITIAL_SECONDS
+        while not self._stop.is_set():
+            try:
+                self._mail = imaplib.IMAP4_SSL(self.host, timeout=self.idle_seconds + 60)
+            except (imaplib.IMAP4.error, OSError) as e:
+                self._failed(f"Could not connect: {e}")
+            else:
+                try:
+                    try:
+                        self._mail.login(self.sender_email, self.sender_password)
+                    except imaplib.IMAP4.error as e:
+                        self.status = "error: authentication failed"
+                        self.error = str(e)
+                        print(f"Reply listener for {self.sender_email} stopped: login rejected ({e})")
+                        return
+                    self.status = "listening"
+                    self.error = None
+                    delay = IMAP_RECONNECT_INITIAL_SECONDS
+                    self._listen()
+                except Exception as e:
+                    self._failed(str(e))
+                finally:
+                    self._logout()
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, IMAP_RECONNECT_MAX_SECONDS)
+        self.status = "stopped"
+
+    def _failed(self, error):
+        self.status = "reconnecting"
+        self.error = error
+        print(f"Reply listener for {self.sender_email} lost its connection: {error}")
+
+    def _listen(self):
+        while not self._stop.is_set():
+            replies = sync_replies(self._mail, self.sender_email, self.mailbox)
+            self.last_sync = datetime.now().isoformat()
+            if replies:
+                self.replies_found += len(replies)
+                self.on_replies(self, replies)
+            if self._stop.is_set():
+                return
+            self._idle()
+
+    def _idle(self):
+        """Block in IDLE until new mail, ``idle_seconds`` or ``stop()``"""
+        mail = self._mail
+        tag = b"IDLE%d" % next(self._tags)
+        mail.send(tag + b" IDLE\r\n")
+        line = mail.readline()
+        if not line.startswith(b"+"):
+            raise mail.error(f"IDLE refused: {line.strip()!r}")
+        with self._idle_lock:
+            self._idle_tag = tag
+        if self._stop.is_set():
+            self._end_idle()
+        timer = threading.Timer(self.idle_seconds, self._end_idle)
+        timer.daemon = True
+        timer.start()
+        try:
+            while True:
+                line = mail.readline()
+                if not line:
+                    raise mail.abort("connection closed during IDLE")
+                if line.startswith(tag):
+                    if not line[len(tag):].strip().upper().startswith(b"OK"):
+                        raise mail.error(f"IDLE failed: {line.strip()!r}")
+                    return
+                if line.startswith(b"* BYE"):
+                    raise mail.abort(line.strip().decode(errors="replace"))
+                if IDLE_WAKE.match(line):
+                    self._end_idle()
+        finally:
+            timer.cancel()
+            with self._idle_lock:
+                self._idle_tag = None
+
+    def _end_idle(self):
+        """Send DONE for a waiting IDLE (safe to call from any thread, more than once)"""
+        with self._idle_lock:
+            if self._idle_tag is None or self._mail is None:
+                return
+            self._idle_tag = None
+            try:
+                self._mail.send(b"DONE\r\n")
+            except OSError:
+                pass
+
+    def _logout(self):
+        mail, self._mail = self._mail, None
+        if mail is None:
+            return
+        try:
+            mail.logout()
+        except (imaplib.IMAP4.error, OSError):
+            pass
+
+
+class ReplyListenerService:
+    """Reply listeners of every registered sender account and the replies they found.
+
+    Listeners only fetch; replies go through one processing queue, whose worker
+    creates the Zoho leads and logs them, so a slow CRM call never holds up an
+    inbox. Processed replies are kept (the newest ``keep``) for ``replies()``.
+    """
+
+    def __init__(self, keep=REPLY_LISTENER_KEEP):
+        self._listeners = {}  # Format: {sender_email lowercased: ReplyListener}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._processed = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._worker = None
+
+    def register(self, sender_email, sender_password, user_id="default_user", mailbox="INBOX"):
+        """Start listening to an account, replacing the user's own listener for it.
+
+        Returns None, leaving it alone, if another user's listener has the account.
+        """
+        listener = ReplyListener(sender_email, sender_password, user_id, self._enqueue, mailbox)
+        with self._lock:
+            previous = self._listeners.get(sender_email.lower())
+            if previous and previous.user_id != user_id:
+                return None
+            self._listeners[sender_email.lower()] = listener
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._process, name="reply-processor", daemon=True)
+                self._worker.start()
+        if previous:
+            previous.stop()
+        listener.start()
+        return listener
+
+    def unregister(self, sender_email, user_id=None):
+        """Stop an account's listener, if it belongs to ``user_id`` (None for any user)"""
+        with self._lock:
+            listener = self._listeners.get(sender_email.lower())
+            if listener and (user_id is None or listener.user_id == user_id):
+                del self._listeners[sender_email.lower()]
+            else:
+                listener = None
+        if listener:
+            listener.stop()
+        return listener is not None
+
+    def listeners(self, user_id=None):
+        with self._lock:
+            listeners = list(self._listeners.values())
+        return [l.snapshot() for l in listeners if user_id is None or l.user_id == user_id]
+
+    def replies(self, user_id=None, since=0):
+        """Processed replies with an ``id`` above ``since``, oldest first"""
+        with self._lock:
+            return [r for r in self._processed if r["reply_id"] > since and (user_id is None or r["user_id"] == user_id)]
+
+    def _enqueue(self, listener, replies):
+        for reply in replies:
+            self._queue.put((listener, reply))
+
+    def _process(self):
+        while True:
+            listener, reply = self._queue.get()
+            try:
+                genuine = process_reply(reply, listener.sender_email, listener.user_id)
+            except Exception as e:
+                print(f"Error processing reply {reply.get('id')} for {listener.sender_email}: {e}")
+                genuine = True
+                reply["error"] = str(e)
+            if genuine:
+                with self._lock:
+                    self._processed.append({
+                        **reply,
+                        "reply_id": next(self._ids),
+                        "sender_email": listener.sender_email,
+                        "user_id": listener.user_id,
+                        "received_at": datetime.now().isoformat(),
+                    })
+
+
+# Shared listeners, registered through /reply-listeners
+reply_listeners = ReplyListenerService()
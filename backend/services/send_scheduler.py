@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from config import SEND_DEFAULT_TIMEZONE, SEND_WINDOW_LOAD_CHUNK
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+BUSINESS_DAYS = [0, 1, 2, 3, 4]
+
+# How often a waiting recipient stream wakes its consumer
+IDLE_HEARTBEAT_SECONDS = 1.0
+
+
+@lru_cache(maxsize=1024)
+def get_zone(name):
+    """ZoneInfo for an IANA name, or None if it is empty or unknown"""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ValueError, KeyError, OSError):
+        return None
+
+
+def parse_start_at(value, tz_name=SEND_DEFAULT_TIMEZONE):
+    """ISO 8601 start time as an aware UTC datetime; naive times are read in ``tz_name``"""
+    start_at = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if start_at.tzinfo is None:
+        start_at = start_at.replace(tzinfo=get_zone(tz_name) or timezone.utc)
+    return start_at.astimezone(timezone.utc)
+
+
+def parse_days(value):
+    """"mon-fri", "mon,wed,fri" or "sat-sun" as weekday numbers (Monday is 0)"""
+    days = set()
+    for part in value.lower().replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        if first not in WEEKDAYS or (last and last not in WEEKDAYS):
+            raise ValueError(f"Unknown weekday in '{value}'; use mon..sun")
+        start, end = WEEKDAYS.index(first), WEEKDAYS.index(last or first)
+        days.update(range(start, end + 1) if start <= end else [*range(start, 7), *range(0, end + 1)])
+    if not days:
+        raise ValueError("At least one send day is required")
+    return sorted(days)
+
+
+class SendWindow:
+    """Daily sending hours, in each recipient's local time, on chosen weekdays"""
+
+    def __init__(self, start="09:00", end="17:00", days=BUSINESS_DAYS):
+        self.start = datetime.strptime(start, "%H:%M").time()
+        self.end = datetime.strptime(end, "%H:%M").time()
+        if self.end <= self.start:
+            raise ValueError("The send window must end after it starts (windows can't span midnight)")
+        self.days = list(days)
+
+    @classmethod
+    def parse(cls, hours, days="mon-fri"):
+        """From form values like "09:00-17:00" and "mon-fri" """
+        start, sep, end = hours.partition("-")
+        if not sep:
+            raise ValueError("send_window must look like 09:00-17:00")
+        return cls(start.strip(), end.strip(), parse_days(days))
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params["start"], params["end"], params["days"])
+
+    def to_params(self):
+        return {"start": self.start.strftime("%H:%M"), "end": self.end.strftime("%H:%M"), "days": self.days}
+
+    def next_open(self, now, tz):
+        """Start of the next sending period (``now`` if one is open) and its end, both in UTC"""
+        local = now.astimezone(tz)
+        for offset in range(8):
+            day = local.date() + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            opens = datetime.combine(day, self.start, tzinfo=tz)
+            closes = datetime.combine(day, self.end, tzinfo=tz)
+            if closes > local:
+                return max(opens, local).astimezone(timezone.utc), closes.astimezone(timezone.utc)
+        raise ValueError("Send window has no sending days")
+
+
+class ScheduledSends:
+    """Heap-ordered send schedule of one campaign, fed into a dispatcher as a recipient stream.
+
+    ``recipients`` (stored ``Recipient`` records, with ``seq`` and maybe ``tz``)
+    are first read in full and bucketed by time zone, and each bucket sits in a
+    heap keyed by when its zone's send window next opens. Buckets only hold ``seq``
+    numbers in an ``array('q')``, so even millions of scheduled sends cost about
+    8 bytes each. The recipients themselves stay in the campaign store and are
+    loaded ``SEND_WINDOW_LOAD_CHUNK`` at a time once their window is open.
+    Due times are derived from the window and the zone, so nothing extra is
+    persisted: after a restart the still-pending recipients are scheduled again.
+
+    Iterating yields due recipients and, while nothing is due, ``None`` every
+    ``IDLE_HEARTBEAT_SECONDS`` so the dispatcher stays responsive. A bucket whose
+    window closes is pushed back to its next opening. Recipients the dispatcher
+    has already queued are still sent after a window closes, so run windowed
+    campaigns with a dispatcher ``queue_limit`` of about one batch per sender
+    account: the overrun is then one batch per account, not the whole queue.
+    Temporary failures retried from the dispatcher's retry lane ignore the window.
+    """
+
+    def __init__(self, campaign_id, recipients, window, store, default_tz=SEND_DEFAULT_TIMEZONE, progress=None,
+                 chunk=SEND_WINDOW_LOAD_CHUNK):
+        self.campaign_id = campaign_id
+        self.recipients = recipients
+        self.window = window
+        self.store = store
+        self.default_zone = get_zone(default_tz) or timezone.utc
+        self.progress = progress
+        self.chunk = chunk
+        self._buckets = {}  # Format: {zone name: array('q') of recipient seqs}
+        self._heap = []  # (due UTC timestamp, zone name)
+        self._next_send = None
+        self.scheduled = 0
+
+    def _add(self, recipients):
+        default = str(self.default_zone)
+        for recipient in recipients:
+            name = recipient.tz or default
+            if name != default and get_zone(name) is None:
+                name = default  # Unknown zone names fall back to the campaign's
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                bucket = self._buckets[name] = array("q")
+            bucket.append(recipient.seq)
+            self.scheduled += 1
+
+    def _zone(self, name):
+        return get_zone(name) or self.default_zone
+
+    def _push(self, name, now):
+        opens, _ = self.window.next_open(now, self._zone(name))
+        heapq.heappush(self._heap, (opens.timestamp(), name))
+
+    def __iter__(self):
+        self._add(self.recipients)
+        print(f"Campaign {self.campaign_id}: {self.scheduled} recipients scheduled across {len(self._buckets)} time zones")
+        now = datetime.now(timezone.utc)
+        for name in self._buckets:
+            self._push(name, now)
+        positions = dict.fromkeys(self._buckets, 0)
+
+        while self._heap:
+            due, name = self._heap[0]
+            if due > time.time():
+                self._set_next_send(due)
+                time.sleep(max(0.0, min(due - time.time(), IDLE_HEARTBEAT_SECONDS)))
+                yield None
+                continue
+            heapq.heappop(self._heap)
+            self._set_next_send(None)
+
+            bucket = self._buckets[name]
+            _, closes = self.window.next_open(datetime.now(timezone.utc), self._zone(name))
+            pos = positions[name]
+            while pos < len(bucket) and time.time() < closes.timestamp():
+                seqs = bucket[pos:pos + self.chunk]
+                pos += len(seqs)
+                yield from self.store.pending_recipients_by_seq(self.campaign_id, seqs.tolist())
+            positions[name] = pos
+
+            if pos < len(bucket):
+                print(f"Send window closed for {name}; {len(bucket) - pos} recipients wait for the next one")
+                self._push(name, closes + timedelta(seconds=1))
+            else:
+                del self._buckets[name]
+        self._set_next_send(None)
+
+    def _set_next_send(self, timestamp):
+        if timestamp == self._next_send:
+            return
+        self._next_send = timestamp
+        if self.progress is not None:
+            when = datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+            self.progress.set_next_send(when)
+
+
+class CampaignStartScheduler:
+    """Starts campaigns at their ``start_at`` time from one timer thread.
+
+    Pending starts are kept in a heap ordered by start time. The campaign store
+    keeps the campaigns themselves (status ``scheduled``), so they are put back
+    on the heap after a restart.
+    """
+
+    def __init__(self):
+        self._heap = []  # (start UTC timestamp, tiebreak, campaign_id, start callback)
+        self._order = itertools.count()
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def schedule(self, campaign_id, start_at, start):
+        """Call ``start(campaign_id)`` at ``start_at`` (an aware datetime)"""
+        with self._changed:
+            heapq.heappush(self._heap, (start_at.timestamp(), next(self._order), campaign_id, start))
+            self._changed.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="campaign-scheduler", daemon=True)
+                self._thread.start()
+
+    def pending(self):
+        with self._changed:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._changed.wait(self._heap[0][0] - time.time() if self._heap else None)
+                _, _, campaign_id, start = heapq.heappop(self._heap)
+            try:
+                start(campaign_id)
+            except Exception as e:
+                print(f"Error starting scheduled campaign {campaign_id}: {e}")
+
+
+# Shared timer for campaigns created with a future start_at
+campaign_scheduler = CampaignStartScheduler()
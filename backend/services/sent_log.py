@@ -0,0 +1,135 @@
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from config import SENT_LOG_DB_PATH, SENT_LOG_BATCH_SIZE, SENT_LOG_FLUSH_SECONDS
+
+# Column order used for exports; extra keys (position, template_used, ...) follow
+SENT_EMAIL_COLUMNS = [
+    "timestamp", "sender_email", "sender_name", "recipient_email",
+    "subject", "body", "first_name", "last_name", "company", "phone"
+]
+
+# Workbook written by earlier versions, one full rewrite per message
+LEGACY_SENT_EMAILS_XLSX = "sent_emails.xlsx"
+
+
+class SentEmailLog:
+    """Append-only audit log of sent emails.
+
+    Senders only enqueue rows; a background writer inserts them into SQLite in
+    batches of up to ``batch_size`` (or every ``flush_seconds``), so logging is
+    O(1) per message. The XLSX workbook is built only when someone exports.
+    """
+
+    def __init__(self, path=SENT_LOG_DB_PATH, batch_size=SENT_LOG_BATCH_SIZE,
+                 flush_seconds=SENT_LOG_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sent_emails (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    sender_email TEXT,
+                    recipient_email TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def append(self, row):
+        """Queue one sent-email row for the background writer"""
+        self._ensure_writer()
+        self._queue.put(row)
+        return True
+
+    def flush(self):
+        """Block until every queued row has been committed"""
+        self._queue.join()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="sent-email-log", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                conn.executemany(
+                    "INSERT INTO sent_emails (timestamp, sender_email, recipient_email, data) VALUES (?, ?, ?, ?)",
+                    [(row.get("timestamp"), row.get("sender_email"), row.get("recipient_email"),
+                      json.dumps(row, default=str)) for row in batch]
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"Error writing sent email log: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def rows(self):
+        """All logged rows in send order"""
+        self.flush()
+        conn = self._connect()
+        try:
+            return [json.loads(data) for (data,) in conn.execute("SELECT data FROM sent_emails ORDER BY id")]
+        finally:
+            conn.close()
+
+    def export_excel(self):
+        """Build the sent-emails workbook (legacy XLSX rows first) as a BytesIO"""
+        frames = []
+        if os.path.exists(LEGACY_SENT_EMAILS_XLSX):
+            frames.append(pd.read_excel(LEGACY_SENT_EMAILS_XLSX))
+        frames.append(pd.DataFrame(self.rows()))
+
+        df = pd.concat(frames, ignore_index=True)
+        ordered = [c for c in SENT_EMAIL_COLUMNS if c in df.columns]
+        df = df[ordered + [c for c in df.columns if c not in ordered]]
+
+        output = io.BytesIO()
+        df.to_excel(output, index=False)
+        output.seek(0)
+        return output
+
+
+# Shared log fed by every bulk sender in the process
+sent_email_log = SentEmailLog()
+
+
+def save_sent_email(data):
+    """Record a sent email in the append-only log"""
+    return sent_email_log.append(data)
@@ -1,20 +1,28 @@
-import os, re, smtplib, imaplib, email, json, requests, pandas as pd
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import os, re, email, json, requests, pandas as pd
 from email.header import decode_header
-from itertools import cycle
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from datetime import datetime
 from config import app_state
 import time
-from itertools import cycle
+import threading
+from services.dispatcher import CampaignDispatcher, ResumableStop
+from services.campaign_store import campaign_store, CampaignCheckpointer, HARD_FAILED, SCHEDULED, PAUSED
+from services.progress import CampaignProgress, progress_registry, peak_memory_mb
+from services.sent_log import save_sent_email, sent_email_log
+from services.recipient_ingest import iter_frames, discard_upload, RecipientNormalizer
+from services.message_factory import message_factory
+from services.suppression import suppression_list
+from services.send_scheduler import ScheduledSends, SendWindow, campaign_scheduler, parse_start_at
+from services.imap_sync import new_uids, checkpoint, account_lock
+from services.imap_fetch import fetch_headers, fetch_text_bodies, text_plain_part
+from services.imap_pool import imap_pool, imap_flags
 from utils.helpers import (
     extract_name_from_email,
     extract_phone_number,
     extract_company_from_email,
     save_to_excel,
-    save_sent_email,
-    replace_name_placeholders,
+    template_values,
     is_auto_response,
     is_valid_phone_number
 )
@@ -27,6 +35,10 @@ from config import (
     ZOHO_API_DOMAIN,
     ZOHO_ACCESS_TOKEN,
     ZOHO_REFRESH_TOKEN,
+    SMTP_SEND_BACKEND,
+    SEND_DEFAULT_TIMEZONE,
+    DISPATCH_QUEUE_LIMIT,
+    IMAP_SCAN_WORKERS,
     app_state  # Import the shared state object
 )
 
@@ -412,396 +424,541 @@ def clean_markdown(text):
     
     return text.strip()
 
-def send_bulk_emails_with_templates(recipients, batch_size, sender_accounts, template_data=None):
-    """Send bulk emails with position-based templates"""
-    # Use app_state instead of global progress
-    app_state.progress["total"] = len(recipients)
-    app_state.progress["sent"] = 0
-    app_state.progress["status"] = "running"
+def dispatcher_class(backend):
+    """Dispatcher for a campaign's send backend: "threaded" (default) or "async" """
+    if backend == "async":
+        # Imported lazily so aiosmtplib is only needed when the async backend is used
+        from services.async_dispatcher import AsyncCampaignDispatcher
+        return AsyncCampaignDispatcher
+    return CampaignDispatcher
 
-    sender_cycle = cycle(sender_accounts)
-    start = 0
+def send_bulk_emails(recipients, batch_size, sender_accounts, subject, body, sender_name, on_result=None, progress=None,
+                     backend=SMTP_SEND_BACKEND, queue_limit=DISPATCH_QUEUE_LIMIT):
+    """Original function for sending bulk emails without templates.
 
-    while start < len(recipients):
-        batch = recipients[start:start + batch_size]
-        sender_email, password = next(sender_cycle)
+    Returns the error message that stopped the campaign, or None when it completed.
+    """
+    # Counters are scoped to this campaign so concurrent campaigns don't mix
+    progress = progress or CampaignProgress()
+    progress.start(len(recipients) if isinstance(recipients, list) else 0)
 
-        try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(sender_email, password)
+    # Parse and pre-encode subject and body once; each recipient is then a single render pass
+    factory = message_factory(subject, body)
 
-                for recipient in batch:
-                    name = recipient.get("name", "") or extract_name_from_email(recipient["email"])[0] or "there"
-                    
-                    # Get the appropriate template
-                    if template_data and template_data['templates']:
-                        position = recipient.get("position", "").lower()
-                        template = template_data['templates'].get(position, template_data['default_template'])
-                        
-                        if template:
-                            subject = template['subject']
-                            body = template['body']
-                            sender_name = template.get('sender_name', app_state.email_content.get('sender_name', ''))
-                        else:
-                            # Fallback to default email content
-                            subject = app_state.email_content.get("subject", "")
-                            body = app_state.email_content.get("body", "")
-                            sender_name = app_state.email_content.get("sender_name", "")
-                    else:
-                        # Use regular email content
-                        subject = app_state.email_content.get("subject", "")
-                        body = app_state.email_content.get("body", "")
-                        sender_name = app_state.email_content.get("sender_name", "")
-
-                    # Personalize content
-                    personalized_body = replace_name_placeholders(body, name)
-                    personalized_subject = replace_name_placeholders(subject, name)
-
-                    msg = MIMEMultipart()
-                    msg['From'] = f"{sender_name} <{sender_email}>"
-                    msg['To'] = recipient["email"]
-                    msg['Subject'] = personalized_subject
-                    msg.attach(MIMEText(personalized_body, 'plain'))
-                    server.send_message(msg)
-
-                    # Extract first and last name from the name
-                    first_name, last_name = extract_name_from_email(recipient["email"])
-                    
-                    # Save sent email to separate file
-                    save_sent_email({
-                        "timestamp": datetime.now().isoformat(),
-                        "sender_email": sender_email,
-                        "recipient_email": recipient["email"],
-                        "subject": personalized_subject,
-                        "body": personalized_body,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "company": extract_company_from_email(recipient["email"]),
-                        "phone": "",
-                        "position": recipient.get("position", ""),
-                        "template_used": recipient.get("position", "default") if template_data else "standard"
-                    })
-
-                    app_state.progress["sent"] += 1
-        except Exception as e:
-            app_state.progress["status"] = f"error: {e}"
-            return
+    def compose(recipient, sender_account):
+        sender_email = sender_account['email']
+        name = recipient.name or extract_name_from_email(recipient.email)[0] or "there"
 
-        start += batch_size
+        # Use account sender name if available, otherwise use the provided sender_name
+        display_sender_name = sender_account.get('sender_name', '') or sender_name
+        msg, personalized_subject, personalized_body = factory.build(
+            display_sender_name, sender_email, recipient.email, template_values(recipient, name)
+        )
 
-    app_state.progress["status"] = "completed"
+        # Extract first and last name from the name
+        first_name, last_name = extract_name_from_email(recipient.email)
 
-def send_bulk_emails(recipients, batch_size, sender_accounts, subject, body, sender_name):
-    """Original function for sending bulk emails without templates"""
-    # Use app_state instead of global progress
-    app_state.progress["total"] = len(recipients)
-    app_state.progress["sent"] = 0
-    app_state.progress["status"] = "running"
+        return msg, {
+            "timestamp": datetime.now().isoformat(),
+            "sender_email": sender_email,
+            "sender_name": display_sender_name,  # Include sender name in tracking
+            "recipient_email": recipient.email,
+            "subject": personalized_subject,
+            "body": personalized_body,
+            "first_name": first_name,
+            "last_name": last_name,
+            "company": extract_company_from_email(recipient.email),
+            "phone": ""
+        }
 
-    sender_cycle = cycle(sender_accounts)
-    start = 0
+    # All sender accounts pull from the same recipient queue
+    dispatcher = dispatcher_class(backend)(sender_accounts, compose, progress, batch_size,
+                                           on_sent=save_sent_email, on_result=on_result, queue_limit=queue_limit)
+    error = dispatcher.run(recipients)
 
-    while start < len(recipients):
-        batch = recipients[start:start + batch_size]
-        # FIX: Get the full account object instead of just email and password
-        sender_account = next(sender_cycle)
-        sender_email = sender_account['email']
-        password = sender_account['password']
-        account_sender_name = sender_account.get('sender_name', '')
+    if error:
+        progress.set_status(f"error: {error}")
+        return error
 
-        try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(sender_email, password)
-
-                for recipient in batch:
-                    name = recipient.get("name", "") or extract_name_from_email(recipient["email"])[0] or "there"
-
-                    personalized_body = replace_name_placeholders(body, name)
-                    personalized_subject = replace_name_placeholders(subject, name)
-
-                    msg = MIMEMultipart()
-                    # Use account sender name if available, otherwise use the provided sender_name
-                    display_sender_name = account_sender_name or sender_name
-                    msg['From'] = f"{display_sender_name} <{sender_email}>"
-                    msg['To'] = recipient["email"]
-                    msg['Subject'] = personalized_subject
-                    msg.attach(MIMEText(personalized_body, 'plain'))
-                    
-                    try:
-                        server.send_message(msg)
-                        print(f"Sent email to {recipient['email']}")
-                    except Exception as e:
-                        print(f"Failed to send email to {recipient['email']}: {e}")
-                        app_state.progress["sent"] += 1
-                        continue
-
-                    # Extract first and last name from the name
-                    first_name, last_name = extract_name_from_email(recipient["email"])
-                    
-                    # Save sent email to separate file
-                    save_sent_email({
-                        "timestamp": datetime.now().isoformat(),
-                        "sender_email": sender_email,
-                        "sender_name": display_sender_name,  # Include sender name in tracking
-                        "recipient_email": recipient["email"],
-                        "subject": personalized_subject,
-                        "body": personalized_body,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "company": extract_company_from_email(recipient["email"]),
-                        "phone": ""
-                    })
-
-                    app_state.progress["sent"] += 1
-                    
-                    # Small delay to avoid rate limiting
-                    time.sleep(0.1)
-                    
-        except smtplib.SMTPAuthenticationError as e:
-            app_state.progress["status"] = f"error: SMTP Authentication failed for {sender_email}: {e}"
-            return
-        except smtplib.SMTPException as e:
-            app_state.progress["status"] = f"error: SMTP error for {sender_email}: {e}"
-            return
-        except Exception as e:
-            app_state.progress["status"] = f"error: {e}"
-            return
+    progress.set_status("completed")
+    print("Email sending completed successfully!")
+    return None
 
-        start += batch_size
+def send_bulk_emails_with_templates(recipients, batch_size, sender_accounts, template_data=None, on_result=None, progress=None,
+                                    backend=SMTP_SEND_BACKEND, queue_limit=DISPATCH_QUEUE_LIMIT):
+    """Send bulk emails with position-based templates.
 
-    app_state.progress["status"] = "completed"
-    print("Email sending completed successfully!")
+    Returns the error message that stopped the campaign, or None when it completed.
+    """
+    # Counters are scoped to this campaign so concurrent campaigns don't mix
+    progress = progress or CampaignProgress()
+    progress.start(len(recipients) if isinstance(recipients, list) else 0)
+
+    templates = (template_data or {}).get('templates') or {}
+    resolved = {}  # Format: {(position, sender_email, account sender name): (factory, sender_name, template_used)}
+
+    def resolve(position, sender_email, account_sender_name):
+        """Pick the template and sender name once per position and sender account"""
+        if templates:
+            template = templates.get(position, template_data['default_template'])
+        else:
+            template = None
 
-def send_bulk_emails_with_templates(recipients, batch_size, sender_accounts, template_data=None):
-    """Send bulk emails with position-based templates"""
-    # Use app_state instead of global progress
-    app_state.progress["total"] = len(recipients)
-    app_state.progress["sent"] = 0
-    app_state.progress["status"] = "running"
+        if template:
+            subject = template['subject']
+            body = template['body']
+            # Priority: 1. Account sender name, 2. Template sender name, 3. Extract from email
+            if account_sender_name:
+                sender_name = account_sender_name
+            elif template.get('sender_name'):
+                sender_name = template['sender_name']
+            else:
+                # Extract name from sender email as fallback
+                sender_name, _ = extract_name_from_email(sender_email)
+                if not sender_name:
+                    sender_name = sender_email.split('@')[0].replace('.', ' ').title()
+        else:
+            # Fallback to default email content
+            subject = app_state.email_content.get("subject", "")
+            body = app_state.email_content.get("body", "")
+            sender_name = account_sender_name or app_state.email_content.get("sender_name", "")
 
-    sender_cycle = cycle(sender_accounts)
-    start = 0
+        template_used = (position or "default") if template_data else "standard"
+        # Message factories are built once and cached by template text
+        return message_factory(subject, body), sender_name, template_used
 
-    while start < len(recipients):
-        batch = recipients[start:start + batch_size]
-        sender_account = next(sender_cycle)  # Now get the full account object
+    def compose(recipient, sender_account):
         sender_email = sender_account['email']
-        password = sender_account['password']
         account_sender_name = sender_account.get('sender_name', '')
+        name = recipient.name or extract_name_from_email(recipient.email)[0] or "there"
 
-        try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(sender_email, password)
+        key = (recipient.position.lower(), sender_email, account_sender_name)
+        entry = resolved.get(key)
+        if entry is None:
+            entry = resolved[key] = resolve(*key)
+        factory, sender_name, template_used = entry
 
-                for recipient in batch:
-                    name = recipient.get("name", "") or extract_name_from_email(recipient["email"])[0] or "there"
-                    
-                    # Get the appropriate template
-                    if template_data and template_data['templates']:
-                        position = recipient.get("position", "").lower()
-                        template = template_data['templates'].get(position, template_data['default_template'])
-                        
-                        if template:
-                            subject = template['subject']
-                            body = template['body']
-                            # Priority: 1. Account sender name, 2. Template sender name, 3. Extract from email
-                            if account_sender_name:
-                                sender_name = account_sender_name
-                            elif template.get('sender_name'):
-                                sender_name = template['sender_name']
-                            else:
-                                # Extract name from sender email as fallback
-                                sender_name, _ = extract_name_from_email(sender_email)
-                                if not sender_name:
-                                    sender_name = sender_email.split('@')[0].replace('.', ' ').title()
-                        else:
-                            # Fallback to default email content
-                            subject = app_state.email_content.get("subject", "")
-                            body = app_state.email_content.get("body", "")
-                            sender_name = account_sender_name or app_state.email_content.get("sender_name", "")
-                    else:
-                        # Use regular email content
-                        subject = app_state.email_content.get("subject", "")
-                        body = app_state.email_content.get("body", "")
-                        sender_name = account_sender_name or app_state.email_content.get("sender_name", "")
-
-                    # Personalize content
-                    personalized_body = replace_name_placeholders(body, name)
-                    personalized_subject = replace_name_placeholders(subject, name)
-
-                    msg = MIMEMultipart()
-                    msg['From'] = f"{sender_name} <{sender_email}>"
-                    msg['To'] = recipient["email"]
-                    msg['Subject'] = personalized_subject
-                    msg.attach(MIMEText(personalized_body, 'plain'))
-                    
-                    try:
-                        server.send_message(msg)
-                        print(f"Sent email from {sender_name} to {recipient['email']}")
-                    except Exception as e:
-                        print(f"Failed to send email to {recipient['email']}: {e}")
-                        app_state.progress["sent"] += 1
-                        continue
-
-                    # Extract first and last name from the recipient
-                    first_name, last_name = extract_name_from_email(recipient["email"])
-                    
-                    # Save sent email to separate file
-                    save_sent_email({
-                        "timestamp": datetime.now().isoformat(),
-                        "sender_email": sender_email,
-                        "sender_name": sender_name,
-                        "recipient_email": recipient["email"],
-                        "subject": personalized_subject,
-                        "body": personalized_body,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "company": extract_company_from_email(recipient["email"]),
-                        "phone": "",
-                        "position": recipient.get("position", ""),
-                        "template_used": recipient.get("position", "default") if template_data else "standard"
-                    })
-
-                    app_state.progress["sent"] += 1
-                    
-                    # Small delay to avoid rate limiting
-                    time.sleep(0.1)
-                    
-        except smtplib.SMTPAuthenticationError as e:
-            app_state.progress["status"] = f"error: SMTP Authentication failed for {sender_email}: {e}"
-            return
-        except smtplib.SMTPException as e:
-            app_state.progress["status"] = f"error: SMTP error for {sender_email}: {e}"
-            return
-        except Exception as e:
-            app_state.progress["status"] = f"error: {e}"
-            return
+        msg, personalized_subject, personalized_body = factory.build(
+            sender_name, sender_email, recipient.email, template_values(recipient, name)
+        )
+
+        # Extract first and last name from the recipient
+        first_name, last_name = extract_name_from_email(recipient.email)
+
+        return msg, {
+            "timestamp": datetime.now().isoformat(),
+            "sender_email": sender_email,
+            "sender_name": sender_name,
+            "recipient_email": recipient.email,
+            "subject": personalized_subject,
+            "body": personalized_body,
+            "first_name": first_name,
+            "last_name": last_name,
+            "company": extract_company_from_email(recipient.email),
+            "phone": "",
+            "position": recipient.position,
+            "template_used": template_used
+        }
 
-        start += batch_size
+    # All sender accounts pull from the same recipient queue
+    dispatcher = dispatcher_class(backend)(sender_accounts, compose, progress, batch_size,
+                                           on_sent=save_sent_email, on_result=on_result, queue_limit=queue_limit)
+    error = dispatcher.run(recipients)
 
-    app_state.progress["status"] = "completed"
+    if error:
+        progress.set_status(f"error: {error}")
+        return error
+
+    progress.set_status("completed")
     print("Email sending completed successfully!")
+    return None
+
+def start_campaign(mode, params, sender_accounts, recipient_batches, user_id=None, normalizer=None):
+    """Persist a campaign in the job store and start sending it in the background.
+
+    ``recipient_batches`` is an iterable of recipient lists; it is consumed by the
+    campaign thread, so a large upload is stored and sent while it is still being read.
+    A campaign with a future ``params["start_at"]`` is only scheduled; it reads its
+    upload again when it starts.
+    """
+    start_at = parse_start_at(params["start_at"]) if params.get("start_at") else None
+    if start_at and start_at > datetime.now(start_at.tzinfo):
+        campaign_id = campaign_store.create_campaign(mode, params, sender_accounts, user_id=user_id, status=SCHEDULED)
+        progress = progress_registry.create(campaign_id, user_id)
+        progress.set_status(SCHEDULED)
+        progress.set_next_send(start_at.isoformat())
+        campaign_scheduler.schedule(campaign_id, start_at, _start_scheduled_campaign)
+        print(f"Campaign {campaign_id} scheduled for {start_at.isoformat()}")
+        return campaign_id
+
+    campaign_id = campaign_store.create_campaign(mode, params, sender_accounts, user_id=user_id)
+    progress_registry.create(campaign_id, user_id)
+    threading.Thread(target=run_campaign, args=(campaign_id, recipient_batches, normalizer), daemon=True).start()
+    return campaign_id
+
+def _start_scheduled_campaign(campaign_id):
+    print(f"Starting scheduled campaign {campaign_id}")
+    campaign_store.set_status(campaign_id, "running")
+    threading.Thread(target=run_campaign, args=(campaign_id,), daemon=True).start()
+
+def _campaign_recipients(campaign_id, params, progress, recipient_batches, normalizer=None):
+    """Yield stored pending recipients, then store and yield each newly parsed batch"""
+    progress.add_total(campaign_store.pending_count(campaign_id))
+    yield from campaign_store.iter_pending_recipients(campaign_id)
+
+    if recipient_batches is None:
+        return
+    seq = campaign_store.recipient_count(campaign_id)
+    for batch in recipient_batches:
+        campaign_store.add_recipients(campaign_id, batch, seq)
+        seq += len(batch)
+        progress.add_total(len(batch))
+        if normalizer:
+            progress.set_ingest_stats(normalizer.stats())
+        yield from batch
+
+    params["ingested"] = True
+    campaign_store.update_params(campaign_id, params)
+    if normalizer:
+        print(f"Campaign {campaign_id}: skipped {normalizer.duplicates} duplicate, {normalizer.invalid} invalid "
+              f"and {normalizer.suppressed} suppressed addresses")
+
+def _resume_ingestion(campaign_id, params):
+    """Re-open an upload that was only partly read before a restart"""
+    if params.get("ingested", True) or not os.path.exists(params.get("upload_path", "")):
+        return None, None
+    stored = campaign_store.recipient_emails(campaign_id)
+    print(f"Resuming ingestion of {params['upload_path']} after {len(stored)} recipients")
+    normalizer = RecipientNormalizer(params["columns"], params["field_cols"], suppression_list)
+    normalizer.exclude_stored(stored)
+    return normalizer.iter_batches(iter_frames(params["upload_path"])), normalizer
+
+def run_campaign(campaign_id, recipient_batches=None, normalizer=None):
+    """Send every still-pending recipient of a stored campaign, checkpointing as it goes"""
+    campaign = campaign_store.get_campaign(campaign_id)
+    if not campaign:
+        print(f"Campaign {campaign_id} not found")
+        return
+
+    params = campaign["params"]
+    if recipient_batches is None:
+        recipient_batches, normalizer = _resume_ingestion(campaign_id, params)
+    checkpointer = CampaignCheckpointer(campaign_store, campaign_id)
+
+    def on_result(recipient, status, error=None, smtp_code=None):
+        checkpointer.record(recipient, status, error, smtp_code)
+        if status == HARD_FAILED:
+            suppression_list.record_hard_bounce(recipient.email, smtp_code, error)
+
+    progress = progress_registry.get(campaign_id) or progress_registry.create(campaign_id, campaign["user_id"])
+    recipients = _campaign_recipients(campaign_id, params, progress, recipient_batches, normalizer)
+    queue_limit = DISPATCH_QUEUE_LIMIT
+    if params.get("send_window"):
+        recipients = ScheduledSends(campaign_id, recipients, SendWindow.from_params(params["send_window"]),
+                                    campaign_store, params.get("timezone") or SEND_DEFAULT_TIMEZONE, progress)
+        # Queue about one batch per account, so little is left to send once a window closes
+        queue_limit = max(1, params["batch_size"]) * max(1, len(campaign["sender_accounts"]))
+    print(f"Running campaign {campaign_id}")
 
-def check_email_replies(sender_email, sender_password):
-    """Check for UNREAD replies in the sender's inbox using IMAP"""
-    replies = []
-    
     try:
-        # Connect to Gmail IMAP server
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(sender_email, sender_password)
-        mail.select("inbox")
-        
-        # Search for UNREAD emails only
-        status, messages = mail.search(None, "UNSEEN")
-        email_ids = messages[0].split()
-        
-        # Get all unread emails
-        for num in email_ids:
-            status, data = mail.fetch(num, "(RFC822)")
-            
-            if status != "OK":
-                continue
-                
-            msg = email.message_from_bytes(data[0][1])
-            
-            # Decode subject
-            subject, encoding = decode_header(msg["Subject"])[0]
-            if isinstance(subject, bytes):
-                subject = subject.decode(encoding if encoding else "utf-8")
-            
-            # Check if this is a reply (subject starts with "Re:") or related to our campaign
-            is_reply = subject.lower().startswith("re:")
-            
-            # Check if this is a bounce message (common indicators)
-            is_bounce = any(indicator in subject.lower() for indicator in [
-                "delivery failure", "undeliverable", "returned mail", 
-                "delivery status", "failure notice", "mailer-daemon"
-            ])
-            
-            # Check if this is an auto-response (common indicators)
-            is_auto_response = any(indicator in subject.lower() or 
-                                  any(indicator in msg.get("Auto-Submitted", "").lower() or 
-                                      indicator in msg.get("X-Auto-Response-Suppress", "").lower() 
-                                      for indicator in ["auto", "automatic", "out of office", "ooo", "vacation"])
-                                  for indicator in ["auto-reply", "autoreply", "automatic reply", "out of office", "vacation"])
-            
-            # Only process replies that aren't bounces and aren't auto-responses
-            if (is_reply or "your campaign subject terms" in subject.lower()) and not is_bounce and not is_auto_response:
-                # Get email body
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        content_disposition = str(part.get("Content-Disposition"))
-                        
-                        if content_type == "text/plain" and "attachment" not in content_disposition:
-                            body = part.get_payload(decode=True).decode(errors='ignore')
-                            break
-                else:
-                    body = msg.get_payload(decode=True).decode(errors='ignore')
-                
-                # Get from address
-                from_header = msg["From"]
-                
-                # Extract just the email address if it's in format "Name <email@example.com>"
-                email_match = re.search(r'<(.+?)>', from_header)
-                if email_match:
-                    from_email = email_match.group(1)
-                    from_name = from_header.split('<')[0].strip()
-                else:
-                    from_email = from_header
-                    from_name = ""
-                
-                # Extract first and last name from the from header
-                first_name, last_name = extract_name_from_email(from_header)
-                
-                # Extract phone number from body
-                phone = extract_phone_number(body)
-                
-                # Extract company from email domain
-                company = extract_company_from_email(from_email)
-                
-                replies.append({
-                    "id": num.decode(),
-                    "from": from_email,
-                    "from_name": from_name,
-                    "first_name": first_name,
-                    "last_name": last_name,
-                    "subject": subject,
-                    "body": body,
-                    "date": msg["Date"],
-                    "phone": phone,
-                    "company": company
-                })
-        
-        mail.close()
-        mail.logout()
-        
+        if campaign["mode"] == "templates":
+            error = send_bulk_emails_with_templates(
+                recipients, params["batch_size"], campaign["sender_accounts"],
+                params.get("template_data"), on_result=on_result, progress=progress,
+                backend=params.get("send_backend", SMTP_SEND_BACKEND), queue_limit=queue_limit
+            )
+        else:
+            error = send_bulk_emails(
+                recipients, params["batch_size"], campaign["sender_accounts"],
+                params["subject"], params["body"], params["sender_name"],
+                on_result=on_result, progress=progress,
+                backend=params.get("send_backend", SMTP_SEND_BACKEND), queue_limit=queue_limit
+            )
+        if not error and progress.total == 0:
+            error = "No valid email addresses found in the uploaded file!"
+            progress.set_status(f"error: {error}")
     except Exception as e:
-        print(f"Error checking emails: {e}")
-    
+        error = str(e)
+        progress.set_status(f"error: {e}")
+    finally:
+        checkpointer.flush()
+        sent_email_log.flush()
+
+    if isinstance(error, ResumableStop):
+        # Recipients are still pending: keep the credentials and the upload for resume_paused_campaign
+        progress.set_status(f"{PAUSED}: {error}")
+        campaign_store.set_status(campaign_id, f"{PAUSED}: {error}")
+        print(f"Campaign {campaign_id} paused: {progress.sent} sent, {progress.failed} failed; {error}")
+        return
+    if error:
+        campaign_store.set_status(campaign_id, f"error: {error}", clear_credentials=True)
+    else:
+        campaign_store.set_status(campaign_id, "completed", clear_credentials=True)
+    discard_upload(params.get("upload_path"))
+    print(f"Campaign {campaign_id} finished: {progress.sent} sent, {progress.failed} failed, "
+          f"peak process memory {peak_memory_mb()} MB")
+
+def resume_paused_campaign(campaign_id, sender_accounts=None):
+    """Send the rest of a paused campaign, optionally with new sender accounts; False if it isn't paused"""
+    if not campaign_store.claim_paused(campaign_id):
+        return False
+    if sender_accounts:
+        campaign_store.update_sender_accounts(campaign_id, sender_accounts)
+    print(f"Resuming paused campaign {campaign_id}")
+    threading.Thread(target=run_campaign, args=(campaign_id,), daemon=True).start()
+    return True
+
+def resume_campaigns():
+    """Restart campaigns that were interrupted by a process restart, and re-arm scheduled ones"""
+    for campaign_id in campaign_store.incomplete_campaigns():
+        print(f"Resuming interrupted campaign {campaign_id}")
+        threading.Thread(target=run_campaign, args=(campaign_id,), daemon=True).start()
+    for campaign_id, start_at in campaign_store.scheduled_campaigns():
+        print(f"Re-scheduling campaign {campaign_id} for {start_at}")
+        campaign_scheduler.schedule(campaign_id, parse_start_at(start_at), _start_scheduled_campaign)
+
+def parse_reply_headers(uid, headers):
+    """Lead details from a message's headers, or None unless it is a genuine reply.
+
+    Only the header fields are needed to classify a message, so bounces and
+    auto-replies are dropped before any body is downloaded; ``body`` and
+    ``phone`` are filled in by ``add_reply_body``.
+    """
+    msg = email.message_from_bytes(headers)
+
+    # Decode subject
+    subject, encoding = decode_header(msg["Subject"] or "")[0]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding if encoding else "utf-8", errors="ignore")
+
+    # Check if this is a reply (subject starts with "Re:") or related to our campaign
+    is_reply = subject.lower().startswith("re:")
+
+    # Check if this is a bounce message (common indicators)
+    is_bounce = any(indicator in subject.lower() for indicator in [
+        "delivery failure", "undeliverable", "returned mail",
+        "delivery status", "failure notice", "mailer-daemon"
+    ])
+
+    # Check if this is an auto-response (common indicators)
+    is_auto_response = any(indicator in subject.lower() or
+                          any(indicator in msg.get("Auto-Submitted", "").lower() or
+                              indicator in msg.get("X-Auto-Response-Suppress", "").lower()
+                              for indicator in ["auto", "automatic", "out of office", "ooo", "vacation"])
+                          for indicator in ["auto-reply", "autoreply", "automatic reply", "out of office", "vacation"])
+
+    # Only process replies that aren't bounces and aren't auto-responses
+    if not (is_reply or "your campaign subject terms" in subject.lower()) or is_bounce or is_auto_response:
+        return None
+
+    # Get from address
+    from_header = msg["From"] or ""
+
+    # Extract just the email address if it's in format "Name <email@example.com>"
+    email_match = re.search(r'<(.+?)>', from_header)
+    if email_match:
+        from_email = email_match.group(1)
+        from_name = from_header.split('<')[0].strip()
+    else:
+        from_email = from_header
+        from_name = ""
+
+    # Extract first and last name from the from header
+    first_name, last_name = extract_name_from_email(from_header)
+
+    return {
+        "id": str(uid),  # IMAP UID, stable across sessions unlike sequence numbers
+        "message_id": (msg["Message-ID"] or "").strip(),
+        "from": from_email,
+        "from_name": from_name,
+        "first_name": first_name,
+        "last_name": last_name,
+        "subject": subject,
+        "body": "",
+        "date": msg["Date"],
+        "phone": "",
+        "company": extract_company_from_email(from_email)
+    }
+
+def add_reply_body(reply, body):
+    reply["body"] = body
+    reply["phone"] = extract_phone_number(body)
+    return reply
+
+def fetch_replies(mail, uids):
+    """Replies among ``uids`` of the selected mailbox, fetched in two phases.
+
+    Phase one fetches a few header fields and the BODYSTRUCTURE of every
+    message and classifies them; phase two fetches only the text/plain part
+    of the genuine replies. Returns (replies, processed UIDs, bytes received).
+    A message counts as processed once it is classified and, for a reply with
+    a text part, its body is in; a failed FETCH leaves it out (and its reply
+    is not returned), so the next sync fetches it again.
+    """
+    headers, received, _ = fetch_headers(mail, uids)
+    replies, parts = {}, {}
+    for uid, (header_bytes, structure) in headers.items():
+        reply = parse_reply_headers(uid, header_bytes)
+        if reply:
+            replies[uid] = reply
+            part = text_plain_part(structure)
+            if part:
+                parts[uid] = part
+
+    bodies, body_bytes, failed = fetch_text_bodies(mail, parts)
+    for uid, body in bodies.items():
+        add_reply_body(replies[uid], body)
+
+    # Replies whose body FETCH failed (or came back without it) wait for the next sync
+    unprocessed = set(failed) | (set(parts) - set(bodies))
+    for uid in unprocessed:
+        del replies[uid]
+    processed = [uid for uid in headers if uid not in unprocessed]
+    return [replies[uid] for uid in sorted(replies)], processed, received + body_bytes
+
+
+def sync_replies(mail, sender_email, mailbox="INBOX"):
+    """Replies that arrived in a logged-in mailbox since its checkpoint, which is then advanced.
+
+    Only UIDs above the mailbox's stored checkpoint are fetched, so each call
+    costs about as much as the new mail it finds; the first call (or one after
+    the mailbox's UIDVALIDITY changed) picks up the unread messages. Headers are
+    fetched first and bodies only for real replies, all with BODY.PEEK so
+    messages stay unread. Syncs of the same account are serialized, so a
+    listener and a manual check never hand out the same reply twice.
+    """
+    with account_lock(sender_email):
+        uidvalidity, uids, high_water = new_uids(mail, sender_email, mailbox)
+        replies, processed, received = fetch_replies(mail, uids)
+        # Checkpoint only what was fetched; a failed batch is retried next time
+        checkpoint(sender_email, mailbox, uidvalidity, high_water, uids, processed)
+    if uids:
+        print(f"Reply sync for {sender_email}: {len(processed)} new messages, {len(replies)} replies, "
+              f"{received} bytes fetched")
+    return replies
+
+def scan_inbox(sender_email, sender_password, mailbox="INBOX"):
+    """Replies that arrived since the last check, over a pooled IMAP session; raises on IMAP errors"""
+    with imap_pool.connection(sender_email, sender_password) as session:
+        # sync_replies selects the mailbox read-only behind the session's back; until it
+        # succeeds, nothing is known to be selected, so a later store() selects again
+        session.selected = None
+        replies = sync_replies(session.mail, sender_email, mailbox)
+        session.selected = (mailbox, True)
     return replies
 
+def check_email_replies(sender_email, sender_password, mailbox="INBOX"):
+    """Return the replies that arrived since the last check (none if the inbox can't be read)"""
+    try:
+        return scan_inbox(sender_email, sender_password, mailbox)
+    except Exception as e:
+        print(f"Error checking emails: {e}")
+        return []
+
+def reply_key(reply):
+    """Identity of a reply across inboxes: its Message-ID, or sender, subject and date without one"""
+    if reply.get("message_id"):
+        return reply["message_id"].lower()
+    return (reply.get("from", "").lower(), reply.get("subject"), reply.get("date"))
+
+def scan_reply_inboxes(accounts, mailbox="INBOX", workers=IMAP_SCAN_WORKERS):
+    """Scan many sender accounts' inboxes at once and merge what they found.
+
+    ``accounts`` are ``{"sender_email", "sender_password"}`` dicts; at most
+    ``workers`` inboxes are read concurrently. The same reply in several
+    inboxes (e.g. a reply-all) is kept once, listing every account that got it.
+    Returns (replies, per-account results with timing and errors).
+    """
+    def scan(account):
+        started = time.monotonic()
+        result = {"sender_email": account["sender_email"], "status": "ok", "error": None, "replies": 0}
+        try:
+            replies = scan_inbox(account["sender_email"], account["sender_password"], mailbox)
+            result["replies"] = len(replies)
+        except Exception as e:
+            replies = []
+            result["status"] = "error"
+            result["error"] = str(e)
+            print(f"Error checking emails for {account['sender_email']}: {e}")
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return result, replies
+
+    results, merged = [], {}
+    if not accounts:
+        return [], results
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(accounts))), thread_name_prefix="reply-scan") as pool:
+        # map keeps the request's account order, so merging is deterministic
+        for result, replies in pool.map(scan, accounts):
+            results.append(result)
+            for reply in replies:
+                key = reply_key(reply)
+                if key in merged:
+                    merged[key]["accounts"].append(result["sender_email"])
+                    result["duplicates"] = result.get("duplicates", 0) + 1
+                else:
+                    merged[key] = {**reply, "sender_email": result["sender_email"], "accounts": [result["sender_email"]]}
+    return list(merged.values()), results
+
+def process_reply(reply, sender_email, user_id="default_user"):
+    """Turn one reply into a Zoho lead and log it to the replies workbook.
+
+    Auto-responses are skipped (returns False). ``reply`` gets
+    ``converted_to_lead`` and, on success, ``zoho_lead_id``.
+    """
+    if is_auto_response(reply):
+        return False
+
+    # Extract phone number and validate it
+    phone = extract_phone_number(reply.get("body", ""))
+    if not is_valid_phone_number(phone):
+        phone = ""  # Don't include invalid phone numbers
+
+    lead_data = {
+        "email": reply.get("from"),
+        "first_name": reply.get("first_name", ""),
+        "last_name": reply.get("last_name", ""),
+        "company": reply.get("company", "From Email Reply"),
+        "phone": phone,  # This will be empty if invalid
+        "body": reply.get("body", "")
+    }
+
+    # Create lead in Zoho CRM - pass user_id
+    lead_id = create_zoho_lead(lead_data, user_id)
+    if lead_id:
+        reply["zoho_lead_id"] = lead_id
+        reply["converted_to_lead"] = True
+    else:
+        reply["converted_to_lead"] = False
+
+    # Save reply details to Excel
+    save_to_excel({
+        "timestamp": datetime.now().isoformat(),
+        "sender_email": reply.get("from"),
+        "recipient_email": sender_email,
+        "subject": reply.get("subject"),
+        "body": reply.get("body"),
+        "first_name": reply.get("first_name", ""),
+        "last_name": reply.get("last_name", ""),
+        "company": reply.get("company", ""),
+        "phone": phone,  # Save the validated phone (or empty)
+        "converted_to_lead": reply.get("converted_to_lead", False),
+        "zoho_lead_id": reply.get("zoho_lead_id", "")
+    })
+    return True
+
 def mark_email_as_read(sender_email, sender_password, email_id):
-    """Mark an email as read"""
+    """Queue a reply (by UID) to be flagged \\Seen; queued flags go out together as one UID STORE"""
+    imap_flags.add(sender_email, sender_password, [email_id])
+    return True
+
+def mark_emails_as_read(sender_email, sender_password, email_ids, mailbox="INBOX"):
+    """Flag replies (by UID) \\Seen right away with a single UID STORE"""
     try:
-        # Connect to Gmail IMAP server
-        mail = imaplib.IMAP4_SSL("imap.gmail.com")
-        mail.login(sender_email, sender_password)
-        mail.select("inbox")
-        
-        # Mark email as read
-        mail.store(email_id, '+FLAGS', '\\Seen')
-        
-        mail.close()
-        mail.logout()
+        with imap_pool.connection(sender_email, sender_password) as session:
+            session.store(email_ids, mailbox=mailbox)
         return True
     except Exception as e:
-        print(f"Error marking email as read: {e}")
+        print(f"Error marking emails as read: {e}")
         return False
 
 def get_zoho_custom_fields(user_id="default_user"):
@@ -0,0 +1,222 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from config import (
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_TIMEOUT_SECONDS,
+    SMTP_KEEPALIVE_SECONDS,
+    SMTP_MAX_IDLE_SECONDS,
+    SMTP_MAX_IDLE_PER_ACCOUNT,
+    SMTP_STARTTLS,
+)
+
+
+class SMTPSession:
+    """An authenticated SMTP connection for one sender account"""
+
+    def __init__(self, host, port, email, password, timeout=SMTP_TIMEOUT_SECONDS, starttls=SMTP_STARTTLS, login=True):
+        self.host = host
+        self.port = port
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.starttls = starttls
+        self.login = login
+        self.server = None
+        self.last_used = 0.0
+
+    def connect(self):
+        """Open the connection, upgrade it with STARTTLS and log in"""
+        self.close()
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.login:
+                server.login(self.email, self.password)
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+            raise
+        self.server = server
+        self.last_used = time.monotonic()
+        return self
+
+    def is_alive(self):
+        """Send a NOOP to check that the server still accepts commands"""
+        if self.server is None:
+            return False
+        try:
+            code = self.server.noop()[0]
+        except (smtplib.SMTPException, OSError):
+            return False
+        self.last_used = time.monotonic()
+        return code == 250
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Send a message, reconnecting once if the server dropped the session"""
+        if self.server is None:
+            self.connect()
+        try:
+            result = self.server.send_message(msg, from_addr, to_addrs)
+        except smtplib.SMTPServerDisconnected:
+            print(f"SMTP session for {self.email} dropped, reconnecting...")
+            self.connect()
+            result = self.server.send_message(msg, from_addr, to_addrs)
+        self.last_used = time.monotonic()
+        return result
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Send a pre-serialized message, reconnecting once if the session dropped"""
+        if self.server is None:
+            self.connect()
+        try:
+            result = self.server.sendmail(from_addr, to_addrs, msg)
+        except smtplib.SMTPServerDisconnected:
+            print(f"SMTP session for {self.email} dropped, reconnecting...")
+            self.connect()
+            result = self.server.sendmail(from_addr, to_addrs, msg)
+        self.last_used = time.monotonic()
+        return result
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+        self.server = None
+
+
+class SMTPConnectionPool:
+    """Reusable, health-checked SMTP sessions keyed by sender account.
+
+    Sessions are checked out with ``connection()`` and returned to the pool
+    afterwards, so consecutive batches and campaigns on the same account share
+    one TLS handshake and login. Idle sessions get a NOOP before reuse and are
+    closed once they have been idle longer than ``max_idle``.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT,
+                 keepalive_interval=SMTP_KEEPALIVE_SECONDS,
+                 max_idle=SMTP_MAX_IDLE_SECONDS,
+                 max_idle_per_account=SMTP_MAX_IDLE_PER_ACCOUNT,
+                 starttls=SMTP_STARTTLS, login=True):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.login = login
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self.max_idle_per_account = max_idle_per_account
+        self._idle = {}  # Format: {sender_email: [SMTPSession, ...]}
+        self._lock = threading.Lock()
+        self._keepalive_thread = None
+        self._stop = threading.Event()
+
+    def acquire(self, email, password):
+        """Check out a live session for the account, logging in only if needed"""
+        while True:
+            with self._lock:
+                sessions = self._idle.get(email)
+                session = sessions.pop() if sessions else None
+            if session is None:
+                break
+            if session.password != password or session.idle_seconds() > self.max_idle:
+                session.close()
+                continue
+            if session.idle_seconds() < self.keepalive_interval or session.is_alive():
+                return session
+            session.close()
+
+        self.start_keepalive()
+        return SMTPSession(self.host, self.port, email, password,
+                           starttls=self.starttls, login=self.login).connect()
+
+    def release(self, session, discard=False):
+        """Return a session to the pool, or close it if it is no longer usable"""
+        if discard or session.server is None:
+            session.close()
+            return
+        with self._lock:
+            sessions = self._idle.setdefault(session.email, [])
+            if len(sessions) < self.max_idle_per_account:
+                sessions.append(session)
+                return
+        session.close()
+
+    @contextmanager
+    def connection(self, email, password):
+        """Context manager yielding a pooled session for ``email``"""
+        session = self.acquire(email, password)
+        try:
+            yield session
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.release(session, discard=True)
+            raise
+        except BaseException:
+            self.release(session)
+            raise
+        else:
+            self.release(session)
+
+    def keepalive(self):
+        """NOOP idle sessions and drop the ones that are dead or idle too long"""
+        with self._lock:
+            snapshot = {email: list(sessions) for email, sessions in self._idle.items()}
+            self._idle = {}
+
+        survivors = {}
+        for email, sessions in snapshot.items():
+            for session in sessions:
+                if session.idle_seconds() > self.max_idle or not session.is_alive():
+                    session.close()
+                else:
+                    survivors.setdefault(email, []).append(session)
+
+        with self._lock:
+            for email, sessions in survivors.items():
+                self._idle.setdefault(email, []).extend(sessions)
+
+    def start_keepalive(self):
+        """Start the background keepalive thread if it is not running yet"""
+        with self._lock:
+            if self._keepalive_thread and self._keepalive_thread.is_alive():
+                return
+            self._stop.clear()
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name="smtp-pool-keepalive", daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            try:
+                self.keepalive()
+            except Exception as e:
+                print(f"SMTP keepalive error: {e}")
+
+    def close_all(self):
+        """Stop the keepalive thread and close every pooled session"""
+        self._stop.set()
+        with self._lock:
+            sessions = [s for group in self._idle.values() for s in group]
+            self._idle = {}
+        for session in sessions:
+            session.close()
+
+
+# Shared pool used by every bulk sender in the process
+smtp_pool = SMTPConnectionPool()
@@ -0,0 +1,114 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import SUPPRESSION_DB_PATH
+
+HARD_BOUNCE = "hard_bounce"
+UNSUBSCRIBED = "unsubscribed"
+INVALID = "invalid"
+
+# Permanent replies that mean the mailbox itself does not exist or won't take mail;
+# other 5xx (policy, content, DNSBL) say nothing about the address
+MAILBOX_REJECT_CODES = (550, 551, 553)
+# Enhanced status code (RFC 3463) such as "5.1.1", but not part of an IP address or email address
+ENHANCED_STATUS = re.compile(r"(?<![\w.])([245])\.(\d{1,3})\.(\d{1,3})(?![\w.])")
+# 5.1.x codes about the sender's address rather than the recipient's
+SENDER_ADDRESS_DETAILS = ("7", "8")
+
+
+def is_mailbox_reject(smtp_code, error=None):
+    """Whether a permanent failure says the recipient's address itself is dead.
+
+    An enhanced status code decides when the reply has one: only 5.1.x (bad
+    destination mailbox or address) counts, never 5.7.x policy or content
+    rejections or any other class. A bare 550, 551 or 553 counts too.
+    """
+    match = ENHANCED_STATUS.search(error or "")
+    if match:
+        status, subject, detail = match.groups()
+        return status == "5" and subject == "1" and detail not in SENDER_ADDRESS_DETAILS
+    return smtp_code in MAILBOX_REJECT_CODES
+
+
+class SuppressionList:
+    """Addresses that must never be mailed again.
+
+    Entries live in SQLite with why and when they were added; every address is
+    also kept lowercased in an in-memory set, so checking a recipient is a single
+    O(1) lookup. A set rather than a Bloom filter, since a false positive would
+    silently drop a real recipient.
+    """
+
+    def __init__(self, path=SUPPRESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS suppressions (
+                email TEXT PRIMARY KEY,
+                reason TEXT NOT NULL,
+                detail TEXT,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._emails = {email for (email,) in self._conn.execute("SELECT email FROM suppressions")}
+
+    def __contains__(self, email):
+        return email.lower() in self._emails
+
+    def __len__(self):
+        return len(self._emails)
+
+    def add(self, emails, reason, detail=None):
+        """Suppress addresses (already suppressed ones keep their first reason); returns how many were new"""
+        new = {e.strip().lower() for e in emails if e and e.strip()} - self._emails
+        if not new:
+            return 0
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO suppressions (email, reason, detail, created_at) VALUES (?, ?, ?, ?)",
+                [(email, reason, detail, now) for email in new]
+            )
+            self._conn.commit()
+            self._emails |= new
+        return len(new)
+
+    def remove(self, emails):
+        """Lift the suppression of addresses; returns how many were suppressed"""
+        keys = {e.strip().lower() for e in emails if e} & self._emails
+        if not keys:
+            return 0
+        with self._lock:
+            self._conn.executemany("DELETE FROM suppressions WHERE email = ?", [(k,) for k in keys])
+            self._conn.commit()
+            self._emails -= keys
+        return len(keys)
+
+    def record_hard_bounce(self, email, smtp_code, error=None):
+        """Dispatcher result hook: suppress recipients whose mailbox was rejected for good"""
+        if is_mailbox_reject(smtp_code, error):
+            self.add([email], HARD_BOUNCE, f"{smtp_code} {error or ''}".strip())
+
+    def lookup(self, email):
+        """The stored entry for one address, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT email, reason, detail, created_at FROM suppressions WHERE email = ?", (email.strip().lower(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("email", "reason", "detail", "created_at"), row))
+
+    def counts(self):
+        """Number of suppressed addresses per reason"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT reason, COUNT(*) FROM suppressions GROUP BY reason").fetchall())
+
+
+# Shared list checked by every upload and fed by senders and validators
+suppression_list = SuppressionList()
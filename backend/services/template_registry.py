@@ -0,0 +1,87 @@
+import threading
+
+from database import db
+from utils.helpers import compile_template
+
+DEFAULT_POSITIONS = ("general", "default")
+
+
+class TemplateSet:
+    """One version of a user's position templates"""
+
+    def __init__(self, version, templates):
+        self.version = version
+        self.templates = templates  # Format: {position: {subject, body, sender_name}}
+        default = next((templates[p] for p in DEFAULT_POSITIONS if p in templates), None)
+        self.default_template = default or next(iter(templates.values()), None)
+
+    @classmethod
+    def from_rows(cls, version, rows):
+        return cls(version, {
+            row['position']: {'subject': row['subject'], 'body': row['body'], 'sender_name': row['sender_name'] or ''}
+            for row in rows
+        })
+
+    def details(self):
+        """Templates with their placeholders, as shown by the frontend"""
+        details = []
+        for position, template in self.templates.items():
+            # Compiled templates are cached, so sends reuse these segment lists
+            placeholders = (compile_template(template['subject']).placeholders |
+                            compile_template(template['body']).placeholders)
+            details.append({'position': position, **template, 'placeholders': sorted(placeholders)})
+        return details
+
+    def to_params(self):
+        """The template_data a campaign stores, so a resumed send uses the version it started with"""
+        return {'templates': self.templates, 'default_template': self.default_template, 'version': self.version}
+
+
+class TemplateRegistry:
+    """Per-user, versioned email templates kept in MySQL with an in-process read-through cache.
+
+    Every upload is saved as the user's next version; ``get`` returns the newest
+    one, reading the database only on a cache miss. If the database can't be
+    reached the uploaded set is still cached (with version None) so the current
+    process can send with it.
+    """
+
+    def __init__(self, database=db):
+        self.database = database
+        self._cache = {}  # Format: {user_id: TemplateSet}
+        self._lock = threading.Lock()
+
+    def save(self, user_id, templates):
+        version = self.database.save_template_version(user_id, templates)
+        if version is None:
+            print(f"Templates for {user_id} could not be saved; keeping them in memory only")
+        template_set = TemplateSet(version, templates)
+        with self._lock:
+            self._cache[user_id] = template_set
+        return template_set
+
+    def get(self, user_id):
+        """The user's newest TemplateSet, or None if they never uploaded one"""
+        with self._lock:
+            template_set = self._cache.get(user_id)
+        if template_set is not None:
+            return template_set
+
+        version, rows = self.database.get_latest_templates(user_id)
+        if not rows:
+            return None
+        template_set = TemplateSet.from_rows(version, rows)
+        with self._lock:
+            # A concurrent save wins over what was just read
+            return self._cache.setdefault(user_id, template_set)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+
+# Shared registry used by template uploads and template campaigns
+template_registry = TemplateRegistry()
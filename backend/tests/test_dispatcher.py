@@ -0,0 +1,16 @@
+import smtplib
+
+from services.dispatcher import is_account_error
+
+
+def test_refused_recipients_are_not_account_errors():
+    assert not is_account_error(smtplib.SMTPRecipientsRefused({"gone@example.com": (550, b"5.1.1 No such user")}))
+    assert not is_account_error(smtplib.SMTPDataError(550, b"5.7.1 Message rejected by policy"))
+    assert not is_account_error(smtplib.SMTPResponseException(552, b"5.3.4 Message too big"))
+
+
+def test_connection_and_login_failures_are_account_errors():
+    assert is_account_error(smtplib.SMTPServerDisconnected("Connection unexpectedly closed"))
+    assert is_account_error(smtplib.SMTPAuthenticationError(535, b"5.7.8 Bad credentials"))
+    assert is_account_error(ConnectionResetError(104, "Connection reset by peer"))
+    assert is_account_error(smtplib.SMTPSenderRefused(550, b"5.7.1 Sender blocked", "me@example.com"))
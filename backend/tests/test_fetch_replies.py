@@ -0,0 +1,74 @@
+from services.service import fetch_replies
+
+PLAIN = b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 40 1 NIL NIL NIL)'
+HTML_ONLY = b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 40 1 NIL NIL NIL)'
+PDF = b'("APPLICATION" "PDF" ("NAME" "offer.pdf") NIL NIL "BASE64" 900 NIL ("ATTACHMENT" ("FILENAME" "offer.pdf")) NIL)'
+# multipart/mixed around multipart/alternative: the text is section 1.1, fetched apart from section 1
+MIXED = b"((" + PLAIN + HTML_ONLY + b' "ALTERNATIVE")' + PDF + b' "MIXED")'
+
+
+class FakeMailbox:
+    """UID FETCH responses shaped like imaplib's, with body FETCHes of some UIDs failing"""
+
+    def __init__(self, messages, failing_bodies=()):
+        self.messages = messages  # Format: {uid: (subject, BODYSTRUCTURE, body)}
+        self.failing_bodies = set(failing_bodies)
+
+    def uid(self, command, uid_set, items):
+        uids = [int(uid) for uid in uid_set.split(",")]
+        if "HEADER.FIELDS" in items:
+            data = []
+            for seq, uid in enumerate(uids, 1):
+                subject, structure, _ = self.messages[uid]
+                header = b"From: Jane Roe <jane@acme.com>\r\nSubject: %s\r\nMessage-ID: <%d@acme.com>\r\n\r\n" % (
+                    subject, uid)
+                data.append((b"%d (UID %d BODY[HEADER.FIELDS (FROM SUBJECT MESSAGE-ID)] {%d}" % (
+                    seq, uid, len(header)), header))
+                data.append(b" BODYSTRUCTURE " + structure + b")")
+            return "OK", data
+        if self.failing_bodies & set(uids):
+            return "NO", [b"FETCH failed"]
+        data = []
+        for seq, uid in enumerate(uids, 1):
+            body = self.messages[uid][2]
+            data.append((b"%d (UID %d BODY[1]<0> {%d}" % (seq, uid, len(body)), body))
+            data.append(b")")
+        return "OK", data
+
+
+def test_reply_whose_body_fetch_failed_is_not_processed():
+    mail = FakeMailbox({
+        10: (b"Re: our offer", MIXED, b"Sounds good, call me at 555-123-4567"),
+        20: (b"Re: pricing", PLAIN, b"Send the price list"),
+    }, failing_bodies=[20])
+
+    replies, processed, _ = fetch_replies(mail, [10, 20])
+
+    assert [reply["id"] for reply in replies] == ["10"]
+    assert replies[0]["body"].startswith("Sounds good")
+    assert processed == [10]
+
+
+def test_failed_body_batch_leaves_every_reply_in_it_unprocessed():
+    mail = FakeMailbox({
+        10: (b"Re: our offer", PLAIN, b"Sounds good"),
+        20: (b"Re: pricing", PLAIN, b"Send the price list"),
+        30: (b"Newsletter", PLAIN, b"Not a reply"),
+    }, failing_bodies=[20])
+
+    replies, processed, _ = fetch_replies(mail, [10, 20, 30])
+
+    assert replies == []
+    assert processed == [30]
+
+
+def test_messages_without_a_body_to_fetch_are_processed():
+    mail = FakeMailbox({
+        10: (b"Newsletter", PLAIN, b"Not a reply"),
+        20: (b"Re: html only", HTML_ONLY, b""),
+    })
+
+    replies, processed, _ = fetch_replies(mail, [10, 20])
+
+    assert [reply["id"] for reply in replies] == ["20"]
+    assert processed == [10, 20]
@@ -0,0 +1,56 @@
+from services.imap_fetch import _messages, _parse_tokens, decode_part, text_plain_part
+
+PLAIN = b'("TEXT" "PLAIN" ("CHARSET" "iso-8859-1") NIL NIL "QUOTED-PRINTABLE" 40 1 NIL NIL NIL)'
+HTML = b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 80 2 NIL NIL NIL)'
+NOTES = b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "BASE64" 60 1 NIL ("ATTACHMENT" ("FILENAME" "notes.txt")) NIL)'
+
+
+def structure(text):
+    return _parse_tokens(text, [])[0]
+
+
+def test_messages_splits_a_fetch_response_and_swaps_literals_for_markers():
+    data = [
+        (b"1 (UID 10 BODY[HEADER.FIELDS (SUBJECT)] {16}", b"Subject: Hello\r\n"),
+        b" BODYSTRUCTURE " + HTML + b")",
+        (b"2 (UID 20 BODY[HEADER.FIELDS (SUBJECT)] {14}", b"Subject: Bye\r\n"),
+        b")",
+    ]
+
+    messages = list(_messages(data))
+
+    assert messages == [
+        (b"1 (UID 10 BODY[HEADER.FIELDS (SUBJECT)] \x000\x00 BODYSTRUCTURE " + HTML + b")", [b"Subject: Hello\r\n"]),
+        (b"2 (UID 20 BODY[HEADER.FIELDS (SUBJECT)] \x000\x00)", [b"Subject: Bye\r\n"]),
+    ]
+
+
+def test_parse_tokens_reads_quoted_strings_nil_nested_lists_and_literals():
+    data = [(b"1 (UID 7 BODY[1]<0> {5}", b"hi (x"), rb' FLAGS ("\\Seen" NIL (a "b \"c\"")))']
+    text, literals = next(_messages(data))
+
+    assert _parse_tokens(text, literals) == [
+        b"1", [b"UID", b"7", b"BODY[1]<0>", b"hi (x", b"FLAGS", [b"\\Seen", None, [b"a", b'b "c"']]],
+    ]
+
+
+def test_single_part_message_is_section_1():
+    assert text_plain_part(structure(PLAIN)) == ("1", b"QUOTED-PRINTABLE", "iso-8859-1")
+
+
+def test_multipart_text_part_is_numbered_by_its_position():
+    alternative = b"(" + HTML + PLAIN + b' "ALTERNATIVE")'
+    mixed = b"((" + PLAIN + HTML + b' "ALTERNATIVE")' + NOTES + b' "MIXED")'
+
+    assert text_plain_part(structure(alternative)) == ("2", b"QUOTED-PRINTABLE", "iso-8859-1")
+    assert text_plain_part(structure(mixed)) == ("1.1", b"QUOTED-PRINTABLE", "iso-8859-1")
+
+
+def test_attached_text_file_is_not_the_reply_text():
+    assert text_plain_part(structure(b"(" + HTML + NOTES + b' "MIXED")')) is None
+    assert text_plain_part(structure(HTML)) is None
+
+
+def test_decode_part_handles_a_body_truncated_mid_base64_quantum():
+    assert decode_part(b"SGVsbG8g\r\nd29y", b"BASE64", "utf-8") == "Hello wor"
+    assert decode_part(b"caf=E9", b"QUOTED-PRINTABLE", "iso-8859-1") == "café"
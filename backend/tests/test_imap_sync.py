@@ -0,0 +1,58 @@
+import re
+
+from services.imap_sync import ImapSyncStore, checkpoint, new_uids
+
+
+class FakeMailbox:
+    """Just enough of ``imaplib.IMAP4`` for ``new_uids``: SELECT responses and UID SEARCH"""
+
+    def __init__(self, unseen, uidnext, uidvalidity=1):
+        self.unseen = unseen
+        self.uidnext = uidnext
+        self.uidvalidity = uidvalidity
+        self.searches = []
+
+    def select(self, mailbox, readonly=False):
+        return "OK", [b"1"]
+
+    def response(self, code):
+        value = {"UIDVALIDITY": self.uidvalidity, "UIDNEXT": self.uidnext}[code]
+        return code, [str(value).encode()]
+
+    def uid(self, command, charset, criteria):
+        self.searches.append(criteria)
+        if criteria == "UNSEEN":
+            uids = self.unseen
+        else:
+            first = int(re.match(r"UID (\d+):\*", criteria).group(1))
+            uids = [uid for uid in range(1, self.uidnext) if uid >= first]
+        return "OK", [" ".join(map(str, uids)).encode()]
+
+
+def test_failed_batch_on_first_sync_is_fetched_again(tmp_path):
+    store = ImapSyncStore(str(tmp_path / "sync.db"))
+    mail = FakeMailbox(unseen=[10, 20, 30, 40], uidnext=101)
+
+    uidvalidity, uids, high_water = new_uids(mail, "sender@example.com", store=store)
+    assert (uids, high_water) == ([10, 20, 30, 40], 100)
+
+    # The FETCH batch holding 20 and 30 failed
+    checkpoint("sender@example.com", "INBOX", uidvalidity, high_water, uids, [10, 40], store=store)
+    assert store.get("sender@example.com", "INBOX") == (1, 19)
+
+    _, uids, _ = new_uids(mail, "sender@example.com", store=store)
+    assert mail.searches[-1] == "UID 20:*"
+    assert {20, 30} <= set(uids)
+
+
+def test_checkpoint_moves_to_high_water_once_everything_is_processed(tmp_path):
+    store = ImapSyncStore(str(tmp_path / "sync.db"))
+
+    checkpoint("sender@example.com", "INBOX", 1, 100, [10, 20], [10, 20], store=store)
+    assert store.get("sender@example.com", "INBOX") == (1, 100)
+
+    checkpoint("sender@example.com", "INBOX", 1, 100, [101, 102], [101, 102], store=store)
+    assert store.get("sender@example.com", "INBOX") == (1, 102)
+
+    checkpoint("sender@example.com", "INBOX", 1, 102, [103, 104], [104], store=store)
+    assert store.get("sender@example.com", "INBOX") == (1, 102)
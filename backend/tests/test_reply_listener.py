@@ -0,0 +1,17 @@
+from services.reply_listener import ReplyListener, ReplyListenerService
+
+
+def test_listener_can_only_be_replaced_or_removed_by_its_user(monkeypatch):
+    monkeypatch.setattr(ReplyListener, "start", lambda self: None)
+    service = ReplyListenerService()
+    owned = service.register("Sales@acme.com", "secret", "alice")
+
+    assert service.register("sales@acme.com", "guess", "mallory") is None
+    assert not service.unregister("sales@acme.com", "mallory")
+    assert [l["sender_email"] for l in service.listeners("alice")] == ["Sales@acme.com"]
+    assert not owned._stop.is_set()
+
+    replacement = service.register("sales@acme.com", "new secret", "alice")
+    assert replacement is not None and owned._stop.is_set()
+    assert service.unregister("sales@acme.com", "alice")
+    assert service.listeners() == []
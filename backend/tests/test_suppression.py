@@ -0,0 +1,39 @@
+import smtplib
+
+from services.suppression import SuppressionList, is_mailbox_reject
+
+
+def test_policy_rejection_does_not_suppress(tmp_path):
+    suppressions = SuppressionList(str(tmp_path / "suppressions.db"))
+    error = smtplib.SMTPDataError(550, b"5.7.1 Message rejected due to content restrictions")
+
+    suppressions.record_hard_bounce("someone@example.com", 550, str(error))
+
+    assert "someone@example.com" not in suppressions
+
+
+def test_unknown_mailbox_suppresses(tmp_path):
+    suppressions = SuppressionList(str(tmp_path / "suppressions.db"))
+    error = smtplib.SMTPRecipientsRefused({"gone@example.com": (550, b"5.1.1 The email account does not exist")})
+
+    suppressions.record_hard_bounce("gone@example.com", 550, str(error))
+
+    assert "gone@example.com" in suppressions
+    assert suppressions.lookup("gone@example.com")["reason"] == "hard_bounce"
+
+
+def test_enhanced_status_code_decides_over_the_reply_code():
+    assert is_mailbox_reject(550, "550 5.1.1 No such user")
+    assert is_mailbox_reject(553, "553-5.1.3 Invalid address")
+    assert not is_mailbox_reject(550, "550 5.7.1 Blocked by policy")
+    assert not is_mailbox_reject(550, "550 5.7.26 Unauthenticated email is not accepted")
+    assert not is_mailbox_reject(552, "552 5.2.2 Mailbox full")
+    assert not is_mailbox_reject(550, "550 5.1.8 Bad sender's system address")
+
+
+def test_bare_mailbox_reply_codes_suppress():
+    assert is_mailbox_reject(550, "550 Requested action not taken: mailbox unavailable")
+    assert is_mailbox_reject(551, None)
+    assert not is_mailbox_reject(554, "554 Transaction failed")
+    # Digits in an IP or email address are not an enhanced status code
+    assert not is_mailbox_reject(554, "554 user5.1.1@example.com rejected from 10.5.1.2")
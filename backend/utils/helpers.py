@@ -4,6 +4,7 @@ from email.header import decode_header
 from datetime import datetime
 import pandas as pd
 import os
+from functools import lru_cache
 
 def extract_phone_number(text):
     """Extract valid phone number from email body text"""
@@ -138,23 +139,74 @@ def extract_company_from_email(email_address):
     
     return "Unknown Company"
 
+# {{any column}}, {name}, and name-style brackets like [Candidate Name] / [client name]
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{\s*([^{}]+?)\s*\}\}"
+    r"|\{(name)\}"
+    r"|\[([^\[\]\n]*?name[^\[\]\n]*?)\]",
+    re.IGNORECASE
+)
+
+# Values every recipient has, whatever columns the uploaded file contains
+BUILTIN_PLACEHOLDERS = {"name", "email", "position"}
+
+def placeholder_key(label):
+    """Normalize a placeholder or column label: 'Company Name' -> 'company_name'"""
+    return re.sub(r"\W+", "_", str(label).strip().lower()).strip("_")
+
+class CompiledTemplate:
+    """A subject or body parsed once into literal text and placeholder keys"""
+
+    __slots__ = ("literals", "keys", "raw")
+
+    def __init__(self, text):
+        self.literals = []
+        self.keys = []
+        self.raw = []
+        pos = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.literals.append(text[pos:match.start()])
+            if match.group(1) is not None:
+                self.keys.append(placeholder_key(match.group(1)))
+            else:
+                self.keys.append("name")
+            self.raw.append(match.group(0))
+            pos = match.end()
+        self.literals.append(text[pos:])
+
+    @property
+    def placeholders(self):
+        return set(self.keys)
+
+    def missing(self, available):
+        """Placeholders that have neither a built-in value nor a matching column"""
+        return sorted(self.placeholders - BUILTIN_PLACEHOLDERS - set(available))
+
+    def render(self, values):
+        """Fill every placeholder in one pass; unknown ones are left as written"""
+        parts = [self.literals[0]]
+        for key, raw, literal in zip(self.keys, self.raw, self.literals[1:]):
+            value = values.get(key)
+            parts.append(raw if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+@lru_cache(maxsize=512)
+def compile_template(text):
+    """Compile a template once; later calls with the same text reuse the result"""
+    return CompiledTemplate(text or "")
+
+def template_values(recipient, name):
+    """Placeholder values for one recipient: built-ins plus any uploaded columns"""
+    values = recipient.fields
+    values["name"] = name
+    values["email"] = recipient.email
+    values["position"] = recipient.position
+    return values
+
 def replace_name_placeholders(text, name):
     """Replace any placeholder that refers to a name."""
-    placeholder_map = {
-        "{{name}}": name,
-        "{name}": name,
-        "[Candidate Name]": name,
-        "[Client Name]": name,
-        "[Name]": name,
-        "[client name]": name
-    }
-    for placeholder, value in placeholder_map.items():
-        text = text.replace(placeholder, value)
-
-    # Dynamic catch-all like [something name]
-    text = re.sub(r"\[(.*?name.*?)\]", name, text, flags=re.IGNORECASE)
-
-    return text
+    return compile_template(text).render({"name": name})
 
 def save_to_excel(data):
     """Save reply data to Excel file with comprehensive lead information"""
@@ -203,28 +255,6 @@ def is_auto_response(email_data):
         
     return False
 
-def save_sent_email(data):
-    """Save sent email data to a separate Excel file"""
-    filename = "sent_emails.xlsx"
-    
-    try:
-        if os.path.exists(filename):
-            df = pd.read_excel(filename)
-        else:
-            df = pd.DataFrame(columns=[
-                "timestamp", "sender_email", "recipient_email", 
-                "subject", "body", "first_name", "last_name",
-                "company", "phone"
-            ])
-        
-        new_row = pd.DataFrame([data])
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_excel(filename, index=False)
-        return True
-    except Exception as e:
-        print(f"Error saving sent email to Excel: {e}")
-        return False
-    
     # Add to helpers.py
 
 def extract_zoho_field_info(fields_data):
@@ -14,7 +14,8 @@ function AutoEmailTab() {
   const [batchSize, setBatchSize] = useState(250);
   const [preview, setPreview] = useState({ columns: [], data: [] });
   const [showPreview, setShowPreview] = useState(false);
-  const [progress, setProgress] = useState({ sent: 0, total: 0, status: "idle" });
+  const [progress, setProgress] = useState({ sent: 0, failed: 0, total: 0, status: "idle" });
+  const [campaignId, setCampaignId] = useState(null);
   const [sending, setSending] = useState(false);
   const [loading, setLoading] = useState({ preview: false, upload: false, generating: false });
   const [senderAccounts, setSenderAccounts] = useState([{ 
@@ -345,8 +346,9 @@ function AutoEmailTab() {
       const data = await res.json();
       
       if (res.ok) {
+        setCampaignId(data.campaign_id);
         setSending(true);
-        setProgress({ sent: 0, total: 0, status: "running" });
+        setProgress({ sent: 0, failed: 0, total: 0, status: "running" });
       } else {
         alert("Error uploading file: " + data.error);
       }
@@ -357,27 +359,27 @@ function AutoEmailTab() {
     }
   };
 
-  // Poll backend for progress
+  // Stream progress for the running campaign (Server-Sent Events)
   useEffect(() => {
-    let interval;
-    if (sending) {
-      interval = setInterval(async () => {
-        try {
-          const res = await fetch("https://emailagent.cubegtp.com/progress");
-          const data = await res.json();
-          setProgress(data);
-
-          if (data.status === "completed" || data.status.startsWith("error")) {
-            clearInterval(interval);
-            setSending(false);
-          }
-        } catch (err) {
-          console.error("Error fetching progress:", err);
-        }
-      }, 2000);
-    }
-    return () => clearInterval(interval);
-  }, [sending]);
+    if (!sending || !campaignId) return;
+
+    const source = new EventSource(
+      `https://emailagent.cubegtp.com/progress/stream?campaign_id=${campaignId}`
+    );
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      setProgress(data);
+
+      if (data.status === "completed" || data.status.startsWith("error")) {
+        source.close();
+        setSending(false);
+      }
+    };
+    source.onerror = (err) => {
+      console.error("Error streaming progress:", err);
+    };
+    return () => source.close();
+  }, [sending, campaignId]);
 
   // Get email content on component mount
   useEffect(() => {
@@ -385,7 +387,8 @@ function AutoEmailTab() {
   }, []);
 
   // Calculate progress percentage
-  const progressPercentage = progress.total > 0 ? (progress.sent / progress.total) * 100 : 0;
+  const processed = progress.sent + (progress.failed || 0);
+  const progressPercentage = progress.total > 0 ? (processed / progress.total) * 100 : 0;
 
   return (
     <>
@@ -725,7 +728,9 @@ function AutoEmailTab() {
           <div className="file-preview-section">
             <div className="preview-header">
               <h4>
-                <FiEye className="section-icon" /> File Preview ({preview.data.length} rows shown)
+                <FiEye className="section-icon" /> File Preview ({preview.data.length} rows shown
+                {preview.row_count != null &&
+                  ` of ${preview.row_count_exact ? "" : "about "}${preview.row_count.toLocaleString()}`})
               </h4>
             </div>
             <div className="table-container">
@@ -882,10 +887,20 @@ function AutoEmailTab() {
               <span className="progress-stat-value">{progress.sent}</span>
               <span className="progress-stat-label">Sent</span>
             </div>
+            <div className="progress-stat">
+              <span className="progress-stat-value">{progress.failed || 0}</span>
+              <span className="progress-stat-label">Failed</span>
+            </div>
             <div className="progress-stat">
               <span className="progress-stat-value">{progress.total}</span>
               <span className="progress-stat-label">Total</span>
             </div>
+            {(progress.duplicates > 0 || progress.invalid > 0 || progress.suppressed > 0) && (
+              <div className="progress-stat">
+                <span className="progress-stat-value">{(progress.duplicates || 0) + (progress.invalid || 0) + (progress.suppressed || 0)}</span>
+                <span className="progress-stat-label">Skipped ({progress.duplicates || 0} duplicate, {progress.invalid || 0} invalid, {progress.suppressed || 0} suppressed)</span>
+              </div>
+            )}
             <div className="progress-stat">
               <span className="progress-stat-value">{Math.round(progressPercentage)}%</span>
               <span className="progress-stat-label">Complete</span>